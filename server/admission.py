@@ -0,0 +1,267 @@
+"""
+Admission control for conversion requests
+Conversions are the only requests that cost seconds of CPU and megabytes of
+disk, so they are admitted through a gate before their upload is read: at most
+VOICE_ADMISSION_CONCURRENCY run at once, up to VOICE_ADMISSION_QUEUE more wait
+in line for VOICE_ADMISSION_MAX_WAIT seconds, and each client spends tokens
+from its own bucket (VOICE_CLIENT_RATE per second, up to VOICE_CLIENT_BURST).
+Anything over those limits is answered at once with 429 (this client is going
+too fast) or 503 (the server is saturated) and a Retry-After estimate, so a
+burst of uploads cannot starve the cheap read endpoints.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi import HTTPException
+
+from voice_engine import ENGINE_WORKERS
+
+# Conversion requests handled at once; 0 admits everything. Uploads are read
+# while a slot is held, so the default leaves room for one per engine worker
+# to be uploading while another converts.
+ADMISSION_CONCURRENCY = int(os.environ.get("VOICE_ADMISSION_CONCURRENCY", str(max(ENGINE_WORKERS, 1) * 2)))
+
+# Requests allowed to wait for a slot; the rest are turned away immediately
+ADMISSION_QUEUE = int(os.environ.get("VOICE_ADMISSION_QUEUE", "16"))
+
+# Longest a queued request waits for a slot before it is turned away
+ADMISSION_MAX_WAIT = float(os.environ.get("VOICE_ADMISSION_MAX_WAIT", "10"))
+
+# Conversions per second each client may sustain (0 disables the limit), and
+# how many it may make in a burst; a batch or multi request costs one per file
+# or celebrity
+CLIENT_RATE = float(os.environ.get("VOICE_CLIENT_RATE", "1"))
+CLIENT_BURST = float(os.environ.get("VOICE_CLIENT_BURST", "20"))
+
+# Clients whose buckets are remembered; the least recently seen are forgotten first
+MAX_CLIENTS = int(os.environ.get("VOICE_ADMISSION_CLIENTS", "10000"))
+
+# Key clients by the first X-Forwarded-For address; only safe behind a proxy that sets it
+TRUST_FORWARDED = os.environ.get("VOICE_TRUST_FORWARDED", "0") == "1"
+
+# Weight of the newest request in the moving average of slot hold time
+SERVICE_SMOOTHING = 0.2
+
+REJECTION_REASONS = ("rate_limited", "queue_full", "timeout", "backlog")
+
+
+def client_key(scope) -> str:
+    """The address a request is rate limited by"""
+    if TRUST_FORWARDED:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                forwarded = value.decode("latin-1").split(",")[0].strip()
+                if forwarded:
+                    return forwarded
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionController:
+    """Concurrency slots with a bounded FIFO queue, plus a token bucket per client
+
+    Runs on the event loop only, so its state needs no locking. A released
+    slot is handed straight to the oldest waiter, so late arrivals cannot
+    overtake the queue.
+    """
+
+    def __init__(
+        self,
+        limit: int = ADMISSION_CONCURRENCY,
+        queue_limit: int = ADMISSION_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        rate: float = CLIENT_RATE,
+        burst: float = CLIENT_BURST,
+        max_clients: int = MAX_CLIENTS,
+    ):
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        self.active = 0
+        self._waiters: deque = deque()
+        # client -> [tokens, monotonic time of the last refill]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.service_seconds: Optional[float] = None
+        self.admitted = 0
+        self.queued_total = 0
+        self.wait_seconds = 0.0
+        self.rejected = {reason: 0 for reason in REJECTION_REASONS}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    # Client rate limits
+
+    def _bucket(self, client: str) -> list:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[client] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def take(self, client: str):
+        """Spend one token of ``client``'s bucket, or raise 429 if it has none"""
+        if self.rate <= 0:
+            return
+        bucket = self._bucket(client)
+        if bucket[0] < 1.0:
+            raise self.reject("rate_limited", (1.0 - bucket[0]) / self.rate)
+        bucket[0] -= 1.0
+
+    def charge(self, client: str, cost: float):
+        """Spend ``cost`` more tokens once a request's real size is known
+
+        The bucket may go into debt (down to minus one burst), which the
+        client pays off by waiting before its next request is admitted.
+        """
+        if self.rate <= 0 or cost <= 0:
+            return
+        bucket = self._bucket(client)
+        bucket[0] = max(bucket[0] - cost, -self.burst)
+
+    # Concurrency slots
+
+    def retry_after(self, work: float = 1.0) -> float:
+        """Seconds until ``work`` requests ahead of a new one should have finished"""
+        per_request = self.service_seconds or 1.0
+        return per_request * work / max(self.limit, 1)
+
+    def reject(self, reason: str, retry_after: float, detail: Optional[str] = None) -> HTTPException:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        if detail is None:
+            detail = {
+                "rate_limited": "Too many conversion requests from this client",
+                "queue_full": "Server is busy with other conversions",
+                "timeout": "Timed out waiting for a conversion slot",
+            }.get(reason, "Server is busy")
+        return HTTPException(
+            status_code=429 if reason == "rate_limited" else 503,
+            detail=detail,
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+        )
+
+    async def acquire(self) -> float:
+        """Wait for a slot and return the seconds spent waiting, or raise 503"""
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.queue_limit:
+            raise self.reject("queue_full", self.retry_after(len(self._waiters) + 1))
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self.wait_seconds += time.perf_counter() - started
+                raise self.reject("timeout", self.retry_after(len(self._waiters) + 1))
+            # The slot arrived just as the wait ran out; keep it
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+        waited = time.perf_counter() - started
+        self.admitted += 1
+        self.wait_seconds += waited
+        return waited
+
+    def release(self, held: Optional[float] = None):
+        """Give the slot back, straight to the oldest waiter if there is one"""
+        if held is not None:
+            if self.service_seconds is None:
+                self.service_seconds = held
+            else:
+                self.service_seconds += SERVICE_SMOOTHING * (held - self.service_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queued": self.queued,
+            "queue_limit": self.queue_limit,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "avg_wait_ms": round(self.wait_seconds / self.queued_total * 1000, 2) if self.queued_total else 0.0,
+            "service_seconds": round(self.service_seconds, 4) if self.service_seconds is not None else None,
+            "rejected": dict(self.rejected),
+            "clients": len(self._buckets),
+            "client_rate": self.rate,
+            "client_burst": self.burst,
+        }
+
+
+class AdmissionMiddleware:
+    """Admits POSTs to ``paths`` through ``controller`` before their body is read
+
+    Rejections are sent here, as FastAPI-style JSON errors, so a refused
+    upload is never received; admitted requests hold their slot until the
+    response has been sent.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: Iterable[str],
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+        self.on_wait = on_wait
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            self.controller.take(client_key(scope))
+            waited = await self.controller.acquire()
+        except HTTPException as e:
+            await send({
+                "type": "http.response.start",
+                "status": e.status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    *((name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in e.headers.items()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": json.dumps({"detail": e.detail}).encode()})
+            return
+
+        if self.on_wait is not None:
+            self.on_wait(waited)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - started)
@@ -0,0 +1,356 @@
+"""
+Audio decoding front-end
+Identifies the real container from its first bytes, reads WAV straight out of
+a memory map without copying the file, and delivers mono float32 audio at one
+canonical sample rate in bounded chunks. Other containers are decoded by an
+ffmpeg subprocess when one is installed.
+"""
+
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+from math import gcd
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+# Every decoded signal is delivered at this rate
+CANONICAL_RATE = int(os.environ.get("VOICE_SAMPLE_RATE", "22050"))
+
+# Input frames decoded per chunk; bounds the working memory of a decode
+DECODE_CHUNK_FRAMES = int(os.environ.get("VOICE_DECODE_CHUNK_FRAMES", str(1 << 16)))
+
+# Polyphase filter taps per output sample
+RESAMPLER_TAPS = 32
+
+# Whether mapped pages can be handed back to the kernel once decoded
+CAN_RELEASE_PAGES = hasattr(mmap.mmap, "madvise") and hasattr(mmap, "MADV_DONTNEED")
+
+# Container name -> file extension used when storing uploads
+CONTAINER_EXTENSIONS = {
+    "wav": ".wav",
+    "webm": ".webm",
+    "ogg": ".ogg",
+    "mp3": ".mp3",
+    "flac": ".flac",
+    "mp4": ".m4a",
+    "aac": ".aac",
+    "aiff": ".aiff",
+}
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class UnsupportedAudioError(Exception):
+    """Raised when an input file cannot be decoded to PCM"""
+
+
+def sniff_container(header: bytes) -> Optional[str]:
+    """Container format from the leading bytes of a file, or None if it is not audio we know"""
+    if len(header) >= 12 and header[:4] in (b"RIFF", b"RF64") and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        # EBML: WebM and Matroska share the container; browsers record WebM
+        return "webm"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if len(header) >= 12 and header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if len(header) >= 8 and header[4:8] == b"ftyp":
+        return "mp4"
+    if header[:3] == b"ID3":
+        return "mp3"
+    if len(header) >= 2 and header[0] == 0xFF:
+        if header[1] & 0xF6 == 0xF0:
+            return "aac"  # ADTS
+        if header[1] & 0xE0 == 0xE0:
+            return "mp3"  # MPEG audio frame sync
+    return None
+
+
+def parse_wav_header(header: bytes) -> Optional[Dict[str, int]]:
+    """Read the fmt chunk of a RIFF/WAVE or RF64 header.
+
+    Returns the sample format, byte rate and the offset/size of the data
+    chunk when they appear within ``header``; returns None for anything that
+    is not WAV. ``header`` may be a memory map of the whole file.
+    """
+    if len(header) < 12 or header[:4] not in (b"RIFF", b"RF64") or header[8:12] != b"WAVE":
+        return None
+
+    info: Dict[str, int] = {}
+    data_size64: Optional[int] = None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        chunk_size = struct.unpack("<I", header[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"ds64" and body + 16 <= len(header):
+            # RF64 keeps the 64-bit sizes here and sets the 32-bit ones to 0xFFFFFFFF
+            data_size64 = struct.unpack("<Q", header[body + 8:body + 16])[0]
+        elif chunk_id == b"fmt " and body + 16 <= len(header):
+            format_tag, channels, sample_rate, byte_rate, block_align, bits = struct.unpack(
+                "<HHIIHH", header[body:body + 16]
+            )
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body + 26 <= len(header):
+                # The real format is the first two bytes of the SubFormat GUID
+                format_tag = struct.unpack("<H", header[body + 24:body + 26])[0]
+            info.update(
+                format=format_tag,
+                channels=channels,
+                sample_rate=sample_rate,
+                byte_rate=byte_rate,
+                block_align=block_align,
+                bits_per_sample=bits,
+            )
+        elif chunk_id == b"data":
+            info["data_offset"] = body
+            info["data_size"] = data_size64 if chunk_size == 0xFFFFFFFF and data_size64 is not None else chunk_size
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+
+    return info if "byte_rate" in info else None
+
+
+class PolyphaseResampler:
+    """Rational-ratio resampler that keeps its filter state between chunks
+
+    The anti-aliasing filter is a Kaiser-windowed sinc split into ``up``
+    phases; each output sample is one dot product of ``taps`` inputs with
+    one phase, computed for a whole chunk at once.
+    """
+
+    def __init__(self, source_rate: int, target_rate: int, taps: int = RESAMPLER_TAPS):
+        divisor = gcd(source_rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = source_rate // divisor
+        self.taps = taps
+
+        length = taps * self.up
+        # Odd symmetric length so the group delay is a whole upsampled sample
+        odd = length - 1 + length % 2
+        cutoff = 0.5 / max(self.up, self.down)  # cycles per sample at the upsampled rate
+        n = np.arange(odd) - (odd - 1) / 2.0
+        prototype = np.zeros(length)
+        prototype[:odd] = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(odd, 8.0) * self.up
+        # phases[p, k] multiplies x[i - k]; reversed so it lines up with a forward window
+        self.phases = prototype.reshape(taps, self.up).T[:, ::-1].astype(np.float32)
+        self.delay = (odd - 1) // 2
+
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        self._base = -(taps - 1)       # absolute input index of _history[0]
+        self._next = self.delay        # upsampled-domain position of the next output
+        self._received = 0
+        self._emitted = 0
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self._history, np.asarray(x, dtype=np.float32)])
+        self._received += len(x)
+        out = self._run(buffer)
+        keep = self.taps - 1
+        self._base += len(buffer) - keep
+        self._history = buffer[len(buffer) - keep:]
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Remaining output once the input has ended"""
+        total = -(-self._received * self.up // self.down)
+        pad = np.zeros(self.delay // self.up + self.taps, dtype=np.float32)
+        received = self._received
+        out = self.process(pad)
+        self._received = received
+        return out[:max(total - (self._emitted - len(out)), 0)]
+
+    def _run(self, buffer: np.ndarray) -> np.ndarray:
+        last = self._base + len(buffer) - 1
+        # Every output whose newest input sample has arrived
+        count = max((last * self.up + self.up - 1 - self._next) // self.down + 1, 0) if last >= 0 else 0
+        if count == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        positions = self._next + self.down * np.arange(count, dtype=np.int64)
+        inputs = positions // self.up
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        out = np.einsum("nk,nk->n", windows[inputs - self._base - (self.taps - 1)],
+                        self.phases[positions % self.up])
+
+        self._next = int(positions[-1]) + self.down
+        self._emitted += count
+        return out.astype(np.float32)
+
+
+def _pcm_to_float(raw: np.ndarray, info: Dict[str, int]) -> np.ndarray:
+    """Scale a frame-aligned slice of the data chunk to float32, downmixed to mono"""
+    bits = info["bits_per_sample"]
+    channels = max(info["channels"], 1)
+    if info["format"] == WAVE_FORMAT_IEEE_FLOAT:
+        samples = raw.view("<f4" if bits == 32 else "<f8").astype(np.float32)
+    elif bits == 8:
+        samples = (raw.astype(np.float32) - 128) / 128.0
+    elif bits == 16:
+        samples = raw.view("<i2").astype(np.float32) / 32768.0
+    elif bits == 24:
+        packed = raw.reshape(-1, 3).astype(np.int32)
+        ints = packed[:, 0] | (packed[:, 1] << 8) | (packed[:, 2] << 16)
+        samples = (np.where(ints >= 1 << 23, ints - (1 << 24), ints)).astype(np.float32) / float(1 << 23)
+    elif bits == 32:
+        samples = raw.view("<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise UnsupportedAudioError(f"Unsupported sample width: {bits} bits")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def _wav_info(mapped: mmap.mmap) -> Dict[str, int]:
+    """Header info of a mapped PCM WAV file, with ``frames`` counted from what is really there"""
+    info = parse_wav_header(mapped)
+    if (info is None or "data_offset" not in info
+            or info["format"] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) or not info["block_align"]):
+        raise UnsupportedAudioError("Not a PCM WAV file")
+
+    available = len(mapped) - info["data_offset"]
+    data_size = info["data_size"]
+    if data_size in (0, 0xFFFFFFFF) or data_size > available:
+        # Streaming writers leave the size unset
+        data_size = available
+    info["frames"] = data_size // info["block_align"]
+    return info
+
+
+def read_wav_info(path: str) -> Dict[str, int]:
+    """Header info of the PCM WAV file at ``path``; the file is closed again before returning"""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise UnsupportedAudioError("Empty file")
+        try:
+            return _wav_info(mapped)
+        finally:
+            mapped.close()
+
+
+def _wav_chunks(path: str, chunk_frames: int) -> Tuple[Dict[str, int], Iterator[np.ndarray]]:
+    """Header info and a generator of mono chunks at the file's own rate
+
+    The file is only opened once the generator starts, so one that is never
+    iterated holds no file handle or mapping.
+    """
+    info = read_wav_info(path)
+
+    def chunks():
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # A view over the mapped data chunk; only each chunk's float conversion allocates
+            data = np.frombuffer(mapped, dtype=np.uint8, offset=info["data_offset"],
+                                 count=min(info["frames"] * info["block_align"], len(mapped) - info["data_offset"]))
+            try:
+                step = chunk_frames * info["block_align"]
+                released = 0
+                for start in range(0, len(data), step):
+                    samples = _pcm_to_float(data[start:start + step], info)
+                    # Converted pages are not read again; returning them keeps the
+                    # resident size of a long file flat (they stay in the page cache)
+                    end = (info["data_offset"] + start + step) // mmap.PAGESIZE * mmap.PAGESIZE
+                    if CAN_RELEASE_PAGES and end > released:
+                        mapped.madvise(mmap.MADV_DONTNEED, released, min(end, len(mapped)) - released)
+                        released = end
+                    yield samples
+            finally:
+                del data
+                mapped.close()
+
+    return info, chunks()
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def _ffmpeg_chunks(path: str, sample_rate: int, chunk_frames: int) -> Iterator[np.ndarray]:
+    """Decode anything ffmpeg understands to mono float32 at ``sample_rate``, a chunk at a time"""
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin", "-i", path,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    decoded = 0
+    try:
+        while True:
+            raw = process.stdout.read(chunk_frames * 2)
+            if not raw:
+                break
+            raw = raw[:len(raw) - len(raw) % 2]
+            decoded += len(raw)
+            yield np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0 or decoded == 0:
+        raise UnsupportedAudioError(f"ffmpeg could not decode {os.path.basename(path)}")
+
+
+def sniff_file(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return sniff_container(f.read(64))
+
+
+def iter_decoded(path: str, sample_rate: int = CANONICAL_RATE,
+                 chunk_frames: int = DECODE_CHUNK_FRAMES) -> Iterator[np.ndarray]:
+    """Mono float32 chunks of ``path`` at ``sample_rate``
+
+    WAV is read from a memory map and resampled here; other containers are
+    piped through ffmpeg, which resamples. Raises UnsupportedAudioError when
+    the file cannot be decoded.
+    """
+    container = sniff_file(path)
+    if container == "wav":
+        info, chunks = _wav_chunks(path, chunk_frames)
+        if info["sample_rate"] == sample_rate:
+            yield from chunks
+            return
+        resampler = PolyphaseResampler(info["sample_rate"], sample_rate)
+        for chunk in chunks:
+            yield resampler.process(chunk)
+        yield resampler.flush()
+        return
+
+    if container is None:
+        raise UnsupportedAudioError("Unrecognized audio container")
+    if not ffmpeg_available():
+        raise UnsupportedAudioError(f"Decoding {container} needs ffmpeg")
+    yield from _ffmpeg_chunks(path, sample_rate, chunk_frames)
+
+
+def decoded_length(path: str, sample_rate: int = CANONICAL_RATE) -> Optional[int]:
+    """Number of samples ``iter_decoded`` will produce, when the header says so"""
+    if sniff_file(path) != "wav":
+        return None
+    info = read_wav_info(path)
+    return -(-info["frames"] * sample_rate // info["sample_rate"])
+
+
+def decode(path: str, sample_rate: int = CANONICAL_RATE,
+           chunk_frames: int = DECODE_CHUNK_FRAMES) -> Tuple[np.ndarray, int]:
+    """Whole file as mono float32 at ``sample_rate``"""
+    length = decoded_length(path, sample_rate)
+    if length is None:
+        chunks = list(iter_decoded(path, sample_rate, chunk_frames))
+        x = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        return x, sample_rate
+
+    # Known length: fill one preallocated array instead of joining chunks
+    x = np.empty(length, dtype=np.float32)
+    filled = 0
+    for chunk in iter_decoded(path, sample_rate, chunk_frames):
+        take = min(len(chunk), length - filled)
+        x[filled:filled + take] = chunk[:take]
+        filled += take
+    return x[:filled], sample_rate
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Read latency under a burst of conversion uploads, with and without admission control
+
+Starts the server once with admission control disabled and once with the
+given limits, then fires ``--burst`` concurrent batch and single conversions
+while a probe requests /celebrities at a steady rate. Reports the probe's
+latency percentiles, how the conversions were answered (200/202, 429, 503)
+and whether every rejection carried a Retry-After header.
+
+Usage: python benchmarks/bench_admission.py [--burst 40] [--batch-size 4] [--duration 5]
+                                            [--concurrency 2] [--queue 4] [--output admission.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+
+from load_test import (
+    HTTPX_AVAILABLE,
+    ServerProcess,
+    free_port,
+    git_revision,
+    percentile,
+    synthetic_wav,
+    unique_variant,
+)
+
+if HTTPX_AVAILABLE:
+    import httpx
+
+
+async def burst(url, args, wav):
+    limits = httpx.Limits(max_connections=args.burst + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        statuses = {}
+        missing_retry_after = 0
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def convert(i):
+            nonlocal missing_retry_after
+            if i % 2:
+                files = [("files", (f"b{i}_{k}.wav", unique_variant(wav, i * 100 + k), "audio/wav"))
+                         for k in range(args.batch_size)]
+                response = await client.post("/convert/batch", files=files, data={"celebrity": "salman_khan"})
+            else:
+                response = await client.post(
+                    "/convert",
+                    files={"file": (f"c{i}.wav", unique_variant(wav, i * 100), "audio/wav")},
+                    data={"celebrity": "salman_khan"},
+                )
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code in (429, 503) and "retry-after" not in response.headers:
+                missing_retry_after += 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/celebrities", params={"search": "khan"})
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(args.probe_interval)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(convert(i) for i in range(args.burst)))
+        elapsed = time.perf_counter() - started
+        # Keep probing while queued batch files are still converting
+        while (await client.get("/admission/stats")).json().get("batch_backlog", 0):
+            await asyncio.sleep(0.2)
+        done.set()
+        await prober
+        stats = (await client.get("/admission/stats")).json() if args.admission else None
+
+    probe_latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "burst_s": round(elapsed, 3),
+        "statuses": statuses,
+        "rejections_without_retry_after": missing_retry_after,
+        "probe_requests": len(probe_latencies),
+        "probe_latency_ms": {
+            "p50": ms(percentile(probe_latencies, 50)),
+            "p95": ms(percentile(probe_latencies, 95)),
+            "p99": ms(percentile(probe_latencies, 99)),
+            "max": ms(probe_latencies[-1] if probe_latencies else None),
+        },
+        "admission": stats,
+    }
+
+
+def run_server(args, wav, admission: bool):
+    args.admission = admission
+    if admission:
+        os.environ["VOICE_ADMISSION_CONCURRENCY"] = str(args.concurrency)
+        os.environ["VOICE_ADMISSION_QUEUE"] = str(args.queue)
+        os.environ["VOICE_CLIENT_RATE"] = str(args.client_rate)
+    else:
+        os.environ["VOICE_ADMISSION_CONCURRENCY"] = "0"
+        os.environ["VOICE_CLIENT_RATE"] = "0"
+    server = ServerProcess(free_port())
+    server.start()
+    try:
+        return asyncio.run(burst(server.url, args, wav))
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--burst", type=int, default=40, help="Conversion requests sent at once")
+    parser.add_argument("--batch-size", type=int, default=4, help="Files per batch request (every other request)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of audio per file")
+    parser.add_argument("--concurrency", type=int, default=2, help="VOICE_ADMISSION_CONCURRENCY when enabled")
+    parser.add_argument("--queue", type=int, default=4, help="VOICE_ADMISSION_QUEUE when enabled")
+    parser.add_argument("--client-rate", type=float, default=1.0, help="VOICE_CLIENT_RATE when enabled")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    if not HTTPX_AVAILABLE:
+        parser.error("httpx is required: pip install httpx")
+
+    wav = synthetic_wav(args.duration)
+    results = {mode: run_server(args, wav, mode == "admission") for mode in ("unlimited", "admission")}
+
+    print(f"burst of {args.burst} conversion requests, {args.duration:g} s files; probe GET /celebrities")
+    print(f"  {'mode':<11}{'burst s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+    for mode, r in results.items():
+        latency = r["probe_latency_ms"]
+        statuses = " ".join(f"{status}:{count}" for status, count in sorted(r["statuses"].items()))
+        print(f"  {mode:<11}{r['burst_s']:>9.2f}{latency['p50']:>9.1f}{latency['p95']:>9.1f}"
+              f"{latency['p99']:>9.1f}{latency['max']:>9.1f}  {statuses}")
+    if results["admission"]["rejections_without_retry_after"]:
+        print("  some rejections had no Retry-After header")
+
+    if args.output:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "admission")},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
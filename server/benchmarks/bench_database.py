@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pooled CelebrityDatabase against the original per-call connection approach
+
+Usage: python benchmarks/bench_database.py [--celebrities N] [--iterations N] [--threads N] [--json]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from celebrities import get_all_celebrities
+from database import CelebrityDatabase
+
+QUERIES = ["khan", "deep", "voice", "smooth", "tamil cinema"]
+
+
+class PerCallDatabase:
+    """The original access pattern: a fresh connection, LIKE scans and JSON decoding on every call"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _query(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        celebrities = []
+        for row in rows:
+            celebrity = dict(row)
+            celebrity['languages'] = json.loads(celebrity['languages'])
+            celebrity['notable_films'] = json.loads(celebrity['notable_films'])
+            celebrity['voice_characteristics'] = json.loads(celebrity['voice_characteristics'])
+            celebrities.append(celebrity)
+        return celebrities
+
+    def get_celebrity_by_id(self, celebrity_id):
+        rows = self._query('SELECT * FROM celebrities WHERE id = ?', (celebrity_id,))
+        return rows[0] if rows else None
+
+    def get_all_celebrities(self):
+        return self._query('SELECT * FROM celebrities ORDER BY popularity DESC')
+
+    def search_celebrities(self, query):
+        search_query = f"%{query.lower()}%"
+        return self._query('''
+            SELECT * FROM celebrities
+            WHERE LOWER(name) LIKE ?
+               OR LOWER(bio) LIKE ?
+               OR LOWER(voice_characteristics) LIKE ?
+            ORDER BY popularity DESC
+        ''', (search_query, search_query, search_query))
+
+
+def populate(db, count):
+    """Insert ``count`` celebrities, cycling through the real catalog with unique ids"""
+    base = get_all_celebrities()
+    for i in range(count):
+        celebrity = dict(base[i % len(base)])
+        if i >= len(base):
+            celebrity["id"] = f"{celebrity['id']}_{i}"
+            celebrity["name"] = f"{celebrity['name']} {i}"
+        db.insert_celebrity(celebrity)
+    return [celebrity["id"] for celebrity in db.get_all_celebrities()]
+
+
+def run(operation, iterations, threads):
+    """Throughput of ``operation(i)`` in calls per second"""
+    started = time.perf_counter()
+    if threads <= 1:
+        for i in range(iterations):
+            operation(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(operation, range(iterations)))
+    return iterations / (time.perf_counter() - started)
+
+
+class Uncached:
+    """Pooled database with the decoded-row cache dropped before every call"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        def call(*args):
+            self.db._invalidate()
+            return method(*args)
+        return call
+
+
+def benchmark(db, ids, iterations, threads):
+    return {
+        "get_by_id": run(lambda i: db.get_celebrity_by_id(ids[i % len(ids)]), iterations, threads),
+        "get_all": run(lambda i: db.get_all_celebrities(), max(iterations // 20, 1), threads),
+        "search": run(lambda i: db.search_celebrities(QUERIES[i % len(QUERIES)]), iterations, threads),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--celebrities", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        pooled = CelebrityDatabase(db_path)
+        ids = populate(pooled, args.celebrities)
+        legacy = PerCallDatabase(db_path)
+
+        results = {}
+        for threads in sorted({1, args.threads}):
+            results[f"threads={threads}"] = {
+                "per_call": benchmark(legacy, ids, args.iterations, threads),
+                "pooled_uncached": benchmark(Uncached(pooled), ids, args.iterations, threads),
+                "pooled": benchmark(pooled, ids, args.iterations, threads),
+            }
+        pooled.close()
+
+    if args.json:
+        print(json.dumps({"celebrities": args.celebrities, "iterations": args.iterations, "results": results}, indent=2))
+        return
+
+    print(f"{args.celebrities} celebrities, {args.iterations} iterations (calls/second)")
+    for label, modes in results.items():
+        print(f"\n{label}")
+        print(f"  {'operation':<12}{'per-call':>12}{'no cache':>12}{'pooled':>12}{'speedup':>10}")
+        for operation in modes["per_call"]:
+            before = modes["per_call"][operation]
+            uncached = modes["pooled_uncached"][operation]
+            after = modes["pooled"][operation]
+            print(f"  {operation:<12}{before:>12.0f}{uncached:>12.0f}{after:>12.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
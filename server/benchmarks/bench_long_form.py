@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Peak memory and speed of whole-file versus block-streaming conversion
+
+Writes synthetic voiced WAV files of increasing length and converts each one
+in a fresh process, either as one array (``convert_signal``) or block by
+block (``convert_path_blocks``), reporting the real-time factor and the
+growth of the process's peak resident size over its size after imports.
+Block mode should stay flat as the duration grows; ``--block-seconds`` and
+``--hop`` trade throughput against memory.
+
+Usage: python benchmarks/bench_long_form.py [--durations 60,300,900] [--modes whole,blocks]
+                                            [--block-seconds 10] [--hop 256] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_engine import HOP, N_FFT, VoiceParams, convert_path_blocks, convert_signal, read_audio, write_wav
+
+PARAMS = VoiceParams(pitch_semitones=-3.0, formant_ratio=0.92, tilt_db=-1.0, low_shelf_db=2.0, presence_db=1.0)
+
+
+def write_speechlike(path: str, seconds: float, sample_rate: int):
+    """A gliding harmonic tone with syllable-rate gaps, written a minute at a time"""
+    rng = np.random.default_rng(0)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        total = int(seconds * sample_rate)
+        phase = 0.0
+        for start in range(0, total, 60 * sample_rate):
+            t = np.arange(start, min(start + 60 * sample_rate, total)) / sample_rate
+            f0 = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+            phases = phase + 2 * np.pi * np.cumsum(f0) / sample_rate
+            phase = phases[-1]
+            voiced = sum(np.sin(k * phases) / k for k in range(1, 12))
+            gate = (np.sin(2 * np.pi * 4 * t) > -0.3).astype(np.float64)
+            x = 0.2 * voiced * gate + 0.003 * rng.standard_normal(len(t))
+            wav.writeframes((np.clip(x, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def peak_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak():
+    # Writing 5 to clear_refs resets VmHWM to the current resident size
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_one(mode: str, source: str, destination: str, block_seconds: float, hop: int, results):
+    reset_peak()
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "whole":
+        x, sample_rate = read_audio(source)
+        write_wav(destination, convert_signal(x, sample_rate, PARAMS), sample_rate)
+    else:
+        with wave.open(source) as wav:
+            sample_rate = wav.getframerate()
+        block_frames = max(int(block_seconds * sample_rate / hop), 1)
+        convert_path_blocks(source, [(destination, PARAMS)], block_frames=block_frames, n_fft=N_FFT, hop=hop)
+    results.put({"elapsed": time.perf_counter() - started, "peak_mb": peak_rss_mb() - baseline})
+
+
+def measure(mode, source, duration, block_seconds, hop):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory(prefix="voice-long-") as scratch:
+        process = context.Process(target=run_one, args=(
+            mode, source, os.path.join(scratch, "out.wav"), block_seconds, hop, results
+        ))
+        process.start()
+        result = results.get()
+        process.join()
+    return {
+        "mode": mode,
+        "duration_s": duration,
+        "elapsed_s": round(result["elapsed"], 3),
+        "rtf": round(result["elapsed"] / duration, 4),
+        "peak_growth_mb": round(result["peak_mb"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--durations", default="60,300,900", help="Comma-separated input lengths in seconds")
+    parser.add_argument("--modes", default="whole,blocks")
+    parser.add_argument("--block-seconds", type=float, default=10.0)
+    parser.add_argument("--hop", type=int, default=HOP, help=f"STFT hop in samples; must divide {N_FFT}")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    if N_FFT % args.hop:
+        parser.error(f"--hop must divide {N_FFT}")
+    modes = [mode for mode in args.modes.split(",") if mode]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="voice-long-input-") as scratch:
+        for duration in [float(value) for value in args.durations.split(",") if value]:
+            source = os.path.join(scratch, f"input_{int(duration)}.wav")
+            write_speechlike(source, duration, args.sample_rate)
+            for mode in modes:
+                results.append(measure(mode, source, duration, args.block_seconds, args.hop))
+                print(f"{mode} {duration:.0f}s done", file=sys.stderr)
+            os.remove(source)
+
+    if args.json:
+        print(json.dumps({"block_seconds": args.block_seconds, "hop": args.hop, "results": results}, indent=2))
+        return
+
+    print(f"block {args.block_seconds:g} s, hop {args.hop} (peak resident growth over the idle process)")
+    print(f"  {'mode':<8}{'audio s':>10}{'elapsed s':>12}{'rtf':>8}{'peak MB':>10}")
+    for r in results:
+        print(f"  {r['mode']:<8}{r['duration_s']:>10.0f}{r['elapsed_s']:>12.2f}{r['rtf']:>8.3f}{r['peak_growth_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
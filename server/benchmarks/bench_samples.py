@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Preview serving from disk and from the packed sample archive
+
+Packs static/samples into a temporary archive, then builds the response for
+every preview clip ``--rounds`` times from disk (serve_file) and from the
+memory-mapped archive (serve_bytes), sending each body to a null ASGI sink.
+Reports the time per response and the filesystem metadata calls
+(stat/exists/open) each path made per request.
+
+Usage: python benchmarks/bench_samples.py [--rounds 200] [--json]
+"""
+
+import argparse
+import asyncio
+import builtins
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request
+
+from http_files import serve_bytes, serve_file
+from sample_archive import PREVIEW_SUFFIX, SAMPLES_DIR, SampleArchive, build_archive
+
+
+def make_request(path: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""})
+
+
+async def sink(message):
+    pass
+
+
+async def receive():
+    return {"type": "http.disconnect"}
+
+
+def counted(calls, name, function):
+    def wrapper(*args, **kwargs):
+        calls[name] = calls.get(name, 0) + 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+async def serve_all(ids, respond, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for celebrity_id in ids:
+            response = respond(make_request(f"/preview/{celebrity_id}"), celebrity_id)
+            await response({"type": "http", "method": "GET"}, receive, sink)
+    return time.perf_counter() - started
+
+
+def measure(ids, respond, rounds):
+    calls = {}
+    with mock.patch("os.stat", counted(calls, "stat", os.stat)), \
+            mock.patch("os.path.exists", counted(calls, "exists", os.path.exists)), \
+            mock.patch("builtins.open", counted(calls, "open", builtins.open)):
+        asyncio.run(serve_all(ids, respond, 1))
+    elapsed = asyncio.run(serve_all(ids, respond, rounds))
+    return {
+        "us_per_response": round(elapsed / (rounds * len(ids)) * 1e6, 1),
+        "fs_calls_per_request": {name: round(count / len(ids), 2) for name, count in sorted(calls.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples-dir", default=str(SAMPLES_DIR))
+    parser.add_argument("--rounds", type=int, default=200, help="Times every preview is served per mode")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "samples.pack")
+        build_archive(args.samples_dir, path)
+        archive = SampleArchive.open(path, args.samples_dir)
+        ids = sorted(archive.previews)
+        if not ids:
+            parser.error(f"no *{PREVIEW_SUFFIX} files in {args.samples_dir}")
+
+        def from_disk(request, celebrity_id):
+            return serve_file(request, os.path.join(args.samples_dir, f"{celebrity_id}{PREVIEW_SUFFIX}"), "audio/wav")
+
+        def from_archive(request, celebrity_id):
+            entry = archive.previews[celebrity_id]
+            return serve_bytes(request, entry["data"], entry["media_type"], entry["etag"], entry["mtime"],
+                               entry["last_modified"])
+
+        results = {
+            "disk": measure(ids, from_disk, args.rounds),
+            "archive": measure(ids, from_archive, args.rounds),
+        }
+
+    if args.json:
+        print(json.dumps({"previews": len(ids), "rounds": args.rounds, "results": results}, indent=2))
+        return
+
+    print(f"{len(ids)} previews x {args.rounds} rounds")
+    print(f"  {'mode':<9}{'us/response':>13}  filesystem calls per request")
+    for mode, r in results.items():
+        calls = " ".join(f"{name}:{count:g}" for name, count in r["fs_calls_per_request"].items()) or "none"
+        print(f"  {mode:<9}{r['us_per_response']:>13.1f}  {calls}")
+
+
+if __name__ == "__main__":
+    main()
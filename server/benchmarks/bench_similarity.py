@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark exact against approximate similarity search over synthetic voice catalogs
+
+Embeddings are drawn around a few hundred random "voice type" centres so the
+catalog has the kind of structure real speakers do. Queries are perturbed
+catalog entries; recall is the share of the exact top-k the index also returns.
+
+Usage: python benchmarks/bench_similarity.py [--sizes 1000,10000,50000] [--queries N] [--limit K] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import SimilarityIndex
+from voice_profiles import EMBEDDING_DIM
+
+
+def synthetic_catalog(size, rng):
+    centres = rng.normal(size=(max(size // 50, 1), EMBEDDING_DIM))
+    labels = rng.integers(0, len(centres), size)
+    embeddings = centres[labels] + 0.5 * rng.normal(size=(size, EMBEDDING_DIM))
+    return [f"voice_{i}" for i in range(size)], embeddings.astype(np.float32)
+
+
+def timed_queries(index, queries, limit, approximate):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append({celebrity_id for celebrity_id, _ in index.query(query, limit, approximate)[0]})
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def benchmark(size, queries, limit, rng):
+    ids, embeddings = synthetic_catalog(size, rng)
+    start = time.perf_counter()
+    index = SimilarityIndex(ids, embeddings, ann_min_items=size + 1)
+    build_exact = time.perf_counter() - start
+    start = time.perf_counter()
+    index.build_clusters()
+    build_clusters = time.perf_counter() - start
+
+    picks = rng.integers(0, size, queries)
+    probes = embeddings[picks] + 0.3 * rng.normal(size=(queries, EMBEDDING_DIM)).astype(np.float32)
+    exact_ms, exact = timed_queries(index, probes, limit, False)
+    approximate_ms, approximate = timed_queries(index, probes, limit, True)
+    recall = np.mean([len(a & e) / len(e) for a, e in zip(approximate, exact)])
+    return {
+        "size": size,
+        "build_s": round(build_exact, 4),
+        "cluster_s": round(build_clusters, 4),
+        "exact_ms": round(exact_ms, 4),
+        "approximate_ms": round(approximate_ms, 4),
+        "recall": round(float(recall), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = [benchmark(int(size), args.queries, args.limit, rng) for size in args.sizes.split(",") if size]
+
+    if args.json:
+        print(json.dumps({"queries": args.queries, "limit": args.limit, "results": results}, indent=2))
+        return
+
+    print(f"{args.queries} queries, top {args.limit} (milliseconds per query)")
+    print(f"  {'voices':>8}{'exact':>10}{'approx':>10}{'speedup':>10}{'recall':>9}{'k-means s':>11}")
+    for r in results:
+        speedup = r["exact_ms"] / r["approximate_ms"] if r["approximate_ms"] else 0
+        print(f"  {r['size']:>8}{r['exact_ms']:>10.3f}{r['approximate_ms']:>10.3f}"
+              f"{speedup:>9.1f}x{r['recall']:>9.2f}{r['cluster_s']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
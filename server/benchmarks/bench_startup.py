@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: import time per module and time to first response
+
+Imports ``main`` under ``python -X importtime`` in a fresh interpreter and
+reports the self and cumulative import time of every server module and of
+the heaviest third-party packages. Then starts uvicorn from scratch and
+measures how long it takes to answer its first request, the first catalog
+and profile requests (which pay for lazy initialization unless warmup got
+there first) and the background warmup. Each measurement is the median of
+``--runs`` fresh processes; the limits make it usable as a regression check.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--max-import-ms MS]
+                                          [--max-first-response-ms MS] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from load_test import SERVER_DIR, free_port, git_revision
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Third-party packages listed in the report, heaviest first
+THIRD_PARTY_SHOWN = 8
+
+# Imported by the interpreter itself, not by the server
+SITE_HOOKS = {"sitecustomize", "usercustomize"}
+
+
+def server_modules():
+    return {name[:-3] for name in os.listdir(SERVER_DIR) if name.endswith(".py")}
+
+
+def scratch_directory() -> tempfile.TemporaryDirectory:
+    """Empty working directory with the static assets linked in, like a new pod"""
+    workdir = tempfile.TemporaryDirectory(prefix="voice-startup-")
+    os.symlink(os.path.join(SERVER_DIR, "static"), os.path.join(workdir.name, "static"))
+    return workdir
+
+
+def import_times():
+    """(self, cumulative) microseconds per imported module for one ``import main``"""
+    with scratch_directory() as workdir:
+        env = dict(os.environ, PYTHONPATH=SERVER_DIR, PYTHONWARNINGS="ignore")
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules[name] = {"self": int(own), "cumulative": int(cumulative), "depth": len(indent) // 2}
+    return modules, elapsed
+
+
+def measure_imports(runs: int):
+    samples = [import_times() for _ in range(runs)]
+    ours = server_modules()
+
+    def median_ms(name, field):
+        values = [modules[name][field] for modules, _ in samples if name in modules]
+        return round(statistics.median(values) / 1000, 2) if values else None
+
+    last = samples[-1][0]
+    first_party = {
+        name: {"self_ms": median_ms(name, "self"), "cumulative_ms": median_ms(name, "cumulative")}
+        for name in sorted(ours & set(last), key=lambda name: -last[name]["cumulative"])
+    }
+    top_level = [name for name, info in last.items()
+                 if info["depth"] == 1 and name not in ours and not name.startswith("_")
+                 and name.split(".")[0] not in sys.stdlib_module_names | SITE_HOOKS]
+    third_party = {
+        name: {"cumulative_ms": median_ms(name, "cumulative")}
+        for name in sorted(top_level, key=lambda name: -last[name]["cumulative"])[:THIRD_PARTY_SHOWN]
+    }
+    return {
+        "import_main_ms": median_ms("main", "cumulative"),
+        "interpreter_ms": round(statistics.median(elapsed for _, elapsed in samples) * 1000, 1),
+        "server_modules": first_party,
+        "third_party": third_party,
+    }
+
+
+def get(url: str, timeout: float = 5.0) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def first_responses(paths, timeout: float = 60.0):
+    """Seconds from process start to the first 200 on /, then to each of ``paths`` and to /ready"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    with scratch_directory() as workdir:
+        command = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--app-dir", SERVER_DIR,
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--log-level", "warning",
+        ]
+        started = time.perf_counter()
+        # /ready is polled for the end of warmup only, with or without ffmpeg installed
+        env = dict(os.environ, PYTHONWARNINGS="ignore", VOICE_REQUIRE_FFMPEG="0")
+        process = subprocess.Popen(command, cwd=workdir, env=env)
+        try:
+            deadline = started + timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {process.returncode}")
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("Server did not answer in time")
+                try:
+                    if get(url + "/", timeout=1.0) == 200:
+                        break
+                except OSError:
+                    time.sleep(0.005)
+            timings = {"first_response": time.perf_counter() - started}
+
+            for path in paths:
+                request_started = time.perf_counter()
+                status = get(url + path)
+                timings[path] = time.perf_counter() - request_started
+                if status >= 500:
+                    raise RuntimeError(f"GET {path} returned {status}")
+
+            # Revisions without a warmup have no /ready and are ready at once
+            while get(url + "/ready") not in (200, 404):
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("Warmup did not finish in time")
+                time.sleep(0.005)
+            timings["ready"] = time.perf_counter() - started
+            return timings
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def measure_first_responses(runs: int, paths):
+    samples = [first_responses(paths) for _ in range(runs)]
+    return {
+        name: round(statistics.median(sample[name] for sample in samples) * 1000, 1)
+        for name in samples[0]
+    }
+
+
+def print_report(imports, responses):
+    print(f"import main: {imports['import_main_ms']:.1f} ms "
+          f"(interpreter start to exit {imports['interpreter_ms']:.1f} ms)\n")
+    print(f"  {'server module':<20}{'self ms':>10}{'cum ms':>10}")
+    for name, times in imports["server_modules"].items():
+        print(f"  {name:<20}{times['self_ms']:>10.2f}{times['cumulative_ms']:>10.2f}")
+    print(f"\n  {'third party':<20}{'':>10}{'cum ms':>10}")
+    for name, times in imports["third_party"].items():
+        print(f"  {name:<20}{'':>10}{times['cumulative_ms']:>10.2f}")
+
+    print(f"\n  {'server start':<40}{'ms':>10}")
+    print(f"  {'to first response (GET /)':<40}{responses['first_response']:>10.1f}")
+    for name, value in responses.items():
+        if name.startswith("/"):
+            print(f"  {'then GET ' + name:<40}{value:>10.1f}")
+    print(f"  {'to warmup finished (/ready)':<40}{responses['ready']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement (median)")
+    parser.add_argument("--paths", default="/celebrities,/celebrities?search=khan,/celebrity/salman_khan/profile",
+                        help="Comma-separated requests timed right after the first response")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if importing main takes longer")
+    parser.add_argument("--max-first-response-ms", type=float, help="Fail if the first response takes longer")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    paths = [path for path in args.paths.split(",") if path]
+    imports = measure_imports(args.runs)
+    responses = measure_first_responses(args.runs, paths)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "imports": imports,
+        "startup_ms": responses,
+    }
+    print_report(imports, responses)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    failures = []
+    if args.max_import_ms is not None and imports["import_main_ms"] > args.max_import_ms:
+        failures.append(f"import main took {imports['import_main_ms']:.1f} ms (limit {args.max_import_ms:.0f})")
+    if args.max_first_response_ms is not None and responses["first_response"] > args.max_first_response_ms:
+        failures.append(f"first response took {responses['first_response']:.1f} ms "
+                        f"(limit {args.max_first_response_ms:.0f})")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Conversion time with and without skipping silence
+
+Builds recordings of speech-like bursts separated by silence, with a growing
+share of silence (or pads a real recording with silence, ``--input``), and
+converts each one fully and with voice activity detection. Reports the share
+of the input VAD left untouched, the time spent detecting it and the speedup
+of the conversion stage.
+
+Usage: python benchmarks/bench_vad.py [--silence 0,0.25,0.5,0.75] [--seconds 20] [--input rec.wav] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_decode import CANONICAL_RATE
+from vad import regions_to_convert
+from voice_engine import VoiceParams, analyze_regions, read_audio, render_regions, speech_stats
+
+PARAMS = VoiceParams(pitch_semitones=-3.0, formant_ratio=0.92, tilt_db=-1.0, low_shelf_db=2.0, presence_db=1.0)
+
+
+def speechlike(seconds: float, sample_rate: int, rng) -> np.ndarray:
+    """A gliding harmonic tone with syllable-rate gaps"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.3 * t) + rng.uniform(-20, 20)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    gate = (np.sin(2 * np.pi * 4 * t) > -0.3).astype(np.float64)
+    return 0.2 * voiced * gate
+
+
+def recording(seconds: float, silence: float, sample_rate: int, rng, speech=None) -> np.ndarray:
+    """About ``silence`` of ``seconds`` is quiet room noise: before, between and after three utterances"""
+    if speech is None:
+        speech = speechlike(seconds * (1 - silence), sample_rate, rng)
+    pieces = np.array_split(speech, 3)
+    quiet = len(speech) * silence / max(1 - silence, 1e-3)
+    gaps = [int(quiet * share) for share in (0.35, 0.15, 0.15, 0.35)]
+    parts = [np.zeros(gaps[0])]
+    for piece, gap in zip(pieces, gaps[1:]):
+        parts.extend([piece, np.zeros(gap)])
+    x = np.concatenate(parts)
+    return (x + 0.002 * rng.standard_normal(len(x))).astype(np.float32)
+
+
+def timed_convert(x: np.ndarray, sample_rate: int, regions):
+    started = time.perf_counter()
+    render_regions(x, analyze_regions(x, sample_rate, regions), PARAMS)
+    return time.perf_counter() - started
+
+
+def measure(x: np.ndarray, sample_rate: int, silence: float, repeats: int):
+    started = time.perf_counter()
+    regions = regions_to_convert(x, sample_rate)
+    detect = time.perf_counter() - started
+    full = min(timed_convert(x, sample_rate, [(0, len(x))]) for _ in range(repeats))
+    skipped = min(timed_convert(x, sample_rate, regions) for _ in range(repeats))
+    return {
+        "silence": silence,
+        "seconds": round(len(x) / sample_rate, 2),
+        "regions": len(regions),
+        "compute_saved": round(speech_stats(regions, len(x), sample_rate)["compute_saved"], 3),
+        "vad_ms": round(detect * 1000, 2),
+        "full_ms": round(full * 1000, 1),
+        "vad_convert_ms": round(skipped * 1000, 1),
+        "speedup": round(full / (skipped + detect), 2) if skipped + detect else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--silence", default="0,0.25,0.5,0.75", help="Comma-separated shares of silence")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Length of each synthetic recording")
+    parser.add_argument("--input", help="Use this recording as the speech instead of a synthetic one")
+    parser.add_argument("--repeats", type=int, default=3, help="Conversions per measurement (fastest kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    speech, sample_rate = read_audio(args.input) if args.input else (None, CANONICAL_RATE)
+    # Populate the engine's caches so the first measurement isn't penalized
+    measure(recording(1.0, 0.5, sample_rate, rng), sample_rate, 0.5, 1)
+    results = []
+    for silence in [float(value) for value in args.silence.split(",") if value]:
+        x = recording(args.seconds, silence, sample_rate, rng, speech)
+        results.append(measure(x, sample_rate, silence, args.repeats))
+
+    if args.json:
+        print(json.dumps({"input": args.input, "results": results}, indent=2))
+        return
+
+    print(f"{'silence':>8}{'audio s':>9}{'regions':>9}{'saved':>8}{'vad ms':>9}{'full ms':>10}{'vad+conv ms':>13}{'speedup':>9}")
+    for r in results:
+        print(f"{r['silence']:>8.2f}{r['seconds']:>9.1f}{r['regions']:>9}{r['compute_saved']:>8.2f}"
+              f"{r['vad_ms']:>9.2f}{r['full_ms']:>10.1f}{r['vad_convert_ms']:>13.1f}{r['speedup']:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
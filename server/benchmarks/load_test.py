@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for the FastAPI server
+
+Starts main:app under uvicorn in a scratch directory, generates synthetic WAV
+inputs and drives the conversion, search, history and result endpoints with a
+fixed number of concurrent clients. Reports throughput, latency percentiles,
+error rates and server RSS, and writes the numbers as JSON so runs can be
+compared over time.
+
+Usage: python benchmarks/load_test.py [--concurrency N] [--requests N] [--durations 1,5,15]
+                                      [--scenarios convert,batch,search,history,results]
+                                      [--output results.json] [--url http://host:port]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["convert", "batch", "search", "history", "results"]
+SEARCH_QUERIES = ["khan", "deep", "voice", "smooth", "tamil", "kapoor", "romantic", "bollywood"]
+SAMPLE_RATE = 16000
+
+
+def synthetic_wav(duration: float, seed: int = 0) -> bytes:
+    """Voiced-speech-like test signal: a gliding harmonic tone with syllable-rate amplitude"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t) + rng.uniform(-10, 10)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    signal = 0.2 * voice * envelope + 0.005 * rng.standard_normal(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def unique_variant(wav_bytes: bytes, counter: int) -> bytes:
+    """Same audio with the last sample nudged so every upload misses the conversion cache"""
+    data = bytearray(wav_bytes)
+    data[-2:] = counter.to_bytes(4, "little")[:2]
+    return bytes(data)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(round(q / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def read_rss(pid: int):
+    """Resident set size of ``pid`` in bytes, or None when it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """uvicorn running main:app in a scratch working directory"""
+
+    def __init__(self, port: int, workers: int = 1):
+        self.port = port
+        self.workers = workers
+        self.url = f"http://127.0.0.1:{port}"
+        self.workdir = tempfile.TemporaryDirectory(prefix="voice-load-")
+        self.process = None
+
+    def start(self, timeout: float = 60.0):
+        # Samples and images are read relative to the working directory
+        os.symlink(os.path.join(SERVER_DIR, "static"), os.path.join(self.workdir.name, "static"))
+        command = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--app-dir", SERVER_DIR,
+            "--host", "127.0.0.1",
+            "--port", str(self.port),
+            "--log-level", "warning",
+            "--workers", str(self.workers),
+        ]
+        self.process = subprocess.Popen(command, cwd=self.workdir.name)
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                if httpx.get(self.url + "/", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError("Server did not become ready in time")
+
+    def pids(self):
+        """The server process and, with several workers, its children"""
+        pids = [self.process.pid]
+        try:
+            with open(f"/proc/{self.process.pid}/task/{self.process.pid}/children") as f:
+                pids.extend(int(pid) for pid in f.read().split())
+        except OSError:
+            pass
+        return pids
+
+    def rss(self):
+        values = [read_rss(pid) for pid in self.pids()]
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.workdir.cleanup()
+
+
+class LoadRunner:
+    def __init__(self, client, args, celebrities, inputs, rss=None):
+        self.client = client
+        self.args = args
+        self.celebrities = celebrities
+        self.inputs = inputs
+        self.rss = rss
+        self.converted = []
+        self.counter = 0
+
+    def _next_input(self):
+        self.counter += 1
+        duration = random.choice(list(self.inputs))
+        data = self.inputs[duration]
+        if not self.args.cache_hits:
+            data = unique_variant(data, self.counter)
+        return f"bench_{duration:g}s_{self.counter}.wav", data
+
+    async def convert(self, i):
+        name, data = self._next_input()
+        response = await self.client.post(
+            "/convert",
+            files={"file": (name, data, "audio/wav")},
+            data={"celebrity": random.choice(self.celebrities)},
+        )
+        if response.status_code == 200:
+            self.converted.append(response.json()["converted"])
+        return response.status_code
+
+    async def batch(self, i):
+        files = [("files", (name, data, "audio/wav"))
+                 for name, data in (self._next_input() for _ in range(self.args.batch_size))]
+        response = await self.client.post(
+            "/convert/batch", files=files, data={"celebrity": random.choice(self.celebrities)}
+        )
+        if response.status_code != 202:
+            return response.status_code
+
+        # A batch request is finished when its job is
+        status_url = response.json()["status_url"]
+        while True:
+            status = await self.client.get(status_url)
+            if status.status_code != 200:
+                return status.status_code
+            job = status.json()
+            if job["status"] not in ("queued", "running"):
+                self.converted.extend(f["converted"] for f in job["files"] if f["status"] == "completed")
+                return 200 if job["status"] == "completed" else 500
+            await asyncio.sleep(0.05)
+
+    async def search(self, i):
+        response = await self.client.get("/celebrities", params={"search": random.choice(SEARCH_QUERIES)})
+        return response.status_code
+
+    async def history(self, i):
+        response = await self.client.get("/history", params={"limit": 50})
+        return response.status_code
+
+    async def results(self, i):
+        if not self.converted:
+            return None
+        response = await self.client.get(f"/results/{random.choice(self.converted)}")
+        return response.status_code
+
+    async def run(self, scenario, requests):
+        """Run ``requests`` calls of ``scenario`` from ``concurrency`` clients"""
+        operation = getattr(self, scenario)
+        latencies = []
+        statuses = {}
+        errors = 0
+        issued = 0
+        rss_peak = self.rss() if self.rss else None
+
+        async def worker():
+            nonlocal issued, errors
+            while issued < requests:
+                issued += 1
+                started = time.perf_counter()
+                try:
+                    status = await operation(issued)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if status is None:
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status != 200:
+                    errors += 1
+
+        async def sample_rss():
+            nonlocal rss_peak
+            while True:
+                await asyncio.sleep(0.25)
+                value = self.rss()
+                if value is not None:
+                    rss_peak = max(rss_peak or 0, value)
+
+        sampler = asyncio.create_task(sample_rss()) if self.rss else None
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+        if sampler:
+            sampler.cancel()
+
+        latencies.sort()
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        completed = len(latencies)
+        return {
+            "requests": completed,
+            "errors": errors,
+            "error_rate": errors / completed if completed else None,
+            "statuses": statuses,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+            "latency_ms": {
+                "mean": ms(sum(latencies) / completed) if completed else None,
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(latencies[-1] if latencies else None),
+            },
+            "server_rss_mb": {
+                "peak": round(rss_peak / 2 ** 20, 1) if rss_peak else None,
+                "end": round(self.rss() / 2 ** 20, 1) if self.rss and self.rss() else None,
+            },
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args, url, rss):
+    inputs = {duration: synthetic_wav(duration, seed=i) for i, duration in enumerate(args.durations)}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        catalog = (await client.get("/celebrities")).json()["celebrities"]
+        celebrities = [celebrity["id"] for celebrity in catalog]
+        runner = LoadRunner(client, args, celebrities, inputs, rss)
+
+        results = {}
+        for scenario in args.scenarios:
+            requests = args.requests if scenario not in ("convert", "batch") else args.convert_requests
+            print(f"Running {scenario} ({requests} requests, concurrency {args.concurrency})...", file=sys.stderr)
+            results[scenario] = await runner.run(scenario, requests)
+        return results
+
+
+def print_table(results):
+    print(f"{'scenario':<10}{'req':>7}{'err%':>7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for scenario, r in results.items():
+        error_rate = (r["error_rate"] or 0) * 100
+        fmt = lambda value: f"{value:.1f}" if value is not None else "-"
+        print(f"{scenario:<10}{r['requests']:>7}{error_rate:>7.1f}{fmt(r['throughput_rps']):>10}"
+              f"{fmt(r['latency_ms']['p50']):>10}{fmt(r['latency_ms']['p95']):>10}"
+              f"{fmt(r['latency_ms']['p99']):>10}{fmt(r['server_rss_mb']['peak']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per read-only scenario")
+    parser.add_argument("--convert-requests", type=int, default=50, help="Requests per conversion scenario")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--durations", default="1,5,15", help="Comma-separated input durations in seconds")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--cache-hits", action="store_true", help="Reuse identical inputs so conversions hit the cache")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    if not HTTPX_AVAILABLE:
+        parser.error("httpx is required: pip install httpx")
+
+    args.durations = [float(value) for value in args.durations.split(",") if value]
+    args.scenarios = [value for value in args.scenarios.split(",") if value]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    random.seed(args.seed)
+
+    server = None
+    if args.url:
+        url, rss = args.url.rstrip("/"), None
+    else:
+        server = ServerProcess(free_port(), args.workers)
+        server.start()
+        url, rss = server.url, server.rss
+
+    try:
+        idle_rss = rss() if rss else None
+        results = asyncio.run(run_benchmark(args, url, rss))
+    finally:
+        if server:
+            server.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "url": args.url,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "convert_requests": args.convert_requests,
+            "batch_size": args.batch_size,
+            "durations_s": args.durations,
+            "cache_hits": args.cache_hits,
+            "seed": args.seed,
+        },
+        "server_idle_rss_mb": round(idle_rss / 2 ** 20, 1) if idle_rss else None,
+        "results": results,
+    }
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Throughput scaling with the number of server workers
+
+Runs the load benchmark against uvicorn with 1, 2, 4... worker processes
+sharing one SQLite job/result registry, and reports requests per second and
+the speedup over a single worker for each scenario. Batch jobs are polled
+over pooled connections that land on different workers, so the batch
+scenario also checks that every worker can report on every job.
+
+Usage: python benchmarks/worker_scaling.py [--workers 1,2,4] [--scenarios convert,batch,search]
+                                           [--concurrency N] [--output scaling.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from load_test import (
+    HTTPX_AVAILABLE,
+    SCENARIOS,
+    ServerProcess,
+    free_port,
+    git_revision,
+    run_benchmark,
+)
+
+
+def run_with_workers(args, workers: int):
+    """Benchmark one server started with ``workers`` processes"""
+    # Each worker gets its share of the cores for its conversion pool
+    os.environ["VOICE_ENGINE_WORKERS"] = str(max((os.cpu_count() or 1) // workers, 1))
+    os.environ["VOICE_REGISTRY"] = "sqlite:///registry.db"
+    random.seed(args.seed)
+
+    server = ServerProcess(free_port(), workers)
+    server.start()
+    try:
+        return asyncio.run(run_benchmark(args, server.url, server.rss))
+    finally:
+        server.stop()
+
+
+def print_table(runs):
+    baseline = runs[0]["results"]
+    print(f"{'workers':>8}{'scenario':>10}{'req/s':>10}{'speedup':>9}{'p95 ms':>10}{'err%':>7}")
+    for run in runs:
+        for scenario, r in run["results"].items():
+            base = baseline[scenario]["throughput_rps"]
+            speedup = r["throughput_rps"] / base if base and r["throughput_rps"] else None
+            print(f"{run['workers']:>8}{scenario:>10}{r['throughput_rps'] or 0:>10.1f}"
+                  f"{(f'{speedup:.2f}x' if speedup else '-'):>9}"
+                  f"{r['latency_ms']['p95'] or 0:>10.1f}{(r['error_rate'] or 0) * 100:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per read-only scenario")
+    parser.add_argument("--convert-requests", type=int, default=100, help="Requests per conversion scenario")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--durations", default="1,5", help="Comma-separated input durations in seconds")
+    parser.add_argument("--scenarios", default="convert,batch,search")
+    parser.add_argument("--cache-hits", action="store_true", help="Reuse identical inputs so conversions hit the cache")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    if not HTTPX_AVAILABLE:
+        parser.error("httpx is required: pip install httpx")
+
+    worker_counts = [int(value) for value in args.workers.split(",") if value]
+    args.durations = [float(value) for value in args.durations.split(",") if value]
+    args.scenarios = [value for value in args.scenarios.split(",") if value]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    runs = []
+    for workers in worker_counts:
+        print(f"\n== {workers} worker(s) ==", file=sys.stderr)
+        runs.append({"workers": workers, "results": run_with_workers(args, workers)})
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "workers": worker_counts,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "convert_requests": args.convert_requests,
+            "batch_size": args.batch_size,
+            "durations_s": args.durations,
+            "cache_hits": args.cache_hits,
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+
+    print_table(runs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
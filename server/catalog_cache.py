@@ -0,0 +1,169 @@
+"""
+Precompressed catalog responses
+The catalog endpoints serialize the same few documents over and over. Each
+response body is built once per catalog version and query, stored as JSON
+together with its gzip and brotli encodings, and served by content
+negotiation with an ETag so unchanged clients get a 304.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+from http_files import etag_matches
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Distinct (version, query) responses kept in memory
+CATALOG_CACHE_ENTRIES = int(os.environ.get("VOICE_CATALOG_CACHE_ENTRIES", "1024"))
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+# Clients may keep a copy but must revalidate it, which costs a 304
+CATALOG_CACHE_CONTROL = "public, no-cache"
+
+# Preferred order when the client accepts several encodings equally
+ENCODING_PREFERENCE = ("br", "gzip", "identity")
+
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """Quality value per coding named in Accept-Encoding"""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header: Optional[str], available: List[str]) -> str:
+    """Best of ``available`` for an Accept-Encoding header, preferring compression on ties"""
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*")
+    best, best_quality = "identity", 0.0
+    for coding in ENCODING_PREFERENCE:
+        if coding not in available and coding != "identity":
+            continue
+        # Identity is acceptable unless refused; other codings only when named
+        default = 1.0 if coding == "identity" else 0.0
+        quality = accepted.get(coding, wildcard if wildcard is not None else default)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def encode_body(payload: Any) -> Dict[str, bytes]:
+    """JSON body of ``payload`` and every compressed form worth keeping"""
+    # Same separators as FastAPI's JSONResponse
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        # mtime=0 keeps the bytes identical across processes and restarts
+        bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if BROTLI_AVAILABLE:
+            bodies["br"] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+    return bodies
+
+
+class CatalogResponseCache:
+    """LRU of encoded catalog responses, scoped to the current catalog version
+
+    ``version`` is called on every lookup; when it returns something new the
+    cache is emptied, so edits to the catalog are visible on the next request.
+    """
+
+    def __init__(self, version: Callable[[], str], max_entries: int = CATALOG_CACHE_ENTRIES):
+        self.version = version
+        self.max_entries = max(max_entries, 1)
+        self.entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[str, Optional[Dict[str, Any]]]:
+        version = self.version()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self.entries.clear()
+                self._version = version
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return version, entry
+
+    def _store(self, version: str, key: Hashable, entry: Dict[str, Any]):
+        with self._lock:
+            if version != self._version:
+                return  # The catalog changed while this was being built
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def respond(self, request: Request, key: Hashable, build: Callable[[], Any]) -> Response:
+        """Cached response for ``key``, calling ``build`` for the payload on a miss"""
+        version, entry = self._lookup(key)
+        if entry is None:
+            bodies = await run_in_threadpool(encode_body, build())
+            digest = hashlib.sha256(bodies["identity"]).hexdigest()[:16]
+            entry = {"bodies": bodies, "etag": f'"{version}-{digest}"'}
+            self._store(version, key, entry)
+
+        headers = {
+            "etag": entry["etag"],
+            "cache-control": CATALOG_CACHE_CONTROL,
+            "vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry["etag"]):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        coding = negotiate_encoding(request.headers.get("accept-encoding"), list(entry["bodies"]))
+        if coding != "identity":
+            headers["content-encoding"] = coding
+        return Response(content=entry["bodies"][coding], headers=headers, media_type="application/json")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self.entries.values())
+        return {
+            "version": self._version,
+            "entries": len(entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(len(body) for entry in entries for body in entry["bodies"].values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "brotli": BROTLI_AVAILABLE,
+        }
@@ -3,6 +3,12 @@ Celebrity Voice Database for Indian Cinema Stars
 Contains comprehensive information about celebrities across different film industries
 """
 
+import bisect
+import hashlib
+import json
+import re
+import threading
+
 CELEBRITIES_DATABASE = {
     "bollywood": [
         {
@@ -326,39 +332,124 @@ CELEBRITIES_DATABASE = {
     ]
 }
 
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+LIST_FIELDS = ("languages", "notable_films", "voice_characteristics")
+
+
+def tokenize(text):
+    """Lowercase word tokens used by the search index"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def copy_celebrity(celebrity):
+    """A copy of a catalog entry, including its list fields, that the caller may modify"""
+    return {**celebrity, **{field: list(celebrity[field]) for field in LIST_FIELDS if field in celebrity}}
+
+
+class CelebrityCatalog:
+    """Read-only, indexed view of a celebrity database
+
+    Built once; id lookups and category listings are dictionary hits and
+    search walks an inverted token index, so the cost follows the number of
+    matches rather than the size of the catalog. The catalog keeps its own
+    copy of every entry and hands out copies, so nothing a caller does to
+    a result can change what later requests (or the version) see.
+    """
+
+    def __init__(self, database):
+        self.categories = tuple(database.keys())
+        self.by_category = {
+            category: tuple(copy_celebrity(celebrity) for celebrity in celebrities)
+            for category, celebrities in database.items()
+        }
+        self.celebrities = tuple(
+            celebrity for celebrities in self.by_category.values() for celebrity in celebrities
+        )
+        self.by_id = {celebrity["id"]: celebrity for celebrity in self.celebrities}
+        self.counts = {category: len(celebrities) for category, celebrities in self.by_category.items()}
+        self.version = hashlib.sha256(
+            json.dumps(database, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+        # token -> positions in self.celebrities, ascending
+        postings = {}
+        for position, celebrity in enumerate(self.celebrities):
+            text = " ".join([celebrity["name"], celebrity["bio"], *celebrity["voice_characteristics"]])
+            for token in set(tokenize(text)):
+                postings.setdefault(token, []).append(position)
+        self.postings = {token: tuple(positions) for token, positions in postings.items()}
+        self.tokens = sorted(self.postings)
+
+    def get(self, celebrity_id):
+        celebrity = self.by_id.get(celebrity_id)
+        return copy_celebrity(celebrity) if celebrity is not None else None
+
+    def _prefix_matches(self, prefix):
+        """Positions of celebrities with any token starting with ``prefix``"""
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\uffff", start)
+        if end - start == 1:
+            return set(self.postings[self.tokens[start]])
+        matches = set()
+        for token in self.tokens[start:end]:
+            matches.update(self.postings[token])
+        return matches
+
+    def search(self, query):
+        """Celebrities whose name, bio or characteristics contain every query word as a prefix"""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        positions = None
+        # Narrow with the longest (usually rarest) word first
+        for word in sorted(set(words), key=len, reverse=True):
+            matches = self._prefix_matches(word)
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                return []
+        return [copy_celebrity(self.celebrities[position]) for position in sorted(positions)]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """The indexed catalog, built on the first call"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CelebrityCatalog(CELEBRITIES_DATABASE)
+    return _catalog
+
+
 def get_all_celebrities():
     """Get all celebrities from all categories"""
-    all_celebrities = []
-    for category, celebrities in CELEBRITIES_DATABASE.items():
-        all_celebrities.extend(celebrities)
-    return all_celebrities
+    return [copy_celebrity(celebrity) for celebrity in get_catalog().celebrities]
 
 def get_celebrities_by_category(category):
     """Get celebrities by specific category"""
-    return CELEBRITIES_DATABASE.get(category, [])
+    return [copy_celebrity(celebrity) for celebrity in get_catalog().by_category.get(category, ())]
 
 def get_celebrity_by_id(celebrity_id):
     """Get specific celebrity by ID"""
-    for category, celebrities in CELEBRITIES_DATABASE.items():
-        for celebrity in celebrities:
-            if celebrity["id"] == celebrity_id:
-                return celebrity
-    return None
+    return get_catalog().get(celebrity_id)
 
 def get_categories():
     """Get all available categories"""
-    return list(CELEBRITIES_DATABASE.keys())
+    return list(get_catalog().categories)
+
+def get_category_counts():
+    """Get the number of celebrities in each category"""
+    return dict(get_catalog().counts)
+
+def get_catalog_version():
+    """Hash of the catalog contents; changes whenever any entry does"""
+    return get_catalog().version
 
 def search_celebrities(query):
-    """Search celebrities by name or characteristics"""
-    query = query.lower()
-    results = []
-    
-    for category, celebrities in CELEBRITIES_DATABASE.items():
-        for celebrity in celebrities:
-            if (query in celebrity["name"].lower() or 
-                query in celebrity["bio"].lower() or
-                any(query in char.lower() for char in celebrity["voice_characteristics"])):
-                results.append(celebrity)
-    
-    return results
\ No newline at end of file
+    """Search celebrities by name, bio or characteristics (word-prefix match)"""
+    return get_catalog().search(query)
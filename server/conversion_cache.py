@@ -0,0 +1,324 @@
+"""
+Content-addressed conversion cache
+Results are keyed by input audio hash, celebrity and engine parameters so a
+repeated submission returns the existing file instead of converting again
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from audio_decode import sniff_container
+from job_registry import RegistryBackend
+from voice_engine import ENGINE_NAME, ENGINE_VERSION, VoiceParams
+
+# How often a worker checks on a conversion another worker is running (seconds)
+SHARED_POLL_INTERVAL = 0.1
+SHARED_POLL_MAX = 1.0
+
+# Disk budget for cached results, configurable through the environment (megabytes)
+RESULT_CACHE_BYTES = int(os.environ.get("VOICE_RESULT_CACHE_MB", "1024")) * 1024 * 1024
+
+RESULT_PATTERN = re.compile(r"^(?P<celebrity>.+)_converted_(?P<key>[0-9a-f]{32})\.wav$")
+
+
+def conversion_key(input_sha256: str, celebrity_id: str, params: VoiceParams) -> str:
+    """Cache key for converting one input with one set of engine parameters"""
+    material = "|".join([
+        ENGINE_VERSION,
+        celebrity_id,
+        json.dumps(asdict(params), sort_keys=True),
+        input_sha256,
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def result_filename(celebrity_id: str, key: str) -> str:
+    return f"{celebrity_id}_converted_{key}.wav"
+
+
+def is_wav_result(path: str) -> bool:
+    """Whether ``path`` really holds WAV audio
+
+    Older servers copied undecodable uploads (WebM, Ogg, MP3) to result
+    names; those files are never indexed or adopted as conversions.
+    """
+    try:
+        with open(path, "rb") as f:
+            return sniff_container(f.read(12)) == "wav"
+    except OSError:
+        return False
+
+
+class LRUBlobStore:
+    """Size-bounded index of files in one directory, evicted least recently used first"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not os.path.exists(self.path(entry["filename"])):
+            # Removed behind our back; forget it
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        entry["accessed"] = time.time()
+        self.hits += 1
+        return entry
+
+    def store(self, key: str, filename: str, **metadata) -> Dict[str, Any]:
+        if key in self.entries:
+            self._drop(key)
+        size = os.path.getsize(self.path(filename))
+        entry = {"filename": filename, "size": size, "accessed": time.time(), **metadata}
+        self.entries[key] = entry
+        self.total_bytes += size
+        self._evict(keep=key)
+        return entry
+
+    def touch(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            entry["accessed"] = time.time()
+
+    def oldest_access(self) -> Optional[float]:
+        """Last access time of the least recently used entry"""
+        if not self.entries:
+            return None
+        return next(iter(self.entries.values()))["accessed"]
+
+    def evict_oldest(self) -> int:
+        """Evict the least recently used entry, returning the bytes freed"""
+        if not self.entries:
+            return 0
+        return self._remove(next(iter(self.entries)))
+
+    def expire(self, cutoff: float, limit: int) -> Tuple[int, int]:
+        """Evict up to ``limit`` entries last accessed before ``cutoff``
+
+        Returns (files, bytes) removed.
+        """
+        files = freed = 0
+        while files < limit and self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if entry["accessed"] >= cutoff:
+                break
+            freed += self._remove(key)
+            files += 1
+        return files, freed
+
+    def evict_bytes(self, amount: int) -> int:
+        """Evict least recently used entries until ``amount`` bytes are freed"""
+        freed = 0
+        while self.entries and freed < amount:
+            key = next(iter(self.entries))
+            freed += self._remove(key)
+        return freed
+
+    def _evict(self, keep: Optional[str] = None):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            if key == keep:
+                self.entries.move_to_end(key)
+                continue
+            self._remove(key)
+
+    def _remove(self, key: str) -> int:
+        entry = self._drop(key)
+        try:
+            os.remove(self.path(entry["filename"]))
+        except FileNotFoundError:
+            pass
+        self.evictions += 1
+        self.evicted_bytes += entry["size"]
+        return entry["size"]
+
+    def _drop(self, key: str) -> Dict[str, Any]:
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["size"]
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+class ConversionCache(LRUBlobStore):
+    """Converted results in ``directory``, deduplicated by conversion key
+
+    With a ``registry``, processes sharing ``directory`` also share results:
+    a key converted by one is adopted by the others, and a key being
+    converted elsewhere is waited for instead of converted twice.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = RESULT_CACHE_BYTES,
+                 registry: Optional[RegistryBackend] = None, scan: bool = True):
+        super().__init__(directory, max_bytes)
+        self.registry = registry
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self.shared_hits = 0
+        if scan:
+            self.open()
+
+    def open(self):
+        """Create the directory and index what is already in it
+
+        Runs from the constructor unless ``scan=False``, in which case the
+        owner calls it once before the first lookup (the server does so at
+        startup rather than at import).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.entries.clear()
+        self.total_bytes = 0
+        self._rebuild()
+
+    def _rebuild(self):
+        """Index results already on disk, oldest access first"""
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = RESULT_PATTERN.match(entry.name)
+                if match and entry.is_file() and is_wav_result(entry.path):
+                    stat = entry.stat()
+                    found.append((max(stat.st_atime, stat.st_mtime), match.group("key"), entry.name, stat.st_size))
+        for accessed, key, filename, size in sorted(found):
+            self.entries[key] = {"filename": filename, "size": size, "accessed": accessed, "engine": ENGINE_NAME}
+            self.total_bytes += size
+        self._evict()
+
+    async def get_or_convert(
+        self,
+        key: str,
+        filename: str,
+        convert: Callable[[str], Awaitable[Dict[str, Any]]],
+        on_wait: Optional[Callable[[], None]] = None,
+    ) -> Dict[str, Any]:
+        """Return the cached result for ``key`` or produce it with ``convert``
+
+        ``convert`` receives a temporary path to write to. Concurrent calls for
+        the same key share one conversion. The returned entry carries
+        ``cached`` to say whether any work was done and, when it was, the
+        engine's ``stats``. ``on_wait`` is called before waiting on a
+        conversion running elsewhere, in this process or another worker;
+        ``convert`` may still be called after it, if that worker gives up.
+        """
+        entry = self.lookup(key)
+        if entry is not None:
+            return {**entry, "cached": True}
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            if on_wait is not None:
+                on_wait()
+            return {**await asyncio.shield(pending), "cached": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        # Unique per process so workers sharing the directory never write the same file
+        partial = f"{self.path(filename)}.{os.getpid()}.part"
+        claimed = False
+        try:
+            if self.registry is not None:
+                entry = await self._wait_for_shared(key, filename, on_wait)
+                if entry is not None:
+                    future.set_result(entry)
+                    return {**entry, "cached": True}
+                claimed = True
+
+            # Undecodable input raises UnsupportedAudioError here, and nothing is kept
+            stats = await convert(partial)
+            os.replace(partial, self.path(filename))
+            entry = self.store(key, filename, engine=stats["engine"])
+            if claimed:
+                await run_in_threadpool(
+                    self.registry.complete_conversion, key, filename, entry["engine"], entry["size"]
+                )
+            future.set_result(entry)
+            return {**entry, "cached": False, "stats": stats}
+        except BaseException as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            if claimed:
+                try:
+                    await run_in_threadpool(self.registry.release_conversion, key)
+                except Exception as release_error:
+                    print(f"Error releasing conversion claim {key}: {release_error}")
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark the exception as retrieved when nobody else was waiting
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _adopt(self, key: str, filename: str, engine: str) -> Optional[Dict[str, Any]]:
+        """Index a result another process wrote, if its file is still there"""
+        if not is_wav_result(self.path(filename)):
+            return None
+        self.shared_hits += 1
+        return self.store(key, filename, engine=engine)
+
+    async def _wait_for_shared(self, key: str, filename: str,
+                               on_wait: Optional[Callable[[], None]] = None) -> Optional[Dict[str, Any]]:
+        """A result another worker produced, or None once this worker holds the claim"""
+        delay = SHARED_POLL_INTERVAL
+        while True:
+            shared = await run_in_threadpool(self.registry.get_result, key)
+            if shared is not None:
+                entry = self._adopt(key, shared["filename"], shared["engine"])
+                if entry is not None:
+                    return entry
+            if await run_in_threadpool(self.registry.claim_conversion, key):
+                # Someone may have finished between the lookup and the claim,
+                # or written the file before its row reached the registry
+                entry = self._adopt(key, filename, ENGINE_NAME)
+                if entry is not None:
+                    await run_in_threadpool(
+                        self.registry.complete_conversion, key, filename, entry["engine"], entry["size"]
+                    )
+                return entry
+            if on_wait is not None and delay == SHARED_POLL_INTERVAL:
+                on_wait()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHARED_POLL_MAX)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "coalesced": self.coalesced, "shared_hits": self.shared_hits,
+                "inflight": len(self._inflight)}
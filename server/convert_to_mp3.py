@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 """
-Script to convert WAV audio samples to MP3 format for better web compatibility
+Script to transcode WAV audio samples to MP3 (and other web formats)
+
+Samples are decoded once and encoded to every target format and bitrate in
+a worker process, in parallel across samples. A manifest of source hash,
+size and mtime means only new or changed samples are encoded on later runs.
+
+Usage: python convert_to_mp3.py [--targets mp3:128k,mp3:64k,ogg:64k] [--jobs N] [--force] [--dry-run] [--prune]
 """
 
+import argparse
+import hashlib
+import json
 import os
-import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 try:
@@ -14,66 +24,230 @@ except ImportError:
     PYDUB_AVAILABLE = False
     print("pydub not available. Install with: pip install pydub")
 
-def convert_wav_to_mp3(wav_path, mp3_path):
-    """Convert a WAV file to MP3"""
-    if not PYDUB_AVAILABLE:
-        return False
-    
+SAMPLES_DIR = Path(__file__).parent / "static" / "samples"
+MANIFEST_NAME = ".transcode_manifest.json"
+MANIFEST_VERSION = 1
+
+# Outputs at these bitrates keep the plain ``<sample>.<format>`` name the server already serves
+DEFAULT_BITRATES = {"mp3": "128k", "ogg": "64k", "opus": "48k", "m4a": "96k"}
+
+# Container and codec arguments for pydub/ffmpeg, per output extension
+FORMATS = {
+    "mp3": {"format": "mp3"},
+    "ogg": {"format": "ogg", "codec": "libvorbis"},
+    "opus": {"format": "opus", "codec": "libopus"},
+    "m4a": {"format": "ipod", "codec": "aac"},
+}
+
+DEFAULT_TARGETS = "mp3:128k"
+
+
+def parse_targets(spec):
+    """``mp3:128k,ogg:64k`` -> [("mp3", "128k"), ("ogg", "64k")]"""
+    targets = []
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        fmt, _, bitrate = item.partition(":")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        targets.append((fmt, bitrate or DEFAULT_BITRATES[fmt]))
+    return targets
+
+
+def output_name(source_name, fmt, bitrate):
+    stem = Path(source_name).stem
+    if bitrate == DEFAULT_BITRATES[fmt]:
+        return f"{stem}.{fmt}"
+    return f"{stem}_{bitrate}.{fmt}"
+
+
+def target_key(fmt, bitrate):
+    return f"{fmt}:{bitrate}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(samples_dir):
+    path = samples_dir / MANIFEST_NAME
     try:
-        # Load WAV file
-        audio = AudioSegment.from_wav(wav_path)
-        
-        # Export as MP3
-        audio.export(mp3_path, format="mp3", bitrate="128k")
-        
-        print(f"Converted: {wav_path} -> {mp3_path}")
-        return True
-        
-    except Exception as e:
-        print(f"Error converting {wav_path}: {e}")
+        with open(path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("samples", {})
+
+
+def save_manifest(samples_dir, samples):
+    path = samples_dir / MANIFEST_NAME
+    partial = path.with_suffix(".part")
+    with open(partial, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "samples": samples}, f, indent=2, sort_keys=True)
+    os.replace(partial, path)
+
+
+def output_ok(samples_dir, filename):
+    """An output counts only if it exists and is not an empty placeholder"""
+    try:
+        return (samples_dir / filename).stat().st_size > 0
+    except FileNotFoundError:
         return False
 
-def convert_all_samples():
-    """Convert all WAV samples to MP3"""
-    
-    # Get samples directory
-    samples_dir = Path(__file__).parent / "static" / "samples"
-    
+
+def plan_work(samples_dir, wav_files, targets, manifest, force=False):
+    """Decide which targets each sample still needs
+
+    Returns (work, manifest) where work maps source name to the targets to
+    encode. Sources whose size and mtime match the manifest are not hashed
+    again; a changed mtime with an unchanged hash only refreshes the manifest.
+    """
+    work = {}
+    updated = {}
+    for wav_file in wav_files:
+        st = wav_file.stat()
+        entry = dict(manifest.get(wav_file.name) or {})
+        entry.setdefault("outputs", {})
+
+        unchanged = entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+        if not unchanged:
+            sha256 = file_sha256(wav_file)
+            if sha256 != entry.get("sha256"):
+                entry["outputs"] = {}
+            entry.update(sha256=sha256, size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+        needed = [
+            (fmt, bitrate) for fmt, bitrate in targets
+            if force
+            or entry["outputs"].get(target_key(fmt, bitrate)) != output_name(wav_file.name, fmt, bitrate)
+            or not output_ok(samples_dir, output_name(wav_file.name, fmt, bitrate))
+        ]
+        if needed:
+            work[wav_file.name] = needed
+        updated[wav_file.name] = entry
+    return work, updated
+
+
+def transcode_sample(samples_dir, source_name, targets):
+    """Decode one sample and encode every requested target (runs in a worker process)"""
+    started = time.perf_counter()
+    audio = AudioSegment.from_file(str(Path(samples_dir) / source_name))
+
+    outputs = {}
+    errors = {}
+    for fmt, bitrate in targets:
+        filename = output_name(source_name, fmt, bitrate)
+        destination = Path(samples_dir) / filename
+        partial = destination.with_name(f".{filename}.part")
+        try:
+            audio.export(str(partial), bitrate=bitrate, **FORMATS[fmt])
+            os.replace(partial, destination)
+            outputs[target_key(fmt, bitrate)] = filename
+        except Exception as e:
+            if partial.exists():
+                partial.unlink()
+            errors[target_key(fmt, bitrate)] = str(e)
+    return {"outputs": outputs, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def prune_removed(samples_dir, manifest, wav_files, delete_outputs):
+    """Forget samples whose WAV is gone, optionally deleting their encoded files"""
+    present = {wav_file.name for wav_file in wav_files}
+    for name in [name for name in manifest if name not in present]:
+        for filename in manifest.pop(name).get("outputs", {}).values():
+            if delete_outputs and (samples_dir / filename).exists():
+                (samples_dir / filename).unlink()
+                print(f"Removed: {filename}")
+
+
+def convert_all_samples(samples_dir=SAMPLES_DIR, targets_spec=DEFAULT_TARGETS, jobs=None,
+                        force=False, dry_run=False, prune=False):
+    """Transcode new and changed WAV samples"""
+    samples_dir = Path(samples_dir)
     if not samples_dir.exists():
         print(f"Samples directory not found: {samples_dir}")
         return
-    
-    # Find all WAV files
-    wav_files = list(samples_dir.glob("*.wav"))
-    
+
+    wav_files = sorted(samples_dir.glob("*.wav"))
     if not wav_files:
         print("No WAV files found in samples directory")
         return
-    
-    print(f"Found {len(wav_files)} WAV files to convert")
-    
-    converted_count = 0
-    
-    for wav_file in wav_files:
-        # Create MP3 filename
-        mp3_file = wav_file.with_suffix('.mp3')
-        
-        # Skip if MP3 already exists
-        if mp3_file.exists():
-            print(f"MP3 already exists: {mp3_file.name}")
-            converted_count += 1
-            continue
-        
-        # Convert WAV to MP3
-        if convert_wav_to_mp3(str(wav_file), str(mp3_file)):
-            converted_count += 1
-    
-    print(f"\nConversion complete! {converted_count} files processed.")
-    
-    if not PYDUB_AVAILABLE:
+
+    targets = parse_targets(targets_spec)
+    manifest = load_manifest(samples_dir)
+    prune_removed(samples_dir, manifest, wav_files, delete_outputs=prune)
+    work, manifest = plan_work(samples_dir, wav_files, targets, manifest, force)
+
+    print(f"Found {len(wav_files)} WAV files, {len(work)} need encoding "
+          f"({sum(len(needed) for needed in work.values())} outputs)")
+
+    if dry_run:
+        for name, needed in work.items():
+            print(f"Would encode: {name} -> {', '.join(output_name(name, *target) for target in needed)}")
+        return
+
+    if work and not PYDUB_AVAILABLE:
         print("\nTo convert audio files, install pydub and ffmpeg:")
         print("pip install pydub")
         print("Also install ffmpeg for MP3 support")
+        return
+
+    started = time.perf_counter()
+    converted_count = 0
+    failed_count = 0
+    if work:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            futures = {
+                pool.submit(transcode_sample, str(samples_dir), name, needed): name
+                for name, needed in work.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error converting {name}: {e}")
+                    failed_count += 1
+                    continue
+
+                manifest[name]["outputs"].update(result["outputs"])
+                for key, error in result["errors"].items():
+                    print(f"Error converting {name} to {key}: {error}")
+                if result["errors"]:
+                    failed_count += 1
+                else:
+                    converted_count += 1
+                print(f"Converted: {name} -> {', '.join(result['outputs'].values())} ({result['elapsed']:.2f}s)")
+
+    save_manifest(samples_dir, manifest)
+    print(f"\nConversion complete! {converted_count} samples encoded, {failed_count} failed, "
+          f"{len(wav_files) - len(work)} up to date in {time.perf_counter() - started:.1f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcode WAV voice samples for the web")
+    parser.add_argument("--samples-dir", default=str(SAMPLES_DIR))
+    parser.add_argument("--targets", default=DEFAULT_TARGETS,
+                        help="Comma-separated format:bitrate list, e.g. mp3:128k,mp3:64k,ogg:64k")
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Re-encode everything")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be encoded")
+    parser.add_argument("--prune", action="store_true", help="Delete outputs of samples whose WAV was removed")
+    args = parser.parse_args()
+
+    try:
+        convert_all_samples(args.samples_dir, args.targets, args.jobs, args.force, args.dry_run, args.prune)
+    except ValueError as e:
+        parser.error(str(e))
+
 
 if __name__ == "__main__":
-    convert_all_samples()
\ No newline at end of file
+    main()
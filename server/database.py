@@ -4,23 +4,104 @@ SQLite database implementation to replace dictionary-based storage
 """
 
 import sqlite3
+import base64
 import json
 import os
+import queue
+import re
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional, Any
 from contextlib import contextmanager
 
 DATABASE_PATH = "celebrities.db"
 
+# Connections kept open per database
+POOL_SIZE = int(os.environ.get("VOICE_DB_POOL_SIZE", "8"))
+
+# Prepared statements cached by each connection
+STATEMENT_CACHE_SIZE = 256
+
+# Decoded query results kept; searches and ids come from requests, so the least
+# recently used results are dropped rather than letting the cache grow
+RESULT_CACHE_ENTRIES = 256
+
+JSON_FIELDS = ("languages", "notable_films", "voice_characteristics")
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by handler threads
+
+    Connections are opened lazily up to ``size`` and handed out one at a
+    time, so a connection (and the statements it has prepared) is never used
+    by two threads at once.
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
 class CelebrityDatabase:
-    def __init__(self, db_path: str = DATABASE_PATH):
+    def __init__(self, db_path: str = DATABASE_PATH, pool_size: int = POOL_SIZE):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.fts_enabled = False
+        # Decoded rows, least recently used first, dropped whenever the celebrities table is written
+        self._cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._generation = 0
+        self._cache_lock = threading.Lock()
         self.init_database()
-    
+
     def init_database(self):
         """Initialize the database with required tables"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
+
             # Create celebrities table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS celebrities (
@@ -39,7 +120,15 @@ class CelebrityDatabase:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_celebrities_category_popularity
+                ON celebrities (category, popularity DESC)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_celebrities_popularity
+                ON celebrities (popularity DESC)
+            ''')
+
             # Create categories table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS categories (
@@ -49,7 +138,7 @@ class CelebrityDatabase:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-            
+
             # Create conversion_history table for future use
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS conversion_history (
@@ -62,30 +151,148 @@ class CelebrityDatabase:
                     FOREIGN KEY (celebrity_id) REFERENCES celebrities (id)
                 )
             ''')
-            
+
+            # Older databases predate the size column
+            cursor.execute("PRAGMA table_info(conversion_history)")
+            if "size_bytes" not in {row["name"] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE conversion_history ADD COLUMN size_bytes INTEGER")
+
+            # Newest-first keyset pagination, overall and per celebrity
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_history_time
+                ON conversion_history (conversion_time DESC, id DESC)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_history_celebrity_time
+                ON conversion_history (celebrity_id, conversion_time DESC, id DESC)
+            ''')
+
+            self.fts_enabled = self._init_search_index(cursor)
+
             conn.commit()
-    
+
+    def _init_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """Create the FTS5 index over celebrities and the triggers that keep it in sync"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'celebrities_fts'")
+        existed = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS celebrities_fts USING fts5(
+                    name, bio, voice_characteristics,
+                    content='celebrities', content_rowid='rowid',
+                    tokenize='unicode61'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 unavailable, falling back to LIKE search: {e}")
+            return False
+
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS celebrities_fts_insert AFTER INSERT ON celebrities BEGIN
+                INSERT INTO celebrities_fts (rowid, name, bio, voice_characteristics)
+                VALUES (new.rowid, new.name, new.bio, new.voice_characteristics);
+            END;
+            CREATE TRIGGER IF NOT EXISTS celebrities_fts_delete AFTER DELETE ON celebrities BEGIN
+                INSERT INTO celebrities_fts (celebrities_fts, rowid, name, bio, voice_characteristics)
+                VALUES ('delete', old.rowid, old.name, old.bio, old.voice_characteristics);
+            END;
+            CREATE TRIGGER IF NOT EXISTS celebrities_fts_update AFTER UPDATE ON celebrities BEGIN
+                INSERT INTO celebrities_fts (celebrities_fts, rowid, name, bio, voice_characteristics)
+                VALUES ('delete', old.rowid, old.name, old.bio, old.voice_characteristics);
+                INSERT INTO celebrities_fts (rowid, name, bio, voice_characteristics)
+                VALUES (new.rowid, new.name, new.bio, new.voice_characteristics);
+            END;
+        ''')
+
+        if not existed:
+            # Index rows written before the FTS table existed
+            cursor.execute("INSERT INTO celebrities_fts (celebrities_fts) VALUES ('rebuild')")
+        return True
+
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+        """Context manager for pooled database connections"""
+        conn = self.pool.acquire()
         try:
             yield conn
         finally:
-            conn.close()
-    
+            self.pool.release(conn)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close()
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        celebrity = dict(row)
+        # Parse JSON fields
+        for field in JSON_FIELDS:
+            celebrity[field] = json.loads(celebrity[field])
+        return celebrity
+
+    def _cached(self, key: Any, load):
+        """Return the cached value for ``key``, loading it on a miss
+
+        The value is shared by every caller; the public getters hand out
+        copies through ``_copy`` so that no caller can change it. At most
+        RESULT_CACHE_ENTRIES values are kept.
+        """
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            generation = self._generation
+        value = load()
+        with self._cache_lock:
+            # Don't store results read before a concurrent write
+            if self._generation == generation:
+                self._cache[key] = value
+                while len(self._cache) > RESULT_CACHE_ENTRIES:
+                    self._cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _copy(rows: List[Any]) -> List[Any]:
+        """Copies of cached rows, including their list fields, that callers may modify"""
+        return [
+            {**row, **{field: list(row[field]) for field in JSON_FIELDS}} if isinstance(row, dict) else row
+            for row in rows
+        ]
+
+    def _invalidate(self):
+        with self._cache_lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def _fetch_celebrities(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._decode(row) for row in rows]
+
     def insert_celebrity(self, celebrity_data: Dict[str, Any]) -> bool:
         """Insert a new celebrity into the database"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                
+
+                # Upsert rather than REPLACE so the FTS update trigger fires
                 cursor.execute('''
-                    INSERT OR REPLACE INTO celebrities 
-                    (id, name, image, bio, voice_sample, languages, popularity, 
+                    INSERT INTO celebrities
+                    (id, name, image, bio, voice_sample, languages, popularity,
                      debut_year, notable_films, voice_characteristics, category)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        name = excluded.name,
+                        image = excluded.image,
+                        bio = excluded.bio,
+                        voice_sample = excluded.voice_sample,
+                        languages = excluded.languages,
+                        popularity = excluded.popularity,
+                        debut_year = excluded.debut_year,
+                        notable_films = excluded.notable_films,
+                        voice_characteristics = excluded.voice_characteristics,
+                        category = excluded.category,
+                        updated_at = CURRENT_TIMESTAMP
                 ''', (
                     celebrity_data['id'],
                     celebrity_data['name'],
@@ -99,160 +306,177 @@ class CelebrityDatabase:
                     json.dumps(celebrity_data.get('voice_characteristics', [])),
                     celebrity_data['category']
                 ))
-                
+
                 conn.commit()
-                return True
+            self._invalidate()
+            return True
         except Exception as e:
             print(f"Error inserting celebrity: {e}")
             return False
-    
+
     def get_all_celebrities(self) -> List[Dict[str, Any]]:
         """Get all celebrities from the database"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM celebrities ORDER BY popularity DESC')
-                rows = cursor.fetchall()
-                
-                celebrities = []
-                for row in rows:
-                    celebrity = dict(row)
-                    # Parse JSON fields
-                    celebrity['languages'] = json.loads(celebrity['languages'])
-                    celebrity['notable_films'] = json.loads(celebrity['notable_films'])
-                    celebrity['voice_characteristics'] = json.loads(celebrity['voice_characteristics'])
-                    celebrities.append(celebrity)
-                
-                return celebrities
+            return self._copy(self._cached("all", lambda: self._fetch_celebrities(
+                'SELECT * FROM celebrities ORDER BY popularity DESC'
+            )))
         except Exception as e:
             print(f"Error fetching all celebrities: {e}")
             return []
-    
+
     def get_celebrities_by_category(self, category: str) -> List[Dict[str, Any]]:
         """Get celebrities by category"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT * FROM celebrities WHERE category = ? ORDER BY popularity DESC',
-                    (category,)
-                )
-                rows = cursor.fetchall()
-                
-                celebrities = []
-                for row in rows:
-                    celebrity = dict(row)
-                    # Parse JSON fields
-                    celebrity['languages'] = json.loads(celebrity['languages'])
-                    celebrity['notable_films'] = json.loads(celebrity['notable_films'])
-                    celebrity['voice_characteristics'] = json.loads(celebrity['voice_characteristics'])
-                    celebrities.append(celebrity)
-                
-                return celebrities
+            return self._copy(self._cached(("category", category), lambda: self._fetch_celebrities(
+                'SELECT * FROM celebrities WHERE category = ? ORDER BY popularity DESC',
+                (category,)
+            )))
         except Exception as e:
             print(f"Error fetching celebrities by category: {e}")
             return []
-    
+
     def get_celebrity_by_id(self, celebrity_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific celebrity by ID"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM celebrities WHERE id = ?', (celebrity_id,))
-                row = cursor.fetchone()
-                
-                if row:
-                    celebrity = dict(row)
-                    # Parse JSON fields
-                    celebrity['languages'] = json.loads(celebrity['languages'])
-                    celebrity['notable_films'] = json.loads(celebrity['notable_films'])
-                    celebrity['voice_characteristics'] = json.loads(celebrity['voice_characteristics'])
-                    return celebrity
-                
-                return None
+            rows = self._cached(("id", celebrity_id), lambda: self._fetch_celebrities(
+                'SELECT * FROM celebrities WHERE id = ?', (celebrity_id,)
+            ))
+            return self._copy(rows[:1])[0] if rows else None
         except Exception as e:
             print(f"Error fetching celebrity by ID: {e}")
             return None
-    
+
     def get_categories(self) -> List[str]:
         """Get all available categories"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT DISTINCT category FROM celebrities ORDER BY category')
-                rows = cursor.fetchall()
+            def load():
+                with self.get_connection() as conn:
+                    rows = conn.execute('SELECT DISTINCT category FROM celebrities ORDER BY category').fetchall()
                 return [row['category'] for row in rows]
+            return self._copy(self._cached("categories", load))
         except Exception as e:
             print(f"Error fetching categories: {e}")
             return []
-    
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """FTS5 query matching every word of ``query`` as a prefix"""
+        words = re.findall(r"\w+", query.lower())
+        return " ".join(f'"{word}"*' for word in words)
+
     def search_celebrities(self, query: str) -> List[Dict[str, Any]]:
         """Search celebrities by name or characteristics"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                search_query = f"%{query.lower()}%"
-                
-                cursor.execute('''
-                    SELECT * FROM celebrities 
-                    WHERE LOWER(name) LIKE ? 
-                       OR LOWER(bio) LIKE ? 
-                       OR LOWER(voice_characteristics) LIKE ?
-                    ORDER BY popularity DESC
-                ''', (search_query, search_query, search_query))
-                
-                rows = cursor.fetchall()
-                
-                celebrities = []
-                for row in rows:
-                    celebrity = dict(row)
-                    # Parse JSON fields
-                    celebrity['languages'] = json.loads(celebrity['languages'])
-                    celebrity['notable_films'] = json.loads(celebrity['notable_films'])
-                    celebrity['voice_characteristics'] = json.loads(celebrity['voice_characteristics'])
-                    celebrities.append(celebrity)
-                
-                return celebrities
+            if not self.fts_enabled:
+                return self._copy(self._cached(("search", query.lower()), lambda: self._search_like(query)))
+
+            expression = self._match_expression(query)
+            if not expression:
+                return []
+            return self._copy(self._cached(("search", expression), lambda: self._fetch_celebrities('''
+                SELECT c.* FROM celebrities_fts f
+                JOIN celebrities c ON c.rowid = f.rowid
+                WHERE celebrities_fts MATCH ?
+                ORDER BY c.popularity DESC
+            ''', (expression,))))
         except Exception as e:
             print(f"Error searching celebrities: {e}")
             return []
-    
-    def add_conversion_history(self, celebrity_id: str, original_filename: str, 
-                             converted_filename: str, status: str = 'completed') -> bool:
+
+    def _search_like(self, query: str) -> List[Dict[str, Any]]:
+        search_query = f"%{query.lower()}%"
+        return self._fetch_celebrities('''
+            SELECT * FROM celebrities
+            WHERE LOWER(name) LIKE ?
+               OR LOWER(bio) LIKE ?
+               OR LOWER(voice_characteristics) LIKE ?
+            ORDER BY popularity DESC
+        ''', (search_query, search_query, search_query))
+
+    def add_conversion_history(self, celebrity_id: str, original_filename: str,
+                             converted_filename: str, status: str = 'completed',
+                             size_bytes: Optional[int] = None) -> bool:
         """Add a conversion record to history"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO conversion_history 
-                    (celebrity_id, original_filename, converted_filename, status)
-                    VALUES (?, ?, ?, ?)
-                ''', (celebrity_id, original_filename, converted_filename, status))
-                
+                    INSERT INTO conversion_history
+                    (celebrity_id, original_filename, converted_filename, status, size_bytes)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (celebrity_id, original_filename, converted_filename, status, size_bytes))
+
                 conn.commit()
                 return True
         except Exception as e:
             print(f"Error adding conversion history: {e}")
             return False
-    
-    def get_conversion_history(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get conversion history"""
+
+    def get_conversion_history(self, limit: int = 50, celebrity_id: Optional[str] = None,
+                               before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Get conversion history, newest first
+
+        ``before`` is the ``(conversion_time, id)`` of the last row already
+        seen; rows strictly older than it are returned, so each page is an
+        index range scan regardless of how deep into the history it is.
+        """
+        conditions = []
+        params: List[Any] = []
+        if celebrity_id:
+            conditions.append("ch.celebrity_id = ?")
+            params.append(celebrity_id)
+        if before:
+            conditions.append("(ch.conversion_time, ch.id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT ch.*, c.name as celebrity_name 
+                cursor.execute(f'''
+                    SELECT ch.*, c.name as celebrity_name
                     FROM conversion_history ch
                     LEFT JOIN celebrities c ON ch.celebrity_id = c.id
-                    ORDER BY ch.conversion_time DESC
+                    {where}
+                    ORDER BY ch.conversion_time DESC, ch.id DESC
                     LIMIT ?
-                ''', (limit,))
-                
+                ''', (*params, limit))
+
                 rows = cursor.fetchall()
                 return [dict(row) for row in rows]
         except Exception as e:
             print(f"Error fetching conversion history: {e}")
             return []
 
-# Global database instance
-db = CelebrityDatabase()
+def encode_history_cursor(row: Dict[str, Any]) -> str:
+    """Opaque pagination cursor pointing just after ``row``"""
+    raw = f"{row['conversion_time']}|{row['id']}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_history_cursor(cursor: str) -> tuple:
+    """Inverse of encode_history_cursor; raises ValueError on malformed input"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    conversion_time, _, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").rpartition("|")
+    if not conversion_time:
+        raise ValueError("Malformed cursor")
+    return conversion_time, int(row_id)
+
+# Global database instance, opened (and its schema created) on first use
+_db: Optional[CelebrityDatabase] = None
+_db_lock = threading.Lock()
+
+def get_database() -> CelebrityDatabase:
+    """The shared CelebrityDatabase, created on the first call"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = CelebrityDatabase()
+    return _db
+
+def __getattr__(name: str):
+    # ``from database import db`` keeps working for scripts; importing the
+    # module alone no longer touches the disk
+    if name == "db":
+        return get_database()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
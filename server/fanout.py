@@ -0,0 +1,69 @@
+"""
+Fan-out conversion of one input to several voices
+Each target still goes through the conversion cache on its own key, so cached
+targets are skipped and concurrent requests coalesce as usual; the targets
+that do need converting are gathered into a single engine call that decodes
+and analyses the input once.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from voice_engine import VoiceParams, convert_file_many
+
+ConvertManyFunction = Callable[
+    [str, List[Tuple[str, VoiceParams]]],
+    Awaitable[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+]
+
+
+class SharedAnalysisGroup:
+    """Collects the targets of one input and converts them in one engine call
+
+    Every one of the ``expected`` participants must either call ``convert``
+    (it needs a conversion) or ``skip`` (its result came from somewhere
+    else). The engine call starts once all of them have reported.
+    """
+
+    def __init__(self, source: str, expected: int, convert_many: ConvertManyFunction = convert_file_many):
+        self.source = source
+        self.convert_many = convert_many
+        self.targets: List[Tuple[str, VoiceParams, asyncio.Future]] = []
+        self.shared_stages: Optional[Dict[str, Any]] = None
+        self._waiting = expected
+        self._task: Optional[asyncio.Task] = None
+
+    async def convert(self, destination: str, params: VoiceParams) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self.targets.append((destination, params, future))
+        self._arrive()
+        return await future
+
+    def skip(self):
+        self._arrive()
+
+    def _arrive(self):
+        self._waiting -= 1
+        if self._waiting == 0 and self.targets:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            self.shared_stages, results = await self.convert_many(
+                self.source, [(destination, params) for destination, params, _ in self.targets]
+            )
+        except BaseException as e:
+            for _, _, future in self.targets:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for (_, _, future), stats in zip(self.targets, results):
+            if not future.done():
+                future.set_result(stats)
+
+    async def join(self):
+        """Wait for the engine call, if one was made"""
+        if self._task is not None:
+            await asyncio.shield(self._task)
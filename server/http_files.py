@@ -0,0 +1,236 @@
+"""
+Conditional and ranged file responses
+Adds strong ETags, If-None-Match / If-Modified-Since revalidation and byte-range
+(206) support for audio files, sending the body with sendfile when the server allows it,
+or from memory for files already mapped (the sample archive)
+"""
+
+import hashlib
+import os
+import stat as stat_module
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional, Tuple
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Cache-Control for files whose name changes whenever their content does
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Cache-Control for files that may be replaced in place
+REVALIDATE_CACHE_CONTROL = "public, max-age=86400"
+
+CHUNK_SIZE = 64 * 1024
+
+# Content hashes keyed by (path, inode, size, mtime) so a file is only read once per version
+_etag_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+_etag_lock = threading.Lock()
+ETAG_CACHE_SIZE = 4096
+
+
+class FileRangeResponse(Response):
+    """Sends ``length`` bytes of ``path`` starting at ``offset``"""
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int,
+                 headers: dict, media_type: str):
+        headers = {**headers, "content-length": str(length)}
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            f = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                if "http.response.zerocopysend" in (scope.get("extensions") or {}):
+                    # The server copies straight from the page cache to the socket
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": f,
+                        "offset": self.offset,
+                        "count": self.length,
+                        "more_body": False,
+                    })
+                else:
+                    await anyio.to_thread.run_sync(f.seek, self.offset)
+                    remaining = self.length
+                    while remaining > 0:
+                        chunk = await anyio.to_thread.run_sync(f.read, min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                    if remaining > 0:
+                        # File shrank underneath us; end the response cleanly
+                        await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                await anyio.to_thread.run_sync(f.close)
+
+        if self.background is not None:
+            await self.background()
+
+
+class MemoryRangeResponse(Response):
+    """Sends ``length`` bytes of ``data`` (a buffer such as a mapped file slice) starting at ``offset``"""
+
+    def __init__(self, data: memoryview, offset: int, length: int, status_code: int,
+                 headers: dict, media_type: str):
+        headers = {**headers, "content-length": str(length)}
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.data = data
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            end = self.offset + self.length
+            for start in range(self.offset, end, CHUNK_SIZE):
+                chunk = bytes(self.data[start:min(start + CHUNK_SIZE, end)])
+                await send({"type": "http.response.body", "body": chunk, "more_body": start + CHUNK_SIZE < end})
+
+        if self.background is not None:
+            await self.background()
+
+
+def content_etag(path: str, st: os.stat_result) -> str:
+    """Strong ETag derived from the file's content"""
+    key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison used by If-None-Match"""
+    if header.strip() == "*":
+        return True
+    candidates = [value.strip() for value in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """True when the client's cached copy is still current"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file"""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into an inclusive (start, end)
+
+    Returns None when the header should be ignored (malformed or several
+    ranges) and raises RangeNotSatisfiable when it cannot be served.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first == "":
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def serve_file(request: Request, path: str, media_type: str,
+               cache_control: str = REVALIDATE_CACHE_CONTROL) -> Optional[Response]:
+    """Conditional, range-aware response for ``path``; None when it is not a regular file"""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not stat_module.S_ISREG(st.st_mode):
+        return None
+
+    return _conditional_response(
+        request, st.st_size, content_etag(path, st), st.st_mtime, formatdate(st.st_mtime, usegmt=True),
+        cache_control,
+        lambda offset, length, status, headers: FileRangeResponse(path, offset, length, status, headers, media_type),
+    )
+
+
+def serve_bytes(request: Request, data: memoryview, media_type: str, etag: str, mtime: float,
+                last_modified: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """``serve_file`` for content already in memory, with its validators computed in advance"""
+    return _conditional_response(
+        request, len(data), etag, mtime, last_modified, cache_control,
+        lambda offset, length, status, headers: MemoryRangeResponse(data, offset, length, status, headers, media_type),
+    )
+
+
+def _conditional_response(request: Request, size: int, etag: str, mtime: float, last_modified: str,
+                          cache_control: str, body: Callable[[int, int, int, dict], Response]) -> Response:
+    """304, 416, 206 or 200 for a resource of ``size`` bytes; ``body`` builds the last two"""
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+    if not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["last-modified"])):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return body(start, end - start + 1, 206, headers)
+
+    return body(0, size, 200, headers)
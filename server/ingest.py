@@ -0,0 +1,130 @@
+"""
+Streaming ingestion of uploaded audio files
+Copies an UploadFile to disk in fixed-size chunks so memory stays constant per request
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from audio_decode import CONTAINER_EXTENSIONS, parse_wav_header, sniff_container
+
+# Size of each read from the upload stream
+CHUNK_SIZE = 64 * 1024
+
+# Largest upload accepted, configurable through the environment (megabytes)
+MAX_UPLOAD_BYTES = int(os.environ.get("VOICE_MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+    )
+
+
+async def save_upload(
+    file: UploadFile,
+    destination: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Stream an upload to ``destination`` and describe what was written.
+
+    The body is copied ``chunk_size`` bytes at a time while a SHA-256 digest
+    is updated, so peak memory does not depend on the file size. Uploads
+    larger than ``max_bytes`` are rejected with 413 as soon as the limit is
+    crossed (or before reading, when the client declared the size) and the
+    partial file is removed.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    header = b""
+    size = 0
+
+    try:
+        with open(destination, "wb") as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                if len(header) < 4096:
+                    header += chunk[:4096 - len(header)]
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+    duration = None
+    wav_info = parse_wav_header(header)
+    if wav_info and wav_info["byte_rate"]:
+        data_size = wav_info.get("data_size")
+        if data_size is None or data_size in (0, 0xFFFFFFFF) or data_size > size:
+            # Streaming writers leave the size unset; fall back to what arrived
+            data_size = size - wav_info.get("data_offset", 44)
+        duration = data_size / wav_info["byte_rate"]
+
+    return {
+        "path": destination,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "duration": duration,
+        "container": sniff_container(header),
+    }
+
+
+async def save_upload_deduplicated(
+    file: UploadFile,
+    directory: str,
+    extension: Optional[str] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    require_audio: bool = False,
+    hold: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """Stream an upload into ``directory`` under its content hash
+
+    Identical uploads end up as one file; ``path`` in the result points at it
+    and ``duplicate`` says whether it was already there. The file extension
+    follows the container sniffed from the first bytes unless ``extension``
+    is given. With ``require_audio``, files that are no known audio container
+    are rejected with 415.
+
+    ``hold`` is awaited with the final path before looking for an existing
+    copy, so a copy another request is about to delete is either kept for
+    this one or replaced by this upload.
+    """
+    partial = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+    upload = await save_upload(file, partial, max_bytes=max_bytes)
+
+    if require_audio and upload["container"] is None:
+        os.remove(partial)
+        raise HTTPException(status_code=415, detail="Unrecognized audio format")
+
+    if extension is None:
+        extension = CONTAINER_EXTENSIONS.get(upload["container"], ".bin")
+    final = os.path.join(directory, f"{upload['sha256']}{extension}")
+    if hold is not None:
+        try:
+            await hold(final)
+        except BaseException:
+            os.remove(partial)
+            raise
+    duplicate = os.path.exists(final)
+    if duplicate:
+        os.remove(partial)
+    else:
+        os.replace(partial, final)
+
+    upload["path"] = final
+    upload["duplicate"] = duplicate
+    return upload
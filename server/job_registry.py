@@ -0,0 +1,388 @@
+"""
+Shared job and result registry
+Lets several server processes (uvicorn --workers N, or hosts sharing the
+results directory) see each other's batch jobs and finished conversions,
+makes sure only one of them converts a given input at a time, and keeps a
+shared upload from being deleted while any of them still reads it. The backend is
+chosen by VOICE_REGISTRY: ``memory`` for a single process, or
+``sqlite:///path/to/registry.db`` (the default) for anything that shares a disk.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from database import ConnectionPool
+
+REGISTRY_URL = os.environ.get("VOICE_REGISTRY", "sqlite:///registry.db")
+
+# A worker that claimed a conversion owns it for this long before others may take over
+CONVERSION_LEASE_SECONDS = float(os.environ.get("VOICE_CONVERSION_LEASE", "300"))
+
+# A hold on an upload lapses after this long, so a crashed worker's holds
+# cannot keep its uploads forever (seconds)
+UPLOAD_HOLD_SECONDS = float(os.environ.get("VOICE_UPLOAD_HOLD", "3600"))
+
+# Identifies this process in conversion claims
+WORKER_ID = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class RegistryBackend:
+    """Storage for job documents and for which conversions are done or in progress
+
+    Job documents carry a ``revision`` that grows with every change; a save
+    never replaces a newer revision, so snapshots may be written out of order.
+    """
+
+    def save_job(self, job: Dict[str, Any]):
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def prune_jobs(self, cutoff: float) -> int:
+        """Forget finished jobs last updated before ``cutoff``; returns how many"""
+        raise NotImplementedError
+
+    def get_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """The finished conversion for ``key`` (filename, engine, size), if any"""
+        raise NotImplementedError
+
+    def claim_conversion(self, key: str, owner: str = WORKER_ID,
+                         lease: float = CONVERSION_LEASE_SECONDS) -> bool:
+        """Take the right to convert ``key``; False while another worker's lease is live
+
+        A finished conversion can be claimed again, for when its file has
+        since been evicted; callers check ``get_result`` first.
+        """
+        raise NotImplementedError
+
+    def complete_conversion(self, key: str, filename: str, engine: str, size: int):
+        raise NotImplementedError
+
+    def release_conversion(self, key: str, owner: str = WORKER_ID):
+        """Give up an unfinished claim so another worker can retry"""
+        raise NotImplementedError
+
+    def hold_upload(self, path: str, owner: str = WORKER_ID, lease: float = UPLOAD_HOLD_SECONDS):
+        """Record that a conversion in ``owner`` needs the upload at ``path``"""
+        raise NotImplementedError
+
+    def release_upload(self, path: str, owner: str = WORKER_ID,
+                       when_unused: Optional[Callable[[], Any]] = None) -> Any:
+        """Drop one of ``owner``'s holds on ``path``, then ``if_unused(path, when_unused)``"""
+        raise NotImplementedError
+
+    def if_unused(self, path: str, action: Optional[Callable[[], Any]]) -> Any:
+        """Run ``action`` if no worker holds ``path`` and return its result (False otherwise)
+
+        The action runs while new holds are locked out, so a file it deletes
+        cannot be picked up by a concurrent ``hold_upload`` in the meantime.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+
+def _finished(job: Dict[str, Any]) -> bool:
+    return job["status"] not in ("queued", "running")
+
+
+class MemoryBackend(RegistryBackend):
+    """Registry that lives in this process only"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.conversions: Dict[str, Dict[str, Any]] = {}
+        # (path, owner) -> [holds, lease_until]
+        self.holds: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def save_job(self, job):
+        with self._lock:
+            current = self.jobs.get(job["id"])
+            if current is None or current["revision"] < job["revision"]:
+                self.jobs[job["id"]] = job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def prune_jobs(self, cutoff):
+        with self._lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if _finished(job) and job["updated_at"] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+        return len(expired)
+
+    def get_result(self, key):
+        with self._lock:
+            row = self.conversions.get(key)
+            return dict(row) if row and row["completed_at"] else None
+
+    def claim_conversion(self, key, owner=WORKER_ID, lease=CONVERSION_LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            row = self.conversions.get(key)
+            if row and row["owner"] not in (None, owner) and row["lease_until"] > now:
+                return False
+            self.conversions[key] = {"owner": owner, "lease_until": now + lease, "completed_at": None}
+            return True
+
+    def complete_conversion(self, key, filename, engine, size):
+        with self._lock:
+            self.conversions[key] = {"filename": filename, "engine": engine, "size": size,
+                                     "owner": None, "lease_until": 0.0, "completed_at": time.time()}
+
+    def release_conversion(self, key, owner=WORKER_ID):
+        with self._lock:
+            row = self.conversions.get(key)
+            if row and not row["completed_at"] and row["owner"] == owner:
+                del self.conversions[key]
+
+    def hold_upload(self, path, owner=WORKER_ID, lease=UPLOAD_HOLD_SECONDS):
+        now = time.time()
+        with self._lock:
+            hold = self.holds.get((path, owner))
+            count = hold[0] + 1 if hold and hold[1] > now else 1
+            self.holds[(path, owner)] = [count, now + lease]
+
+    def release_upload(self, path, owner=WORKER_ID, when_unused=None):
+        with self._lock:
+            hold = self.holds.get((path, owner))
+            if hold is not None:
+                hold[0] -= 1
+                if hold[0] <= 0:
+                    del self.holds[(path, owner)]
+            return self._if_unused(path, when_unused)
+
+    def if_unused(self, path, action):
+        with self._lock:
+            return self._if_unused(path, action)
+
+    def _if_unused(self, path, action):
+        now = time.time()
+        holders = [key for key in self.holds if key[0] == path]
+        if any(self.holds[key][1] > now for key in holders):
+            return False
+        for key in holders:
+            del self.holds[key]
+        return action() if action is not None else True
+
+
+class SQLiteBackend(RegistryBackend):
+    """Registry in a SQLite database shared by every worker on the host
+
+    Reads run concurrently under WAL; claims use ``BEGIN IMMEDIATE`` so the
+    check and the write happen under the database's write lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pool = ConnectionPool(path)
+        # The file and tables are created by the first query, not at startup
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _create_schema(self, conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                revision INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                document TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+            CREATE TABLE IF NOT EXISTS conversions (
+                key TEXT PRIMARY KEY,
+                filename TEXT,
+                engine TEXT,
+                size INTEGER,
+                owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                completed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS upload_holds (
+                path TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                holds INTEGER NOT NULL,
+                lease_until REAL NOT NULL,
+                PRIMARY KEY (path, owner)
+            );
+        """)
+
+    @contextmanager
+    def _connection(self):
+        conn = self.pool.acquire()
+        try:
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        self._create_schema(conn)
+                        self._schema_ready = True
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    @contextmanager
+    def _write(self):
+        """A transaction that holds the write lock from its first statement"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def save_job(self, job):
+        with self._write() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (id, revision, status, updated_at, document) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    revision = excluded.revision,
+                    status = excluded.status,
+                    updated_at = excluded.updated_at,
+                    document = excluded.document
+                WHERE excluded.revision > jobs.revision
+                """,
+                (job["id"], job["revision"], job["status"], job["updated_at"], json.dumps(job)),
+            )
+
+    def get_job(self, job_id):
+        with self._connection() as conn:
+            row = conn.execute("SELECT document FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["document"]) if row else None
+
+    def prune_jobs(self, cutoff):
+        with self._write() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ? AND status NOT IN ('queued', 'running')", (cutoff,)
+            )
+        return cursor.rowcount
+
+    def get_result(self, key):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT filename, engine, size, completed_at FROM conversions "
+                "WHERE key = ? AND completed_at IS NOT NULL",
+                (key,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def claim_conversion(self, key, owner=WORKER_ID, lease=CONVERSION_LEASE_SECONDS):
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT owner, lease_until FROM conversions WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row["owner"] not in (None, owner) and row["lease_until"] > now:
+                return False
+            conn.execute(
+                """
+                INSERT INTO conversions (key, owner, lease_until) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    owner = excluded.owner,
+                    lease_until = excluded.lease_until,
+                    completed_at = NULL
+                """,
+                (key, owner, now + lease),
+            )
+        return True
+
+    def complete_conversion(self, key, filename, engine, size):
+        with self._write() as conn:
+            conn.execute(
+                """
+                INSERT INTO conversions (key, filename, engine, size, owner, lease_until, completed_at)
+                VALUES (?, ?, ?, ?, NULL, 0, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    filename = excluded.filename,
+                    engine = excluded.engine,
+                    size = excluded.size,
+                    owner = NULL,
+                    lease_until = 0,
+                    completed_at = excluded.completed_at
+                """,
+                (key, filename, engine, size, time.time()),
+            )
+
+    def release_conversion(self, key, owner=WORKER_ID):
+        with self._write() as conn:
+            conn.execute(
+                "DELETE FROM conversions WHERE key = ? AND owner = ? AND completed_at IS NULL", (key, owner)
+            )
+
+    def hold_upload(self, path, owner=WORKER_ID, lease=UPLOAD_HOLD_SECONDS):
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                """
+                INSERT INTO upload_holds (path, owner, holds, lease_until) VALUES (?, ?, 1, ?)
+                ON CONFLICT (path, owner) DO UPDATE SET
+                    holds = CASE WHEN upload_holds.lease_until > ? THEN upload_holds.holds + 1 ELSE 1 END,
+                    lease_until = excluded.lease_until
+                """,
+                (path, owner, now + lease, now),
+            )
+
+    def release_upload(self, path, owner=WORKER_ID, when_unused=None):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE upload_holds SET holds = holds - 1 WHERE path = ? AND owner = ?", (path, owner)
+            )
+            conn.execute("DELETE FROM upload_holds WHERE path = ? AND owner = ? AND holds <= 0", (path, owner))
+            return self._if_unused(conn, path, when_unused)
+
+    def if_unused(self, path, action):
+        with self._write() as conn:
+            return self._if_unused(conn, path, action)
+
+    @staticmethod
+    def _if_unused(conn, path, action):
+        # Runs inside a write transaction, which keeps other workers' holds out until it commits
+        now = time.time()
+        held = conn.execute(
+            "SELECT 1 FROM upload_holds WHERE path = ? AND lease_until > ? LIMIT 1", (path, now)
+        ).fetchone()
+        if held:
+            return False
+        conn.execute("DELETE FROM upload_holds WHERE path = ?", (path,))
+        return action() if action is not None else True
+
+    def close(self):
+        self.pool.close()
+
+    def describe(self):
+        return {"backend": type(self).__name__, "path": self.path}
+
+
+BACKENDS = {
+    "memory": lambda location: MemoryBackend(),
+    "sqlite": SQLiteBackend,
+}
+
+
+def create_backend(url: str = REGISTRY_URL) -> RegistryBackend:
+    """Backend for a registry URL: ``memory`` or ``sqlite:///relative/or//absolute/path``"""
+    scheme, _, location = url.partition("://")
+    factory = BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"Unknown registry backend '{scheme}', expected one of: {', '.join(BACKENDS)}")
+    if scheme == "sqlite":
+        location = location[1:] if location.startswith("/") else location
+        if not location:
+            raise ValueError("sqlite registry URL needs a path, e.g. sqlite:///registry.db")
+    return factory(location)
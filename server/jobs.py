@@ -0,0 +1,190 @@
+"""
+Asynchronous job queue for batch conversions
+Files are converted in parallel by a bounded set of workers while clients poll for progress.
+Every change to a job is published to a registry so other server workers can report on it.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from conversion_cache import ConversionCache
+from job_registry import MemoryBackend, RegistryBackend
+from voice_engine import VoiceParams, convert_file
+
+ConvertFunction = Callable[[str, str, VoiceParams], Awaitable[Dict[str, Any]]]
+
+# Conversions from all jobs that may run at the same time
+JOB_CONCURRENCY = int(os.environ.get("VOICE_JOB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = int(os.environ.get("VOICE_JOB_TTL", "3600"))
+
+
+class JobQueue:
+    def __init__(self, cache: ConversionCache, concurrency: int = JOB_CONCURRENCY, ttl: int = JOB_TTL_SECONDS,
+                 on_complete: Optional[Callable[[str, Optional[str], Dict[str, Any]], Awaitable[None]]] = None,
+                 convert: ConvertFunction = convert_file,
+                 on_file_done: Optional[Callable[[str], Awaitable[None]]] = None,
+                 registry: Optional[RegistryBackend] = None):
+        self.cache = cache
+        # Where job status is published; jobs running here are also kept in self.jobs
+        self.registry = registry if registry is not None else MemoryBackend()
+        self.convert = convert
+        # Called with each file's upload path once it no longer needs converting
+        self.on_file_done = on_file_done
+        self.on_complete = on_complete
+        self.concurrency = max(concurrency, 1)
+        self.ttl = ttl
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    def submit(self, celebrity_id: str, celebrity_name: str, params: VoiceParams,
+               files: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Register a job for ``files`` and start converting them in the background
+
+        Each entry in ``files`` needs ``original``, ``upload_path``, ``key``
+        (the conversion cache key) and ``converted`` (the result filename).
+        """
+        self._prune()
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "celebrity": celebrity_id,
+            "celebrity_name": celebrity_name,
+            "status": "queued",
+            "revision": 0,
+            "created_at": now,
+            "updated_at": now,
+            "total": len(files),
+            "completed": 0,
+            "failed": 0,
+            "files": [
+                {
+                    "original": f["original"],
+                    "converted": f["converted"],
+                    "status": "queued",
+                    "error": None,
+                    "engine": None,
+                    "cached": False,
+                    "_upload_path": f["upload_path"],
+                    "_key": f["key"],
+                }
+                for f in files
+            ],
+        }
+        self.jobs[job["id"]] = job
+        # Published before returning so any worker can answer the first poll
+        self.registry.save_job(self._snapshot(job))
+
+        task = asyncio.create_task(self._run(job, params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job from this worker, or as last published by any worker"""
+        return self.jobs.get(job_id) or self.registry.get_job(job_id)
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of ``job`` for the registry, with a new revision and without internal fields"""
+        job["revision"] += 1
+        snapshot = {key: value for key, value in job.items() if key != "files"}
+        snapshot["files"] = [
+            {key: value for key, value in entry.items() if not key.startswith("_")}
+            for entry in job["files"]
+        ]
+        return snapshot
+
+    async def _publish(self, job: Dict[str, Any]):
+        try:
+            await run_in_threadpool(self.registry.save_job, self._snapshot(job))
+        except Exception as e:
+            print(f"Error publishing job {job['id']}: {e}")
+
+    def pending(self) -> int:
+        """Number of files still waiting or converting across all jobs"""
+        return sum(
+            1
+            for job in self.jobs.values()
+            for entry in job["files"]
+            if entry["status"] in ("queued", "running")
+        )
+
+    async def _run(self, job: Dict[str, Any], params: VoiceParams):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        job["status"] = "running"
+        job["updated_at"] = time.time()
+        await self._publish(job)
+        await asyncio.gather(*(self._convert(job, entry, params) for entry in job["files"]))
+
+        if job["failed"] == 0:
+            job["status"] = "completed"
+        elif job["completed"] == 0:
+            job["status"] = "failed"
+        else:
+            job["status"] = "partial"
+        job["updated_at"] = time.time()
+        await self._publish(job)
+
+    async def _convert(self, job: Dict[str, Any], entry: Dict[str, Any], params: VoiceParams):
+        async with self._semaphore:
+            entry["status"] = "running"
+            job["updated_at"] = time.time()
+            await self._publish(job)
+            try:
+                result = await self.cache.get_or_convert(
+                    entry["_key"],
+                    entry["converted"],
+                    lambda destination: self.convert(entry["_upload_path"], destination, params)
+                )
+                entry["engine"] = result["engine"]
+                entry["cached"] = result["cached"]
+                entry["compute_saved"] = result.get("stats", {}).get("compute_saved")
+                if self.on_complete:
+                    await self.on_complete(job["celebrity"], entry["original"], result)
+                entry["status"] = "completed"
+                job["completed"] += 1
+            except Exception as e:
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+                job["failed"] += 1
+            finally:
+                if self.on_file_done:
+                    await self.on_file_done(entry["_upload_path"])
+            job["updated_at"] = time.time()
+            if job["completed"] + job["failed"] < job["total"]:
+                # The last file's state goes out with the job's final status
+                await self._publish(job)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] not in ("queued", "running") and job["updated_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+        try:
+            self.registry.prune_jobs(cutoff)
+        except Exception as e:
+            print(f"Error pruning jobs: {e}")
+
+
+def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job status without the internal file paths"""
+    view = {key: value for key, value in job.items() if key != "files"}
+    view["progress"] = (job["completed"] + job["failed"]) / job["total"] if job["total"] else 1.0
+    view["files"] = [
+        {key: value for key, value in entry.items() if not key.startswith("_")}
+        for entry in job["files"]
+    ]
+    return view
+
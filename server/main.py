@@ -1,18 +1,61 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
 from starlette.staticfiles import StaticFiles
-from starlette.responses import FileResponse
+import asyncio
+import json
+import mimetypes
 import os
-import uuid
-import shutil
+import time
 from typing import Optional, List
 from celebrities import (
     get_all_celebrities,
     get_celebrities_by_category,
     get_celebrity_by_id,
     get_categories,
+    get_catalog_version,
+    get_category_counts,
     search_celebrities
 )
+from ingest import save_upload_deduplicated
+from voice_engine import convert_file, convert_file_many, params_for_celebrity, shutdown_executor, warm_executor
+from jobs import JobQueue, public_view
+from catalog_cache import CatalogResponseCache
+from fanout import SharedAnalysisGroup
+from job_registry import create_backend
+from conversion_cache import RESULT_PATTERN, ConversionCache, conversion_key, result_filename
+from database import decode_history_cursor, encode_history_cursor, get_database
+from http_files import IMMUTABLE_CACHE_CONTROL, serve_bytes, serve_file
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    AUDIO_SECONDS,
+    CONVERSIONS,
+    CONVERSIONS_IN_PROGRESS,
+    STAGE_SECONDS,
+    Counter,
+    DiskUsage,
+    Gauge,
+    MetricsMiddleware,
+    registry
+)
+from retention import RetentionManager
+from voice_profiles import VoiceProfileStore
+from sample_archive import ARCHIVE_NAME, SampleArchive
+from similarity import SimilarityIndex, clip_embedding
+from audio_decode import UnsupportedAudioError, ffmpeg_available
+from warmup import Lazy, Warmup
+from admission import AdmissionController, AdmissionMiddleware, client_key
+from variants import VariantStore, media_type_for, negotiate_format, transcoding_available
+from streaming import (
+    MAX_STREAM_RATE,
+    MIN_STREAM_RATE,
+    STREAM_MAX_MESSAGE_BYTES,
+    STREAM_SAMPLE_RATE,
+    StreamingConverter,
+    float_to_pcm16,
+    pcm16_to_float
+)
 
 app = FastAPI(
     title="Celebrity Voice Changer API",
@@ -20,6 +63,16 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Gate for conversion uploads (VOICE_ADMISSION_*, VOICE_CLIENT_*); inside CORS so
+# browsers can read its 429/503 responses
+admission = AdmissionController()
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    paths=["/convert", "/convert/batch", "/convert/multi", "/celebrities/similar"],
+    on_wait=lambda seconds: STAGE_SECONDS.observe(seconds, stage="admission_wait")
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,20 +80,198 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the recorded latency covers the whole request
+app.add_middleware(MetricsMiddleware)
+
+# Server processes started by ``python main.py``; they share state through the registry
+SERVER_WORKERS = int(os.environ.get("VOICE_WORKERS", "1"))
+
+# The frontend records WebM, and only ffmpeg decodes it (or Ogg, MP3, ...), so
+# /ready fails without ffmpeg on PATH; 0 for a deployment that only takes WAV
+REQUIRE_FFMPEG = os.environ.get("VOICE_REQUIRE_FFMPEG", "1") == "1"
+
 # Directory setup
 UPLOAD_DIR = "uploads"
 RESULT_DIR = "results"
 STATIC_DIR = "static"
 IMAGES_DIR = os.path.join(STATIC_DIR, "images", "celebrities")
 SAMPLES_DIR = os.path.join(STATIC_DIR, "samples")
+VARIANT_DIR = os.path.join(RESULT_DIR, "variants")
+
+# Largest number of files accepted by /convert/batch
+BATCH_MAX_FILES = int(os.environ.get("VOICE_BATCH_MAX_FILES", "50"))
+
+# Most celebrities one /convert/multi request may target
+MULTI_MAX_TARGETS = int(os.environ.get("VOICE_MULTI_MAX_TARGETS", "10"))
+
+# Most batch files waiting for conversion before new batches are turned away
+BATCH_BACKLOG = int(os.environ.get("VOICE_BATCH_BACKLOG", "200"))
+
+def ensure_directories():
+    """Create the storage directories; runs at startup rather than at import"""
+    for directory in [UPLOAD_DIR, RESULT_DIR, STATIC_DIR, IMAGES_DIR, SAMPLES_DIR]:
+        os.makedirs(directory, exist_ok=True)
+
+# Mount static files (samples are served by a route below with range/ETag support);
+# the directory is checked on the first request instead of at import
+app.mount("/images", StaticFiles(directory=IMAGES_DIR, check_dir=False), name="images")
+
+def is_plain_filename(filename: str) -> bool:
+    """Reject names that could escape the served directory"""
+    return os.path.basename(filename) == filename and not filename.startswith(".")
+
+# Jobs and finished conversions shared with the other server workers (VOICE_REGISTRY)
+shared_registry = create_backend()
+
+# Converted results, indexed by content so repeated submissions are served from disk
+conversion_cache = ConversionCache(RESULT_DIR, registry=shared_registry, scan=False)
+catalog_responses = CatalogResponseCache(get_catalog_version)
 
-# Create directories
-for directory in [UPLOAD_DIR, RESULT_DIR, STATIC_DIR, IMAGES_DIR, SAMPLES_DIR]:
-    os.makedirs(directory, exist_ok=True)
+# MP3/M4A/Ogg copies of results, encoded when first downloaded
+variant_store = VariantStore(VARIANT_DIR, scan=False)
 
-# Mount static files
-app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
-app.mount("/samples", StaticFiles(directory=SAMPLES_DIR), name="samples")
+# Preview and sample clips packed by sample_archive.py, memory-mapped at startup
+sample_archive = Lazy(lambda: SampleArchive.open(os.path.join(STATIC_DIR, ARCHIVE_NAME), SAMPLES_DIR))
+
+# Target-speaker statistics built by voice_profiles.py, memory-mapped and shared between workers
+voice_profiles = Lazy(VoiceProfileStore.open)
+
+# Cosine ranking over the profiles' speaker embeddings for /celebrities/similar
+def load_similarity_index() -> SimilarityIndex:
+    index = SimilarityIndex(voice_profiles.get().table["id"], voice_profiles.get().table["embedding"])
+    # Clustered now (during warmup) so an approximate query never runs k-means
+    if index.centroids is None:
+        index.build_clusters()
+    return index
+
+similarity_index = Lazy(load_similarity_index)
+
+# Keeps uploads, results and variants within the disk budget and TTLs
+retention = RetentionManager(UPLOAD_DIR, RESULT_DIR, [conversion_cache, variant_store], registry=shared_registry)
+
+async def record_conversion(celebrity_id: str, original_filename: Optional[str], result: dict):
+    """Add a finished conversion to the history table without blocking the event loop"""
+    await run_in_threadpool(
+        lambda: get_database().add_conversion_history(
+            celebrity_id,
+            original_filename,
+            result["filename"],
+            "completed",
+            result["size"]
+        )
+    )
+
+def record_speech(stats: dict):
+    """Count the input's speech and the silence the engine skipped"""
+    if "speech_seconds" in stats:
+        AUDIO_SECONDS.inc(stats["speech_seconds"], region="speech")
+        AUDIO_SECONDS.inc(max(stats["duration"] - stats["speech_seconds"], 0.0), region="silence")
+
+async def convert_with_metrics(source: str, destination: str, params) -> dict:
+    """Run a conversion in the engine and record its stage timings"""
+    started = time.perf_counter()
+    with CONVERSIONS_IN_PROGRESS.track_inprogress():
+        stats = await convert_file(source, destination, params)
+    # Whatever the worker didn't spend converting was spent waiting for a free worker
+    STAGE_SECONDS.observe(max(time.perf_counter() - started - stats["elapsed"], 0.0), stage="engine_wait")
+    for stage, seconds in stats["stages"].items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    CONVERSIONS.inc(engine=stats["engine"])
+    record_speech(stats)
+    return stats
+
+async def convert_many_with_metrics(source: str, targets: list):
+    """Run a shared-analysis conversion in the engine and record its stage timings"""
+    with CONVERSIONS_IN_PROGRESS.track_inprogress():
+        shared, results = await convert_file_many(source, targets)
+    # Decode and analysis are paid once for all targets
+    for stage, seconds in shared.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    for stats in results:
+        for stage, seconds in stats["stages"].items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        CONVERSIONS.inc(engine=stats["engine"])
+    # Every target covers the same input, so its audio is counted once
+    if results:
+        record_speech(results[0])
+    return shared, results
+
+job_queue = JobQueue(
+    conversion_cache,
+    on_complete=record_conversion,
+    convert=convert_with_metrics,
+    on_file_done=retention.release_upload,
+    registry=shared_registry
+)
+
+registry.register(Gauge(
+    "voice_job_queue_depth",
+    "Batch files waiting for or undergoing conversion",
+    function=lambda: {(): job_queue.pending()}
+))
+registry.register(Gauge(
+    "voice_admission_active",
+    "Conversion requests holding an admission slot",
+    function=lambda: {(): admission.active}
+))
+registry.register(Gauge(
+    "voice_admission_queued",
+    "Conversion requests waiting for an admission slot",
+    function=lambda: {(): admission.queued}
+))
+registry.register(Counter(
+    "voice_admission_rejected_total",
+    "Conversion requests turned away by admission control, by reason",
+    ("reason",),
+    function=lambda: {(reason,): count for reason, count in admission.rejected.items()}
+))
+registry.register(Gauge(
+    "voice_disk_usage_bytes",
+    "Bytes used by stored audio, by directory",
+    ("directory",),
+    function=DiskUsage({"uploads": UPLOAD_DIR, "results": RESULT_DIR, "variants": VARIANT_DIR})
+))
+registry.register(Counter(
+    "voice_retention_reclaimed_bytes_total",
+    "Bytes deleted by the retention manager, by reason",
+    ("reason",),
+    function=lambda: {(reason,): size for reason, size in retention.reclaimed_bytes.items()}
+))
+registry.register(Counter(
+    "voice_retention_reclaimed_files_total",
+    "Files deleted by the retention manager, by reason",
+    ("reason",),
+    function=lambda: {(reason,): count for reason, count in retention.reclaimed_files.items()}
+))
+
+# Components initialized in the background once the server is up (VOICE_WARMUP);
+# anything not warmed is built by the first request that needs it
+warmup = Warmup()
+warmup.register("catalog", get_catalog_version)
+warmup.register("database", get_database)
+warmup.register("profiles", similarity_index.get)
+warmup.register("engine", warm_executor)
+
+@app.on_event("startup")
+async def start_background_work():
+    """Check decoders, create directories, map the sample archive, index stored results, then begin retention sweeps and warmup"""
+    if not ffmpeg_available():
+        print("Error: ffmpeg is not on PATH; only WAV uploads can be converted"
+              + (" and /ready will answer 503" if REQUIRE_FFMPEG else ""))
+    ensure_directories()
+    sample_archive.get()
+    conversion_cache.open()
+    variant_store.open()
+    retention.start()
+    warmup.start()
+
+@app.on_event("shutdown")
+async def stop_background_work():
+    """Stop warmup and retention sweeps and release the conversion process pool"""
+    await warmup.stop()
+    await retention.stop()
+    await run_in_threadpool(shutdown_executor)
+    shared_registry.close()
 
 @app.get("/")
 async def root():
@@ -51,100 +282,197 @@ async def root():
         "endpoints": {
             "celebrities": "/celebrities",
             "categories": "/categories",
+            "similar": "/celebrities/similar",
             "convert": "/convert",
+            "batch": "/convert/batch",
+            "multi": "/convert/multi",
+            "jobs": "/jobs/{job_id}",
+            "stream": "/ws/convert/{celebrity_id}",
+            "metrics": "/metrics",
+            "ready": "/ready",
             "results": "/results/{filename}"
         }
     }
 
 @app.get("/celebrities")
 async def get_celebrities(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category (bollywood, tollywood, kollywood, regional)"),
     search: Optional[str] = Query(None, description="Search celebrities by name or characteristics"),
     limit: Optional[int] = Query(None, description="Limit number of results")
 ):
     """Get all celebrities or filter by category/search"""
     try:
-        if search:
-            celebrities = search_celebrities(search)
-        elif category:
-            celebrities = get_celebrities_by_category(category)
-        else:
-            celebrities = get_all_celebrities()
-        
-        if limit:
-            celebrities = celebrities[:limit]
+        def build():
+            if search:
+                celebrities = search_celebrities(search)
+            elif category:
+                celebrities = get_celebrities_by_category(category)
+            else:
+                celebrities = get_all_celebrities()
             
+            if limit:
+                celebrities = celebrities[:limit]
+                
+            return {
+                "celebrities": celebrities,
+                "total": len(celebrities),
+                "category": category,
+                "search": search
+            }
+
+        return await catalog_responses.respond(request, ("celebrities", category, search, limit), build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/celebrities/similar")
+async def find_similar_celebrities(
+    file: UploadFile = File(...),
+    limit: int = Query(5, ge=1, le=50, description="Number of celebrities to return"),
+    approximate: Optional[bool] = Query(None, description="Use the clustered index; defaults to on for large catalogs")
+):
+    """Rank celebrities by how close their voice is to an uploaded clip"""
+    try:
+        index = await run_in_threadpool(similarity_index.get)
+        if not len(index):
+            raise HTTPException(status_code=503, detail="Voice profiles have not been built; run voice_profiles.py")
+
+        if not file.content_type or not file.content_type.startswith('audio/'):
+            raise HTTPException(status_code=400, detail="File must be an audio file")
+
+        with STAGE_SECONDS.time(stage="upload_save"):
+            upload = await save_upload_deduplicated(
+                file, UPLOAD_DIR, require_audio=True, hold=retention.hold_upload
+            )
+        try:
+            with STAGE_SECONDS.time(stage="embedding"):
+                embedding = await run_in_threadpool(clip_embedding, upload["path"])
+        except UnsupportedAudioError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        finally:
+            await retention.release_upload(upload["path"])
+        if embedding is None:
+            raise HTTPException(status_code=400, detail="Clip is too short to analyse")
+
+        with STAGE_SECONDS.time(stage="similarity_query"):
+            matches, used_index = await run_in_threadpool(index.query, embedding, limit, approximate)
+        results = []
+        for celebrity_id, score in matches:
+            celebrity = get_celebrity_by_id(celebrity_id)
+            if celebrity:
+                results.append({
+                    "celebrity": celebrity_id,
+                    "name": celebrity["name"],
+                    "category": celebrity.get("category"),
+                    "similarity": round(score, 4)
+                })
+
         return {
-            "celebrities": celebrities,
-            "total": len(celebrities),
-            "category": category,
-            "search": search
+            "matches": results,
+            "total": len(results),
+            "catalog_size": len(index),
+            "approximate": used_index
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/categories")
-async def get_celebrity_categories():
+async def get_celebrity_categories(request: Request):
     """Get all available celebrity categories"""
     try:
-        categories = get_categories()
-        category_info = {
-            "bollywood": {
-                "name": "Bollywood",
-                "description": "Hindi cinema stars",
-                "count": len(get_celebrities_by_category("bollywood"))
-            },
-            "tollywood": {
-                "name": "Tollywood",
-                "description": "Telugu cinema stars",
-                "count": len(get_celebrities_by_category("tollywood"))
-            },
-            "kollywood": {
-                "name": "Kollywood",
-                "description": "Tamil cinema stars",
-                "count": len(get_celebrities_by_category("kollywood"))
-            },
-            "regional": {
-                "name": "Regional",
-                "description": "Other regional cinema stars",
-                "count": len(get_celebrities_by_category("regional"))
+        def build():
+            categories = get_categories()
+            counts = get_category_counts()
+            category_info = {
+                "bollywood": {
+                    "name": "Bollywood",
+                    "description": "Hindi cinema stars",
+                    "count": counts.get("bollywood", 0)
+                },
+                "tollywood": {
+                    "name": "Tollywood",
+                    "description": "Telugu cinema stars",
+                    "count": counts.get("tollywood", 0)
+                },
+                "kollywood": {
+                    "name": "Kollywood",
+                    "description": "Tamil cinema stars",
+                    "count": counts.get("kollywood", 0)
+                },
+                "regional": {
+                    "name": "Regional",
+                    "description": "Other regional cinema stars",
+                    "count": counts.get("regional", 0)
+                }
             }
-        }
-        
-        return {
-            "categories": categories,
-            "category_info": category_info,
-            "total_celebrities": len(get_all_celebrities())
-        }
+            
+            return {
+                "categories": categories,
+                "category_info": category_info,
+                "total_celebrities": sum(counts.values())
+            }
+
+        return await catalog_responses.respond(request, ("categories",), build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/celebrity/{celebrity_id}")
-async def get_celebrity_details(celebrity_id: str):
+async def get_celebrity_details(celebrity_id: str, request: Request):
     """Get detailed information about a specific celebrity"""
     try:
         celebrity = get_celebrity_by_id(celebrity_id)
         if not celebrity:
             raise HTTPException(status_code=404, detail="Celebrity not found")
-        return celebrity
+        return await catalog_responses.respond(request, ("celebrity", celebrity_id), lambda: celebrity)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/celebrity/{celebrity_id}/profile")
+async def get_celebrity_voice_profile(celebrity_id: str):
+    """Get the precomputed voice statistics of a celebrity's sample"""
+    if not get_celebrity_by_id(celebrity_id):
+        raise HTTPException(status_code=404, detail="Celebrity not found")
+    profile = voice_profiles.get().describe(celebrity_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No voice profile built for this celebrity")
+    return profile
+
+def serve_archived(request: Request, entry: dict) -> Response:
+    """Respond with a slice of the mapped sample archive, validators precomputed"""
+    return serve_bytes(
+        request, entry["data"], entry["media_type"], entry["etag"], entry["mtime"], entry["last_modified"]
+    )
+
+def serve_sample(request: Request, filename: str, media_type: Optional[str] = None) -> Optional[Response]:
+    """A file of static/samples from the archive, or from disk when the archive lacks or predates it"""
+    archive = sample_archive.get()
+    entry = archive.get(filename)
+    if entry is not None:
+        return serve_archived(request, entry)
+    if archive.loaded and filename not in archive.stale:
+        return None
+    media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return serve_file(request, os.path.join(SAMPLES_DIR, filename), media_type)
+
 @app.get("/preview/{celebrity_id}")
-async def get_celebrity_voice_sample(celebrity_id: str):
+def get_celebrity_voice_sample(celebrity_id: str, request: Request):
     """Get voice sample for a specific celebrity"""
     try:
         celebrity = get_celebrity_by_id(celebrity_id)
         if not celebrity:
             raise HTTPException(status_code=404, detail="Celebrity not found")
         
-        sample_path = celebrity["voice_sample"].lstrip("/")
-        full_path = os.path.join(SAMPLES_DIR, f"{celebrity_id}_sample.wav")
+        entry = sample_archive.get().previews.get(celebrity_id)
+        if entry is not None:
+            return serve_archived(request, entry)
+        response = serve_sample(request, f"{celebrity_id}_sample.wav", "audio/wav")
         
-        if os.path.exists(full_path):
-            return FileResponse(full_path, media_type="audio/wav")
+        if response is not None:
+            return response
         else:
             # Return a placeholder or error
             return {"error": "Voice sample not available", "celebrity": celebrity["name"]}
@@ -153,6 +481,16 @@ async def get_celebrity_voice_sample(celebrity_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/samples/{filename}")
+def get_sample_file(filename: str, request: Request):
+    """Get a raw voice sample file"""
+    response = None
+    if is_plain_filename(filename):
+        response = serve_sample(request, filename)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return response
+
 @app.post("/convert")
 async def convert_voice(
     file: UploadFile = File(...),
@@ -169,25 +507,40 @@ async def convert_voice(
         if not file.content_type or not file.content_type.startswith('audio/'):
             raise HTTPException(status_code=400, detail="File must be an audio file")
         
-        filename = f"{uuid.uuid4()}.wav"
-        original_path = os.path.join(UPLOAD_DIR, filename)
+        # Stream the upload to disk in bounded chunks, stored under its content hash
+        with STAGE_SECONDS.time(stage="upload_save"):
+            upload = await save_upload_deduplicated(
+                file, UPLOAD_DIR, require_audio=True, hold=retention.hold_upload
+            )
 
-        # Save uploaded file
-        with open(original_path, "wb") as f:
-            f.write(await file.read())
+        try:
+            # Identical input + celebrity + engine parameters reuse the earlier result
+            params = params_for_celebrity(celebrity_data)
+            key = conversion_key(upload["sha256"], celebrity, params)
+            celebrity_filename = result_filename(celebrity, key)
 
-        # Simulate celebrity conversion (just copy the file for now)
-        # In a real implementation, this would use AI voice conversion
-        celebrity_filename = f"{celebrity}_converted_{filename}"
-        celebrity_path = os.path.join(RESULT_DIR, celebrity_filename)
-
-        shutil.copyfile(original_path, celebrity_path)
+            # Convert in the engine's process pool so the event loop stays free
+            result = await conversion_cache.get_or_convert(
+                key,
+                celebrity_filename,
+                lambda destination: convert_with_metrics(upload["path"], destination, params)
+            )
+        except UnsupportedAudioError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        finally:
+            await retention.release_upload(upload["path"])
+        await record_conversion(celebrity, file.filename, result)
 
         return {
             "success": True,
             "converted": celebrity_filename,
             "celebrity": celebrity_data["name"],
             "original_filename": file.filename,
+            "size": upload["size"],
+            "duration": upload["duration"],
+            "engine": result["engine"],
+            "cached": result["cached"],
+            "compute_saved": result.get("stats", {}).get("compute_saved"),
             "message": f"Voice successfully converted to {celebrity_data['name']}"
         }
     except HTTPException:
@@ -195,99 +548,420 @@ async def convert_voice(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/convert/batch")
+@app.post("/convert/batch", status_code=202)
 async def convert_voice_batch(
+    request: Request,
     files: List[UploadFile] = File(...),
     celebrity: str = Form(...)
 ):
-    """Convert multiple audio files to celebrity voice"""
+    """Queue multiple audio files for conversion and return a job ID to poll"""
     try:
         # Validate celebrity exists
         celebrity_data = get_celebrity_by_id(celebrity)
         if not celebrity_data:
             raise HTTPException(status_code=400, detail="Invalid celebrity ID")
         
-        if len(files) > 10:  # Limit batch size
-            raise HTTPException(status_code=400, detail="Maximum 10 files allowed per batch")
+        if len(files) > BATCH_MAX_FILES:  # Limit batch size
+            raise HTTPException(status_code=400, detail=f"Maximum {BATCH_MAX_FILES} files allowed per batch")
         
-        results = []
+        pending = job_queue.pending()
+        if pending + len(files) > BATCH_BACKLOG:
+            raise admission.reject("backlog", admission.retry_after(pending), "Too many batch files are waiting")
+        # Admission paid for one file; the rest come out of the client's bucket
+        admission.charge(client_key(request.scope), len(files) - 1)
         
-        for file in files:
-            if not file.content_type or not file.content_type.startswith('audio/'):
-                continue  # Skip non-audio files
-            
-            filename = f"{uuid.uuid4()}.wav"
-            original_path = os.path.join(UPLOAD_DIR, filename)
-
-            with open(original_path, "wb") as f:
-                f.write(await file.read())
+        params = params_for_celebrity(celebrity_data)
+        queued = []
+        
+        try:
+            for file in files:
+                if not file.content_type or not file.content_type.startswith('audio/'):
+                    continue  # Skip non-audio files
+                
+                # Uploads only live for the request, so they are saved before queueing
+                with STAGE_SECONDS.time(stage="upload_save"):
+                    try:
+                        upload = await save_upload_deduplicated(
+                            file, UPLOAD_DIR, require_audio=True, hold=retention.hold_upload
+                        )
+                    except HTTPException as e:
+                        if e.status_code == 415:
+                            continue  # Content-Type said audio, the bytes did not
+                        raise
 
-            celebrity_filename = f"{celebrity}_converted_{filename}"
-            celebrity_path = os.path.join(RESULT_DIR, celebrity_filename)
-            shutil.copyfile(original_path, celebrity_path)
-            
-            results.append({
-                "original": file.filename,
-                "converted": celebrity_filename
-            })
+                key = conversion_key(upload["sha256"], celebrity, params)
+                queued.append({
+                    "original": file.filename,
+                    "converted": result_filename(celebrity, key),
+                    "key": key,
+                    "upload_path": upload["path"]
+                })
+        except BaseException:
+            # The job never started, so nothing else will release these
+            for entry in queued:
+                await retention.release_upload(entry["upload_path"])
+            raise
+        
+        if not queued:
+            raise HTTPException(status_code=400, detail="No audio files in batch")
+        
+        # The job queue releases each upload once its file is converted
+        job = job_queue.submit(celebrity, celebrity_data["name"], params, queued)
         
         return {
             "success": True,
+            "job_id": job["id"],
+            "status": job["status"],
             "celebrity": celebrity_data["name"],
+            "total_files": job["total"],
+            "status_url": f"/jobs/{job['id']}",
+            "results_url": f"/jobs/{job['id']}/results"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/convert/multi")
+async def convert_voice_multi(
+    request: Request,
+    file: UploadFile = File(...),
+    celebrities: List[str] = Form(..., description="Celebrity IDs, repeated or comma-separated")
+):
+    """Convert one uploaded voice to several celebrity voices, analysing it only once"""
+    try:
+        # Duplicates would wait on their own conversion, so each id is kept once
+        celebrity_ids = list(dict.fromkeys(
+            celebrity_id.strip() for value in celebrities for celebrity_id in value.split(",") if celebrity_id.strip()
+        ))
+        if not celebrity_ids:
+            raise HTTPException(status_code=400, detail="No celebrity IDs given")
+        if len(celebrity_ids) > MULTI_MAX_TARGETS:
+            raise HTTPException(status_code=400, detail=f"Maximum {MULTI_MAX_TARGETS} celebrities allowed per request")
+
+        targets = []
+        for celebrity_id in celebrity_ids:
+            celebrity_data = get_celebrity_by_id(celebrity_id)
+            if not celebrity_data:
+                raise HTTPException(status_code=400, detail=f"Invalid celebrity ID: {celebrity_id}")
+            targets.append((celebrity_id, celebrity_data, params_for_celebrity(celebrity_data)))
+        admission.charge(client_key(request.scope), len(targets) - 1)
+
+        # Validate file type
+        if not file.content_type or not file.content_type.startswith('audio/'):
+            raise HTTPException(status_code=400, detail="File must be an audio file")
+
+        with STAGE_SECONDS.time(stage="upload_save"):
+            upload = await save_upload_deduplicated(
+                file, UPLOAD_DIR, require_audio=True, hold=retention.hold_upload
+            )
+
+        try:
+            group = SharedAnalysisGroup(upload["path"], len(targets), convert_many_with_metrics)
+
+            async def convert_target(celebrity_id, params):
+                key = conversion_key(upload["sha256"], celebrity_id, params)
+                filename = result_filename(celebrity_id, key)
+                reported = False
+
+                def skip():
+                    # Served from the cache or by another conversion; don't hold up the others
+                    nonlocal reported
+                    if not reported:
+                        reported = True
+                        group.skip()
+
+                async def convert(destination):
+                    nonlocal reported
+                    if reported:
+                        # The conversion this target waited on was abandoned after the group moved on
+                        return await convert_with_metrics(upload["path"], destination, params)
+                    reported = True
+                    return await group.convert(destination, params)
+
+                try:
+                    return filename, await conversion_cache.get_or_convert(key, filename, convert, on_wait=skip)
+                finally:
+                    skip()
+
+            outcomes = await asyncio.gather(
+                *(convert_target(celebrity_id, params) for celebrity_id, _, params in targets),
+                return_exceptions=True
+            )
+        finally:
+            await retention.release_upload(upload["path"])
+
+        results = []
+        for (celebrity_id, celebrity_data, _), outcome in zip(targets, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"Error converting to {celebrity_id}: {outcome}")
+                results.append({"celebrity": celebrity_id, "name": celebrity_data["name"], "error": str(outcome)})
+                continue
+            filename, result = outcome
+            await record_conversion(celebrity_id, file.filename, result)
+            results.append({
+                "celebrity": celebrity_id,
+                "name": celebrity_data["name"],
+                "converted": filename,
+                "engine": result["engine"],
+                "cached": result["cached"],
+                "compute_saved": result.get("stats", {}).get("compute_saved")
+            })
+
+        converted = sum(1 for result in results if "converted" in result)
+        unsupported = next((outcome for outcome in outcomes if isinstance(outcome, UnsupportedAudioError)), None)
+        if converted == 0 and unsupported is not None:
+            # Every target failed on the same input
+            raise HTTPException(status_code=415, detail=str(unsupported))
+        if converted == 0:
+            raise HTTPException(status_code=500, detail="All conversions failed")
+
+        return {
+            "success": converted == len(results),
+            "original_filename": file.filename,
+            "size": upload["size"],
+            "duration": upload["duration"],
+            "shared_analysis": group.shared_stages is not None,
             "results": results,
-            "total_converted": len(results)
+            "total_converted": converted,
+            "message": f"Voice converted to {converted} of {len(results)} celebrities"
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ws/convert/{celebrity_id}")
+async def stream_conversion(websocket: WebSocket, celebrity_id: str, sample_rate: int = STREAM_SAMPLE_RATE):
+    """Convert a live stream of 16-bit little-endian mono PCM frames
+
+    Binary messages carry PCM in and converted PCM out. A text message
+    ``{"type": "flush"}`` drains the buffered audio (end of an utterance);
+    ``{"type": "end"}`` drains it and closes the connection.
+    """
+    celebrity = get_celebrity_by_id(celebrity_id)
+    if not celebrity or not MIN_STREAM_RATE <= sample_rate <= MAX_STREAM_RATE:
+        await websocket.close(code=1008)
+        return
+
+    # A stream converts on a threadpool thread for as long as it is open, so it
+    # holds an admission slot like an upload does; a refused client is told
+    # (close code 1013, "try again later") when to come back
+    try:
+        admission.take(client_key(websocket.scope))
+        waited = await admission.acquire()
+    except HTTPException as e:
+        await websocket.accept()
+        await websocket.close(code=1013, reason=f"{e.detail}; retry after {e.headers['Retry-After']} s")
+        return
+    STAGE_SECONDS.observe(waited, stage="admission_wait")
+
+    try:
+        await websocket.accept()
+        converter = StreamingConverter(params_for_celebrity(celebrity), sample_rate)
+        await websocket.send_json({
+            "type": "ready",
+            "celebrity": celebrity_id,
+            "sample_rate": sample_rate,
+            "format": "pcm_s16le",
+            "latency_ms": converter.latency_ms
+        })
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            data = message.get("bytes")
+            if data is not None:
+                if len(data) > STREAM_MAX_MESSAGE_BYTES:
+                    await websocket.close(code=1009)
+                    break
+                # An odd trailing byte cannot be a sample; drop it
+                data = data[:len(data) - len(data) % 2]
+                out = await run_in_threadpool(converter.process, pcm16_to_float(data))
+                if len(out):
+                    await websocket.send_bytes(float_to_pcm16(out))
+                continue
+
+            try:
+                command = json.loads(message.get("text") or "{}").get("type")
+            except (ValueError, AttributeError):
+                command = None
+            if command not in ("flush", "end"):
+                await websocket.send_json({"type": "error", "detail": "Expected PCM bytes or a flush/end command"})
+                continue
+
+            out = await run_in_threadpool(converter.flush)
+            if len(out):
+                await websocket.send_bytes(float_to_pcm16(out))
+            await websocket.send_json({"type": "flushed"})
+            if command == "end":
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Streams last minutes, so they are left out of the slot hold time
+        # that Retry-After is estimated from
+        admission.release()
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Get progress of a batch conversion job, whichever worker is running it"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_view(job)
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str):
+    """Get the converted files of a batch job that are ready so far"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    results = [
+        {"original": entry["original"], "converted": entry["converted"], "engine": entry["engine"]}
+        for entry in job["files"]
+        if entry["status"] == "completed"
+    ]
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "celebrity": job["celebrity_name"],
+        "results": results,
+        "total_converted": len(results),
+        "total_files": job["total"]
+    }
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters and disk usage of the caches, and what retention has reclaimed"""
+    return {
+        **conversion_cache.stats(),
+        "variants": variant_store.stats(),
+        "catalog": catalog_responses.stats(),
+        "samples": sample_archive.get().stats(),
+        "retention": retention.stats(),
+        "registry": shared_registry.describe(),
+    }
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Slots in use, queue depth, rejections by reason and batch backlog of the conversion gate"""
+    return {**admission.stats(), "batch_backlog": job_queue.pending(), "batch_backlog_limit": BATCH_BACKLOG}
+
+@app.get("/ready")
+def get_readiness():
+    """Readiness probe: 503 until the startup warmup has finished, and while ffmpeg is missing if it is required"""
+    decoders = {"wav": True, "ffmpeg": ffmpeg_available()}
+    ready = warmup.done and (decoders["ffmpeg"] or not REQUIRE_FFMPEG)
+    return Response(
+        json.dumps({"ready": ready, "warmup": warmup.stats(), "decoders": decoders}),
+        status_code=200 if ready else 503,
+        media_type="application/json"
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    """Request, stage, queue and disk metrics in Prometheus text format"""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/results/{filename}")
-def get_audio(filename: str):
-    """Get converted audio file"""
+async def get_audio(
+    filename: str,
+    request: Request,
+    format: Optional[str] = Query(None, description="wav, mp3, m4a or ogg; defaults to the Accept header")
+):
+    """Get converted audio file, transcoded to the requested format"""
     try:
-        path = os.path.join(RESULT_DIR, filename)
-        if os.path.exists(path):
-            return FileResponse(path, media_type="audio/wav")
-        raise HTTPException(status_code=404, detail="Audio file not found")
+        if not is_plain_filename(filename):
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        source = os.path.join(RESULT_DIR, filename)
+
+        # Downloads count as use, so popular results are the last to be evicted
+        match = RESULT_PATTERN.match(filename)
+        if match:
+            conversion_cache.touch(match.group("key"))
+
+        can_encode = transcoding_available()
+        try:
+            fmt = negotiate_format(format, request.headers.get("accept"), can_encode)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        path = source
+        if fmt != "wav":
+            if not os.path.isfile(source):
+                raise HTTPException(status_code=404, detail="Audio file not found")
+            if not can_encode:
+                raise HTTPException(status_code=406, detail=f"Transcoding to {fmt} is not available on this server")
+            variant = await variant_store.get_variant(source, filename, fmt)
+            path = variant_store.path(variant["filename"])
+
+        # Result names change whenever their content does, so clients may cache forever
+        response = await run_in_threadpool(
+            serve_file,
+            request,
+            path,
+            media_type_for(fmt),
+            IMMUTABLE_CACHE_CONTROL
+        )
+        if response is None:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+        if format is None:
+            response.headers["vary"] = "Accept"
+        return response
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/history")
-async def get_conversion_history():
-    """Get conversion history (placeholder for future implementation)"""
+def get_conversion_history(
+    limit: int = Query(50, ge=1, le=200, description="Number of conversions per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    celebrity: Optional[str] = Query(None, description="Only conversions to this celebrity")
+):
+    """Get conversion history, newest first, one page at a time"""
+    try:
+        before = decode_history_cursor(cursor) if cursor else None
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     try:
-        # This would typically fetch from a database
-        # For now, return files from results directory
-        result_files = []
-        if os.path.exists(RESULT_DIR):
-            for filename in os.listdir(RESULT_DIR):
-                if filename.endswith('.wav'):
-                    file_path = os.path.join(RESULT_DIR, filename)
-                    file_stat = os.stat(file_path)
-                    
-                    # Extract celebrity name from filename
-                    celebrity_name = filename.split('_converted_')[0] if '_converted_' in filename else 'unknown'
-                    
-                    result_files.append({
-                        "filename": filename,
-                        "celebrity": celebrity_name,
-                        "created_at": file_stat.st_ctime,
-                        "size": file_stat.st_size
-                    })
+        # One extra row tells us whether another page exists
+        rows = get_database().get_conversion_history(limit=limit + 1, celebrity_id=celebrity, before=before)
+        page = rows[:limit]
         
-        # Sort by creation time (newest first)
-        result_files.sort(key=lambda x: x['created_at'], reverse=True)
+        history = []
+        for row in page:
+            celebrity_data = get_celebrity_by_id(row["celebrity_id"])
+            history.append({
+                "filename": row["converted_filename"],
+                "celebrity": row["celebrity_id"],
+                "celebrity_name": row["celebrity_name"] or (celebrity_data["name"] if celebrity_data else None),
+                "original_filename": row["original_filename"],
+                "created_at": row["conversion_time"],
+                "size": row["size_bytes"],
+                "status": row["status"]
+            })
         
         return {
-            "history": result_files[:50],  # Limit to last 50 conversions
-            "total": len(result_files)
+            "history": history,
+            "count": len(history),
+            "next_cursor": encode_history_cursor(page[-1]) if len(rows) > limit else None,
+            "celebrity": celebrity
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    if SERVER_WORKERS > 1:
+        # Split the cores between the workers' conversion pools instead of giving each all of them
+        os.environ.setdefault("VOICE_ENGINE_WORKERS", str(max((os.cpu_count() or 1) // SERVER_WORKERS, 1)))
+        uvicorn.run("main:app", host="0.0.0.0", port=5000, workers=SERVER_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=5000)
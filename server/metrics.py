@@ -0,0 +1,285 @@
+"""
+Prometheus instrumentation
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format, plus an ASGI middleware that times every request by route template
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Request and stage latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Directory sizes are rescanned at most this often
+DISK_USAGE_TTL = float(os.environ.get("VOICE_METRICS_DISK_TTL", "15"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing value, or one read at scrape time from ``function``"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.function = function
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        if self.function is not None:
+            items = list(self.function().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    """A settable value, or one computed at scrape time by ``function``"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        if self.function is not None:
+            items = list(self.function().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+def directory_bytes(path: str) -> int:
+    """Total size of the regular files directly inside ``path``"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return total
+
+
+class DiskUsage:
+    """Byte counts of a few directories, rescanned at most every ``ttl`` seconds"""
+
+    def __init__(self, directories: Dict[str, str], ttl: float = DISK_USAGE_TTL):
+        self.directories = directories
+        self.ttl = ttl
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            if time.monotonic() - self._scanned >= self.ttl:
+                self._values = {(name,): directory_bytes(path) for name, path in self.directories.items()}
+                self._scanned = time.monotonic()
+            return dict(self._values)
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "voice_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template",
+    ("method", "route", "status"),
+))
+REQUESTS_IN_PROGRESS = registry.register(Gauge(
+    "voice_http_requests_in_progress",
+    "HTTP requests currently being handled",
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "voice_stage_duration_seconds",
+    "Time spent in each conversion pipeline stage",
+    ("stage",),
+))
+CONVERSIONS_IN_PROGRESS = registry.register(Gauge(
+    "voice_conversions_in_progress",
+    "Conversions currently running in the engine",
+))
+CONVERSIONS = registry.register(Counter(
+    "voice_conversions_total",
+    "Conversions finished by the engine, by engine path",
+    ("engine",),
+))
+AUDIO_SECONDS = registry.register(Counter(
+    "voice_audio_seconds_total",
+    "Seconds of converted input, by whether voice activity detection found speech in them",
+    ("region",),
+))
+
+
+def route_label(scope) -> str:
+    """Route template (``/results/{filename}``) so label values stay bounded"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path else "unmatched"
+
+
+class MetricsMiddleware:
+    """Records the latency of every HTTP request by method, route and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_label(scope),
+                status=status,
+            )
@@ -0,0 +1,296 @@
+"""
+Disk retention for uploads and results
+A background task keeps uploads/, results/ and the encoded variants within a
+disk budget and a time-to-live, evicting the least recently accessed files
+first. Uploads are deleted as soon as the conversions that need them finish;
+holds on them are kept in the shared registry, because workers sharing
+uploads/ also share the file of an upload they all received.
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter as CounterDict
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from conversion_cache import LRUBlobStore
+from job_registry import WORKER_ID, MemoryBackend, RegistryBackend
+
+# Budget for uploads, results and variants together (megabytes, 0 disables)
+DISK_BUDGET_BYTES = int(os.environ.get("VOICE_DISK_BUDGET_MB", "2048")) * 1024 * 1024
+
+# Results and variants not accessed for this long are deleted (hours, 0 disables)
+RESULT_TTL_SECONDS = int(float(os.environ.get("VOICE_RESULT_TTL_HOURS", "168")) * 3600)
+
+# Uploads left behind by failed or abandoned requests are deleted after this long (seconds)
+UPLOAD_TTL_SECONDS = int(os.environ.get("VOICE_UPLOAD_TTL", "3600"))
+
+# Delete an upload once the conversions using it have finished
+DELETE_UPLOADS = os.environ.get("VOICE_DELETE_UPLOADS", "1") not in ("0", "false", "no")
+
+# Seconds between sweeps, and files handled before yielding to request handling
+SWEEP_INTERVAL = float(os.environ.get("VOICE_RETENTION_INTERVAL", "60"))
+SWEEP_BATCH = int(os.environ.get("VOICE_RETENTION_BATCH", "100"))
+
+
+def _list_files(directory: str) -> List[Tuple[str, int, float]]:
+    """(name, size, last access) of the regular files directly inside ``directory``"""
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.name, stat.st_size, max(stat.st_atime, stat.st_mtime)))
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def _unlink(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class RetentionManager:
+    """Enforces the disk budget and TTLs over the upload directory and the result stores
+
+    ``stores`` are the LRU indexes of results and variants; their files are
+    evicted through the store so the indexes stay consistent. Other files in
+    ``result_dir`` and the store directories (written by other workers, or
+    left over from older versions) are deleted directly. The budget is
+    measured on disk, so it holds for all workers sharing the directories.
+
+    Holds on uploads go through ``registry``, so an upload is deleted only
+    once no process sharing that registry needs it; without one they are
+    private to this process.
+    """
+
+    def __init__(self, upload_dir: str, result_dir: str, stores: List[LRUBlobStore],
+                 budget: int = DISK_BUDGET_BYTES, result_ttl: int = RESULT_TTL_SECONDS,
+                 upload_ttl: int = UPLOAD_TTL_SECONDS, delete_uploads: bool = DELETE_UPLOADS,
+                 interval: float = SWEEP_INTERVAL, batch: int = SWEEP_BATCH,
+                 registry: Optional[RegistryBackend] = None, owner: str = WORKER_ID):
+        self.upload_dir = upload_dir
+        self.result_dir = result_dir
+        self.stores = stores
+        self.budget = budget
+        self.result_ttl = result_ttl
+        self.upload_ttl = upload_ttl
+        self.delete_uploads = delete_uploads
+        self.interval = interval
+        self.batch = max(batch, 1)
+        self.registry = registry if registry is not None else MemoryBackend()
+        self.owner = owner
+
+        # This process's holds; the registry has everyone's
+        self._holds: Dict[str, int] = CounterDict()
+        self._task: Optional[asyncio.Task] = None
+        self.reclaimed_bytes: Dict[str, int] = CounterDict()
+        self.reclaimed_files: Dict[str, int] = CounterDict()
+        self.sweeps = 0
+        self.last_sweep: Optional[Dict[str, Any]] = None
+        # Bytes in uploads/ and the result directories at the last sweep, whoever wrote them
+        self.disk_bytes: Optional[int] = None
+
+    # Uploads in use
+
+    async def hold_upload(self, path: str):
+        """Mark an upload as needed by a conversion that has not finished yet
+
+        Take the hold before relying on the file being there (ingest does so
+        before it checks for an existing copy): a release elsewhere can delete
+        an unheld upload at any moment.
+        """
+        self._holds[path] += 1
+        try:
+            await run_in_threadpool(self.registry.hold_upload, path, self.owner)
+        except BaseException:
+            self._forget_hold(path)
+            raise
+
+    async def release_upload(self, path: str):
+        """Drop a hold; the upload is deleted when no worker needs it any more"""
+        self._forget_hold(path)
+        when_unused = partial(self._delete_file, path, "upload") if self.delete_uploads else None
+        try:
+            await run_in_threadpool(self.registry.release_upload, path, self.owner, when_unused)
+        except Exception as e:
+            # The hold lapses on its own; the sweep deletes the file after that
+            print(f"Error releasing upload {path}: {e}")
+
+    def _forget_hold(self, path: str):
+        self._holds[path] -= 1
+        if self._holds[path] <= 0:
+            del self._holds[path]
+
+    def _delete_file(self, path: str, reason: str) -> bool:
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return False
+        if _unlink(path):
+            self._reclaimed(reason, 1, size)
+            return True
+        return False
+
+    def _reclaimed(self, reason: str, files: int, size: int):
+        if files:
+            self.reclaimed_files[reason] += files
+            self.reclaimed_bytes[reason] += size
+
+    # Background sweeps
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error during retention sweep: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> Dict[str, Any]:
+        """One pass over everything, yielding to request handling every ``batch`` files"""
+        started = time.perf_counter()
+        before = sum(self.reclaimed_bytes.values())
+        now = time.time()
+
+        if self.result_ttl > 0:
+            for store in self.stores:
+                while True:
+                    files, size = store.expire(now - self.result_ttl, self.batch)
+                    self._reclaimed("ttl", files, size)
+                    await asyncio.sleep(0)
+                    if files < self.batch:
+                        break
+
+        upload_bytes = await self._sweep_uploads(now)
+        unindexed = await self._sweep_unindexed_results(now)
+        self.disk_bytes = upload_bytes + sum(size for _, size, _ in unindexed) + self.usage()
+
+        if self.budget > 0:
+            await self._enforce_budget(upload_bytes, unindexed)
+
+        self.sweeps += 1
+        self.last_sweep = {
+            "finished_at": time.time(),
+            "duration": time.perf_counter() - started,
+            "reclaimed_bytes": sum(self.reclaimed_bytes.values()) - before,
+        }
+        return self.last_sweep
+
+    async def _sweep_uploads(self, now: float) -> int:
+        """Delete abandoned uploads and return the bytes the rest occupy"""
+        remaining = 0
+        files = await run_in_threadpool(_list_files, self.upload_dir)
+        for i, (name, size, accessed) in enumerate(files):
+            path = os.path.join(self.upload_dir, name)
+            if path not in self._holds and accessed < now - self.upload_ttl:
+                reason = "stale_partial" if name.endswith(".part") else "upload_ttl"
+                # Another worker may still hold it
+                if await run_in_threadpool(self.registry.if_unused, path, partial(self._delete_file, path, reason)):
+                    continue
+            remaining += size
+            if i % self.batch == self.batch - 1:
+                await asyncio.sleep(0)
+        return remaining
+
+    async def _sweep_unindexed_results(self, now: float) -> List[Tuple[float, int, str]]:
+        """Apply the TTL to result files no store here indexes; return the rest as (access, size, path)
+
+        These are mostly results and variants other workers wrote into the
+        same directories, plus leftovers from older versions.
+        """
+        directories: Dict[str, set] = {self.result_dir: set()}
+        for store in self.stores:
+            directories.setdefault(store.directory, set()).update(
+                entry["filename"] for entry in store.entries.values()
+            )
+        remaining = []
+        for directory, indexed in directories.items():
+            files = await run_in_threadpool(_list_files, directory)
+            for i, (name, size, accessed) in enumerate(files):
+                if name in indexed:
+                    continue
+                path = os.path.join(directory, name)
+                # Partial files belong to running conversions until they are an hour old
+                ttl = max(self.upload_ttl, 3600) if name.endswith(".part") else self.result_ttl
+                if ttl > 0 and accessed < now - ttl:
+                    if _unlink(path):
+                        self._reclaimed("stale_partial" if name.endswith(".part") else "ttl", 1, size)
+                        continue
+                remaining.append((accessed, size, path))
+                if i % self.batch == self.batch - 1:
+                    await asyncio.sleep(0)
+        return remaining
+
+    async def _enforce_budget(self, upload_bytes: int, unindexed: List[Tuple[float, int, str]]):
+        """Evict the least recently accessed results until what is on disk fits the budget
+
+        The budget covers the shared directories, not this worker's share of
+        them: files other workers wrote count against it and are evicted in
+        access order along with this worker's own, so N workers keep the
+        directories within one budget, not N. Uploads and partial results
+        are counted but never evicted here.
+        """
+        others = sorted(entry for entry in unindexed if not entry[2].endswith(".part"))
+        other_bytes = sum(size for _, size, _ in unindexed)
+        evicted = 0
+        while upload_bytes + other_bytes + self.usage() > self.budget:
+            candidates = [store for store in self.stores if store.entries]
+            oldest = min(candidates, key=lambda store: store.oldest_access(), default=None)
+            if others and (oldest is None or others[0][0] < oldest.oldest_access()):
+                _, size, path = others.pop(0)
+                other_bytes -= size
+                if _unlink(path):
+                    self._reclaimed("budget", 1, size)
+            elif oldest is not None:
+                self._reclaimed("budget", 1, oldest.evict_oldest())
+            else:
+                break
+            evicted += 1
+            if evicted % self.batch == 0:
+                await asyncio.sleep(0)
+
+    def usage(self) -> int:
+        return sum(store.total_bytes for store in self.stores)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget,
+            "result_ttl_seconds": self.result_ttl,
+            "upload_ttl_seconds": self.upload_ttl,
+            "delete_uploads": self.delete_uploads,
+            "tracked_bytes": self.usage(),
+            "disk_bytes": self.disk_bytes,
+            "uploads_in_use": len(self._holds),
+            "sweeps": self.sweeps,
+            "last_sweep": self.last_sweep,
+            "reclaimed_bytes": dict(self.reclaimed_bytes),
+            "reclaimed_files": dict(self.reclaimed_files),
+            "reclaimed_bytes_total": sum(self.reclaimed_bytes.values()),
+        }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Packed voice sample archive
+Every file in static/samples is concatenated into one archive behind a JSON
+table of contents giving each file's offset, length, media type, modification
+time and ETag. The server memory-maps the archive once at startup and serves
+/preview and /samples as slices of the mapping from a name -> entry table
+built from that index, so a request makes no stat, exists or open call.
+
+Files added or changed since the archive was built are noticed at startup
+and served from disk until it is rebuilt; without an archive every sample is
+served from disk as before.
+
+Usage: python sample_archive.py [--samples-dir DIR] [--output FILE]
+"""
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import mmap
+import os
+import struct
+import time
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Bumped whenever the layout changes; part of the file name
+ARCHIVE_VERSION = 1
+ARCHIVE_NAME = f"samples.v{ARCHIVE_VERSION}.pack"
+
+SAMPLES_DIR = Path(__file__).parent / "static" / "samples"
+ARCHIVE_PATH = Path(__file__).parent / "static" / ARCHIVE_NAME
+
+# Preview clips are named <celebrity id><PREVIEW_SUFFIX>
+PREVIEW_SUFFIX = "_sample.wav"
+
+# Magic, version and the byte length of the JSON index that follows
+HEADER = struct.Struct("<4sIQ")
+MAGIC = b"VSPK"
+
+# File data starts on these boundaries within the archive
+ALIGNMENT = 64
+
+
+def file_etag(data: bytes) -> str:
+    """The strong ETag http_files.content_etag gives the same content"""
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def build_archive(samples_dir=SAMPLES_DIR, output=ARCHIVE_PATH) -> int:
+    """Pack every regular file in ``samples_dir`` and write the archive atomically"""
+    samples_dir = Path(samples_dir)
+    paths = sorted(path for path in samples_dir.iterdir() if path.is_file() and not path.name.startswith("."))
+    if not paths:
+        print("No samples found")
+        return 0
+
+    started = time.perf_counter()
+    files: Dict[str, Dict[str, Any]] = {}
+    contents = []
+    offset = 0
+    for path in paths:
+        data = path.read_bytes()
+        st = path.stat()
+        files[path.name] = {
+            "offset": offset,
+            "length": len(data),
+            "media_type": mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            "mtime": st.st_mtime,
+            "mtime_ns": st.st_mtime_ns,
+            "etag": file_etag(data),
+        }
+        contents.append(data)
+        offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+
+    index = json.dumps({"version": ARCHIVE_VERSION, "files": files}, sort_keys=True).encode()
+    # Offsets in the index are relative to the first byte after it, rounded up
+    data_start = -(-(HEADER.size + len(index)) // ALIGNMENT) * ALIGNMENT
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f".{output.name}.part")
+    with open(partial, "wb") as f:
+        f.write(HEADER.pack(MAGIC, ARCHIVE_VERSION, len(index)))
+        f.write(index)
+        for entry, data in zip(files.values(), contents):
+            f.seek(data_start + entry["offset"])
+            f.write(data)
+        f.truncate(data_start + offset)
+    os.replace(partial, output)
+
+    print(f"Packed {len(files)} samples ({offset / 1024:.0f} KB) into {output} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return len(files)
+
+
+class SampleArchive:
+    """Read-only, memory-mapped sample archive indexed by file name
+
+    ``entries`` maps a file name to its slice of the mapping and its
+    precomputed response headers; ``stale`` names the files in the samples
+    directory that the archive does not hold as they are now, and
+    ``previews`` maps a celebrity id to the entry of its preview clip. An
+    archive that could not be loaded has no mapping and no entries.
+    """
+
+    def __init__(self, mapping: Optional[mmap.mmap] = None, entries: Optional[Dict[str, Dict[str, Any]]] = None,
+                 stale: frozenset = frozenset(), path: Optional[str] = None):
+        self.mapping = mapping
+        self.entries = entries or {}
+        self.stale = stale
+        self.path = path
+        self.previews = {
+            name[:-len(PREVIEW_SUFFIX)]: entry for name, entry in self.entries.items() if name.endswith(PREVIEW_SUFFIX)
+        }
+
+    @classmethod
+    def open(cls, path=ARCHIVE_PATH, samples_dir=SAMPLES_DIR) -> "SampleArchive":
+        """Map ``path``; a missing or unreadable archive gives an empty one
+
+        ``samples_dir`` is listed once so that files changed or added after
+        the build are left out of the table and served from disk instead.
+        """
+        try:
+            with open(path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError) as e:
+            # ValueError: an empty file cannot be mapped
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading sample archive from {path}: {e}")
+            return cls()
+
+        try:
+            magic, version, index_length = HEADER.unpack_from(mapping, 0)
+            if magic != MAGIC or version != ARCHIVE_VERSION:
+                raise ValueError("built for a different archive version")
+            index = json.loads(mapping[HEADER.size:HEADER.size + index_length])
+        except (struct.error, ValueError) as e:
+            print(f"Ignoring sample archive in {path}: {e}")
+            mapping.close()
+            return cls()
+
+        data_start = -(-(HEADER.size + index_length) // ALIGNMENT) * ALIGNMENT
+        view = memoryview(mapping)
+        on_disk = cls._listing(samples_dir)
+        entries = {}
+        for name, info in index["files"].items():
+            if on_disk and on_disk.get(name) != (info["length"], info["mtime_ns"]):
+                continue
+            start = data_start + info["offset"]
+            entries[name] = {
+                "data": view[start:start + info["length"]],
+                "media_type": info["media_type"],
+                "etag": info["etag"],
+                "mtime": info["mtime"],
+                "last_modified": formatdate(info["mtime"], usegmt=True),
+            }
+        # An empty listing means the directory is absent: trust the archive as built
+        stale = frozenset(name for name in on_disk if name not in entries)
+        if stale:
+            print(f"Sample archive {path} is out of date for {len(stale)} files; serving them from disk")
+        return cls(mapping, entries, stale, str(path))
+
+    @staticmethod
+    def _listing(samples_dir) -> Dict[str, tuple]:
+        """(size, mtime_ns) of every regular file in ``samples_dir``"""
+        try:
+            with os.scandir(samples_dir) as it:
+                return {
+                    entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                    for entry in it
+                    if entry.is_file() and not entry.name.startswith(".")
+                }
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.mapping is not None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """The entry for ``name``; its ``data`` is a view into the mapped file"""
+        return self.entries.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "path": self.path,
+            "files": len(self.entries),
+            "bytes": self.mapping.size() if self.mapping is not None else 0,
+            "stale": sorted(self.stale),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the voice samples into one memory-mappable archive")
+    parser.add_argument("--samples-dir", default=str(SAMPLES_DIR))
+    parser.add_argument("--output", default=str(ARCHIVE_PATH))
+    args = parser.parse_args()
+    build_archive(args.samples_dir, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Voice similarity search
+Ranks celebrities by cosine similarity between a clip's speaker embedding and
+the embeddings stored with the voice profiles. Scoring is one matrix-vector
+product over the whole catalog; large catalogs can add an inverted-file index
+(spherical k-means clusters) so a query only scores the closest clusters.
+"""
+
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from audio_decode import CANONICAL_RATE, iter_decoded
+from voice_profiles import EMBEDDING_DIM, N_MFCC, speaker_embedding
+
+# Catalogs at least this large use the approximate index unless told otherwise
+ANN_MIN_ITEMS = int(os.environ.get("VOICE_SIMILARITY_ANN_MIN", "2000"))
+
+# Only the start of an uploaded clip is analysed (seconds)
+CLIP_MAX_SECONDS = float(os.environ.get("VOICE_SIMILARITY_MAX_SECONDS", "30"))
+
+# Clusters scored per approximate query
+ANN_PROBES = int(os.environ.get("VOICE_SIMILARITY_PROBES", "8"))
+
+# Relative weight of each embedding dimension after standardisation; the
+# three pitch/voicing statistics would otherwise be drowned out by 38 MFCC ones
+DIMENSION_WEIGHTS = np.concatenate([
+    np.full(2 * (N_MFCC - 1), 1.0),
+    np.full(EMBEDDING_DIM - 2 * (N_MFCC - 1), 3.0),
+]).astype(np.float32)
+
+
+def clip_embedding(path: str, max_seconds: float = CLIP_MAX_SECONDS) -> Optional[np.ndarray]:
+    """Speaker embedding of the first ``max_seconds`` of an audio file, None if it is too short"""
+    limit = int(max_seconds * CANONICAL_RATE)
+    chunks, total = [], 0
+    decoder = iter_decoded(path)
+    try:
+        for chunk in decoder:
+            chunks.append(chunk)
+            total += len(chunk)
+            if total >= limit:
+                break
+    finally:
+        # Stops the decode (and any ffmpeg process) without reading the rest
+        decoder.close()
+    x = np.concatenate(chunks)[:limit] if chunks else np.zeros(0, dtype=np.float32)
+    if len(x) < CANONICAL_RATE // 4:
+        return None
+    return speaker_embedding(x, CANONICAL_RATE)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class SimilarityIndex:
+    """Cosine-similarity ranking over a fixed set of speaker embeddings
+
+    Embeddings are standardised per dimension with the catalog's own mean and
+    spread, weighted, and L2-normalised once, so a query is a single product
+    with the stored matrix.
+    """
+
+    def __init__(self, ids: Sequence[str], embeddings: np.ndarray, ann_min_items: int = ANN_MIN_ITEMS):
+        self.ids = [str(celebrity_id) for celebrity_id in ids]
+        self.ann_min_items = ann_min_items
+        # An explicit width, so an empty catalog (no profiles built yet) still has one
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), EMBEDDING_DIM)
+        self.mean = embeddings.mean(axis=0) if len(self.ids) else np.zeros(EMBEDDING_DIM, np.float32)
+        self.scale = np.maximum(embeddings.std(axis=0), 1e-3) if len(self.ids) > 1 else np.ones_like(self.mean)
+        self.matrix = self._project(embeddings)
+
+        self.centroids: Optional[np.ndarray] = None
+        self.members: List[np.ndarray] = []
+        if len(self.ids) >= ann_min_items:
+            self.build_clusters()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _project(self, embeddings: np.ndarray) -> np.ndarray:
+        return _normalize((embeddings - self.mean) / self.scale * DIMENSION_WEIGHTS).astype(np.float32)
+
+    def build_clusters(self, n_clusters: Optional[int] = None, iterations: int = 12, seed: int = 0):
+        """Partition the catalog with spherical k-means for approximate queries"""
+        n = len(self.ids)
+        if n == 0:
+            return
+        k = min(n_clusters or max(int(np.sqrt(n)), 1), n)
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(n, k, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.matrix)
+            counts = np.bincount(assignment, minlength=k)
+            # An empty cluster keeps its old centroid
+            centroids = np.where(counts[:, None] > 0, _normalize(sums), centroids)
+
+        assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        boundaries = np.searchsorted(assignment[order], np.arange(1, k))
+        self.centroids = centroids.astype(np.float32)
+        self.members = np.split(order, boundaries)
+
+    def query(self, embedding: np.ndarray, limit: int = 5,
+              approximate: Optional[bool] = None) -> Tuple[List[Tuple[str, float]], bool]:
+        """Top ``limit`` (id, cosine similarity) pairs, best first, and whether the index was used
+
+        The index is used by default for catalogs of ``ann_min_items`` or
+        more. Clusters that were not built in advance are built here, which
+        takes longer than the query itself.
+        """
+        if not self.ids:
+            return [], False
+        q = self._project(np.asarray(embedding, dtype=np.float32)[np.newaxis])[0]
+
+        use_index = len(self.ids) >= self.ann_min_items if approximate is None else approximate
+        if use_index and self.centroids is None:
+            self.build_clusters()
+        if use_index:
+            probes = min(ANN_PROBES, len(self.centroids))
+            nearest = np.argpartition(self.centroids @ q, -probes)[-probes:]
+            candidates = np.concatenate([self.members[i] for i in nearest])
+        else:
+            candidates = np.arange(len(self.ids))
+
+        scores = self.matrix[candidates] @ q
+        limit = min(limit, len(candidates))
+        top = np.argpartition(scores, -limit)[-limit:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in top], use_index
@@ -0,0 +1,156 @@
+"""
+Real-time streaming voice conversion
+Frame-based overlap-add version of the voice engine for live PCM streams: each
+connection keeps its analysis/synthesis phase and a preallocated input ring
+and overlap-add tail, so audio is converted as it arrives
+"""
+
+import os
+
+import numpy as np
+
+from voice_engine import VoiceParams, _window, analyze_frames, synthesize_frames
+
+# Sample rate assumed when the client does not send one
+STREAM_SAMPLE_RATE = int(os.environ.get("VOICE_STREAM_SAMPLE_RATE", "16000"))
+
+# Largest PCM message accepted from a client, in bytes
+STREAM_MAX_MESSAGE_BYTES = int(os.environ.get("VOICE_STREAM_MAX_MESSAGE_KB", "64")) * 1024
+
+MIN_STREAM_RATE = 8000
+MAX_STREAM_RATE = 48000
+
+
+def stream_fft_size(sample_rate: int) -> int:
+    """Largest power-of-two frame that keeps the algorithmic latency at or below 64 ms"""
+    n_fft = 256
+    while n_fft * 2 <= sample_rate * 0.064:
+        n_fft *= 2
+    return n_fft
+
+
+class StreamingConverter:
+    """Converts an unbounded float32 stream in arbitrarily sized pieces
+
+    Output sample ``i`` corresponds to input sample ``i``; it is released
+    ``latency_samples`` after that input sample has been received. Call
+    ``flush`` at the end of the stream to drain what is still buffered.
+    """
+
+    def __init__(self, params: VoiceParams, sample_rate: int = STREAM_SAMPLE_RATE,
+                 n_fft: int = None, hop: int = None):
+        self.params = params
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft or stream_fft_size(sample_rate)
+        self.hop = hop or self.n_fft // 4
+        self.window = _window(self.n_fft)
+        self.latency_samples = self.n_fft - self.hop
+
+        overlap = self.n_fft // self.hop
+        # Steady-state sum of squared windows at every position of a hop
+        self._norm = np.maximum((self.window ** 2).reshape(overlap, self.hop).sum(axis=0), 1e-3)
+
+        capacity = 1
+        while capacity < 4 * self.n_fft:
+            capacity *= 2
+        self._ring = np.zeros(capacity, dtype=np.float32)
+        self._mask = capacity - 1
+        self._offsets = np.arange(self.n_fft)
+        self._tail = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """Forget all buffered audio and phase state"""
+        self._ring[:] = 0
+        self._tail[:] = 0
+        # The ring starts with a frame's worth of silence minus one hop
+        self._written = self.latency_samples
+        self._next_frame = 0
+        self._analysis_phase = None
+        self._synthesis_phase = None
+        self._skip = self.latency_samples
+        self._received = 0
+        self._emitted = 0
+
+    @property
+    def latency_ms(self) -> float:
+        return 1000.0 * self.n_fft / self.sample_rate
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """Feed mono float32 samples, returning whatever converted audio is ready"""
+        x = np.asarray(x, dtype=np.float32)
+        self._received += len(x)
+        outputs = []
+        space = len(self._ring) - self.n_fft
+        for start in range(0, len(x), space):
+            self._write(x[start:start + space])
+            outputs.append(self._run_frames())
+        return self._trim(outputs)
+
+    def flush(self) -> np.ndarray:
+        """Drain the remaining audio and reset for a new utterance"""
+        target = self._received
+        outputs = []
+        silence = np.zeros(self.hop, dtype=np.float32)
+        while self._emitted + sum(len(o) for o in outputs) < target:
+            self._write(silence)
+            outputs.append(self._run_frames())
+        out = self._trim(outputs)
+        self.reset()
+        return out
+
+    def _write(self, x: np.ndarray):
+        start = self._written & self._mask
+        first = min(len(x), len(self._ring) - start)
+        self._ring[start:start + first] = x[:first]
+        self._ring[:len(x) - first] = x[first:]
+        self._written += len(x)
+
+    def _run_frames(self) -> np.ndarray:
+        n_frames = (self._written - self._next_frame - self.n_fft) // self.hop + 1
+        if n_frames <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        starts = self._next_frame + self.hop * np.arange(n_frames)
+        frames = np.take(self._ring, (starts[:, np.newaxis] + self._offsets) & self._mask) * self.window
+        self._next_frame += n_frames * self.hop
+
+        magnitude, phase, inst_bins, envelope = analyze_frames(
+            frames, self.sample_rate, self._analysis_phase, self.n_fft, self.hop
+        )
+        synthesized, self._synthesis_phase = synthesize_frames(
+            magnitude, inst_bins, envelope, self.params, self.sample_rate,
+            first_phase=phase[0], start_phase=self._synthesis_phase, n_fft=self.n_fft, hop=self.hop,
+        )
+        self._analysis_phase = phase[-1]
+
+        # Overlap-add onto the tail carried over from the previous call
+        overlap = self.n_fft // self.hop
+        out = np.zeros((n_frames + overlap - 1) * self.hop, dtype=np.float32)
+        out[:len(self._tail)] = self._tail
+        blocks = out.reshape(-1, self.hop)
+        windowed = synthesized * self.window
+        for i in range(overlap):
+            blocks[i:i + n_frames] += windowed[:, i * self.hop:(i + 1) * self.hop]
+
+        ready = n_frames * self.hop
+        self._tail[:] = out[ready:]
+        return (blocks[:n_frames] / self._norm).reshape(-1)
+
+    def _trim(self, outputs) -> np.ndarray:
+        out = np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+        if self._skip:
+            dropped = min(self._skip, len(out))
+            out = out[dropped:]
+            self._skip -= dropped
+        out = out[:max(self._received - self._emitted, 0)]
+        self._emitted += len(out)
+        return np.clip(out, -1.0, 1.0)
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def float_to_pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
@@ -0,0 +1,122 @@
+"""Admission control for conversion endpoints"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from admission import AdmissionController, AdmissionMiddleware
+from celebrities import get_all_celebrities
+
+
+def test_client_bucket_allows_a_burst_then_rejects_with_429():
+    controller = AdmissionController(rate=1.0, burst=3)
+    for _ in range(3):
+        controller.take("10.0.0.1")
+    with pytest.raises(HTTPException) as rejected:
+        controller.take("10.0.0.1")
+    assert rejected.value.status_code == 429
+    assert rejected.value.headers["Retry-After"] == "1"
+    # Other clients have buckets of their own
+    controller.take("10.0.0.2")
+    assert controller.rejected["rate_limited"] == 1
+
+
+def test_charged_work_is_paid_off_by_waiting():
+    controller = AdmissionController(rate=0.5, burst=3)
+    controller.take("client")
+    controller.charge("client", 100)
+    with pytest.raises(HTTPException) as rejected:
+        controller.take("client")
+    # Debt is capped at one burst: 4 tokens at 0.5 per second
+    assert rejected.value.headers["Retry-After"] == "8"
+
+
+def test_queue_is_bounded_and_served_in_order():
+    controller = AdmissionController(limit=1, queue_limit=2, max_wait=5, rate=0)
+    order = []
+
+    async def request(name: str):
+        await controller.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        controller.release(0.01)
+
+    async def run():
+        await controller.acquire()
+        waiting = [asyncio.create_task(request(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 503
+        controller.release()
+        await asyncio.gather(*waiting)
+
+    asyncio.run(run())
+    assert order == ["first", "second"]
+    assert controller.active == 0
+    assert controller.rejected["queue_full"] == 1
+
+
+def test_waiting_too_long_is_rejected():
+    controller = AdmissionController(limit=1, queue_limit=2, max_wait=0.05, rate=0)
+
+    async def run():
+        await controller.acquire()
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 503
+        assert controller.queued == 0
+
+    asyncio.run(run())
+    assert controller.rejected["timeout"] == 1
+
+
+def test_middleware_rejects_before_the_endpoint_runs():
+    controller = AdmissionController(limit=4, rate=1.0, burst=2)
+    calls = []
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=["/convert"])
+
+    @app.post("/convert")
+    def convert():
+        calls.append(1)
+        return {"ok": True}
+
+    @app.get("/convert")
+    def describe():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert [client.post("/convert").status_code for _ in range(3)] == [200, 200, 429]
+    rejected = client.post("/convert")
+    assert rejected.json() == {"detail": "Too many conversion requests from this client"}
+    assert int(rejected.headers["retry-after"]) >= 1
+    assert client.get("/convert").status_code == 200
+    assert len(calls) == 2
+    assert controller.active == 0
+
+
+def test_streams_hold_a_slot_and_refused_clients_are_told_when_to_return(monkeypatch):
+    controller = AdmissionController(limit=1, queue_limit=0, rate=0)
+    monkeypatch.setattr(main, "admission", controller)
+    path = f"/ws/convert/{get_all_celebrities()[0]['id']}"
+    client = TestClient(main.app)
+
+    with client.websocket_connect(path) as stream:
+        assert stream.receive_json()["type"] == "ready"
+        assert controller.active == 1
+        with client.websocket_connect(path) as refused:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                refused.receive_json()
+        assert closed.value.code == 1013
+        assert "retry after" in closed.value.reason
+        stream.send_bytes(bytes(3200))
+        stream.send_json({"type": "end"})
+        while stream.receive()["type"] != "websocket.close":
+            pass
+    assert controller.active == 0
@@ -0,0 +1,77 @@
+"""Container sniffing, WAV decoding and resampling"""
+
+import struct
+
+import numpy as np
+import pytest
+
+from audio_decode import PolyphaseResampler, decode, decoded_length, sniff_container
+
+
+def pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def wav_fmt(sample_rate: int, channels: int = 1) -> bytes:
+    return b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16)
+
+
+def rf64_file(data: bytes, sample_rate: int) -> bytes:
+    """An RF64 file as broadcast recorders write one: every 32-bit size is 0xFFFFFFFF"""
+    ds64 = b"ds64" + struct.pack("<IQQQI", 28, 0, len(data), len(data) // 2, 0)
+    body = b"WAVE" + ds64 + wav_fmt(sample_rate) + b"data" + struct.pack("<I", 0xFFFFFFFF) + data
+    return b"RF64" + struct.pack("<I", 0xFFFFFFFF) + body
+
+
+def test_rf64_is_decoded_as_wav(tmp_path):
+    sample_rate = 22050
+    x = (0.5 * np.sin(2 * np.pi * 440 * np.arange(sample_rate) / sample_rate)).astype(np.float32)
+    path = tmp_path / "input.wav"
+    # A trailing chunk after the data must not be read as samples
+    path.write_bytes(rf64_file(pcm16(x), sample_rate) + b"LIST" + struct.pack("<I", 4) + b"INFO")
+
+    assert sniff_container(path.read_bytes()[:64]) == "wav"
+    assert decoded_length(str(path), sample_rate) == len(x)
+    decoded, rate = decode(str(path), sample_rate)
+    assert rate == sample_rate
+    assert np.abs(decoded - x).max() < 1e-4
+
+
+def resample(x: np.ndarray, source_rate: int, target_rate: int, chunk: int) -> np.ndarray:
+    resampler = PolyphaseResampler(source_rate, target_rate)
+    pieces = [resampler.process(x[start:start + chunk]) for start in range(0, len(x), chunk)]
+    return np.concatenate(pieces + [resampler.flush()])
+
+
+@pytest.mark.parametrize("source_rate", [8000, 16000, 44100, 48000])
+def test_resampler_length_and_accuracy(source_rate):
+    target_rate = 22050
+    x = np.sin(2 * np.pi * 440 * np.arange(source_rate) / source_rate).astype(np.float32)
+
+    y = resample(x, source_rate, target_rate, len(x))
+    assert len(y) == -(-len(x) * target_rate // source_rate)
+    expected = np.sin(2 * np.pi * 440 * np.arange(len(y)) / target_rate)
+    assert np.abs(y - expected)[100:-100].max() < 1e-3
+    # Chunk boundaries don't change the output
+    np.testing.assert_array_equal(resample(x, source_rate, target_rate, 777), y)
+
+
+def test_resampler_removes_what_the_new_rate_cannot_hold():
+    x = np.sin(2 * np.pi * 15000 * np.arange(44100) / 44100).astype(np.float32)
+    y = resample(x, 44100, 22050, 4096)
+    assert np.abs(y[200:-200]).max() < 1e-3
+
+
+@pytest.mark.parametrize("header, container", [
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", "wav"),
+    (b"\x1a\x45\xdf\xa3\x01\x00", "webm"),
+    (b"OggS\x00\x02", "ogg"),
+    (b"fLaC\x00\x00", "flac"),
+    (b"\x00\x00\x00\x20ftypM4A ", "mp4"),
+    (b"ID3\x04\x00", "mp3"),
+    (b"\xff\xfb\x90\x00", "mp3"),
+    (b"\xff\xf1\x50\x80", "aac"),
+    (b"<html>", None),
+])
+def test_containers_are_recognised_by_their_leading_bytes(header, container):
+    assert sniff_container(header) == container
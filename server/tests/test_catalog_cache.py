@@ -0,0 +1,77 @@
+"""Precompressed catalog responses"""
+
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from catalog_cache import CatalogResponseCache, encode_body, negotiate_encoding
+
+PAYLOAD = {"celebrities": [{"id": f"singer_{n}", "bio": "Playback singer"} for n in range(50)]}
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("identity;q=0, gzip;q=0", "identity"),
+    ("deflate", "identity"),
+])
+def test_encoding_negotiation_prefers_compression(header, expected):
+    assert negotiate_encoding(header, ["identity", "gzip", "br"]) == expected
+
+
+def test_small_bodies_are_not_compressed():
+    assert list(encode_body({"ok": True})) == ["identity"]
+    bodies = encode_body(PAYLOAD)
+    assert json.loads(gzip.decompress(bodies["gzip"])) == PAYLOAD
+    assert bodies["gzip"] == encode_body(PAYLOAD)["gzip"]
+
+
+def make_client(version: list, builds: list):
+    cache = CatalogResponseCache(lambda: version[0], max_entries=2)
+    app = FastAPI()
+
+    @app.get("/catalog/{key}")
+    async def catalog(key: str, request: Request):
+        def build():
+            builds.append(key)
+            return {**PAYLOAD, "key": key}
+        return await cache.respond(request, key, build)
+
+    return TestClient(app), cache
+
+
+def test_responses_are_built_once_per_version():
+    version = ["v1"]
+    builds = []
+    client, cache = make_client(version, builds)
+
+    first = client.get("/catalog/all", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.json()["key"] == "all"
+    etag = first.headers["etag"]
+    assert etag.startswith('"v1-')
+
+    assert client.get("/catalog/all", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/catalog/all", headers={"Accept-Encoding": "identity"}).json() == first.json()
+    assert builds == ["all"]
+
+    version[0] = "v2"
+    changed = client.get("/catalog/all", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert builds == ["all", "all"]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_responses_are_dropped():
+    builds = []
+    client, _ = make_client(["v1"], builds)
+    for key in ["a", "b", "a", "c", "a", "b"]:
+        client.get(f"/catalog/{key}")
+    assert builds == ["a", "b", "c", "b"]
@@ -0,0 +1,70 @@
+"""The indexed celebrity catalog"""
+
+import celebrities
+from celebrities import CelebrityCatalog
+
+
+def make_catalog():
+    return CelebrityCatalog({
+        "bollywood": [
+            {"id": "a", "name": "Amit Kumar", "bio": "Deep voiced singer", "languages": ["hindi"],
+             "notable_films": ["One"], "voice_characteristics": ["deep", "baritone"], "category": "bollywood"},
+            {"id": "b", "name": "Bina Rao", "bio": "Bright playback voice", "languages": ["hindi"],
+             "notable_films": ["Two"], "voice_characteristics": ["bright"], "category": "bollywood"},
+        ],
+        "tollywood": [
+            {"id": "c", "name": "Chiru Babu", "bio": "Baritone hero", "languages": ["telugu"],
+             "notable_films": ["Three"], "voice_characteristics": ["deep", "commanding"], "category": "tollywood"},
+        ],
+    })
+
+
+def test_results_are_copies(monkeypatch):
+    catalog = make_catalog()
+    monkeypatch.setattr(celebrities, "_catalog", catalog)
+    version = catalog.version
+
+    celebrities.get_celebrity_by_id("a")["name"] = "Changed"
+    celebrities.get_celebrity_by_id("a")["voice_characteristics"].append("changed")
+    celebrities.get_all_celebrities()[1]["languages"].clear()
+    celebrities.get_celebrities_by_category("tollywood")[0]["bio"] = "Changed"
+    celebrities.search_celebrities("deep")[0]["notable_films"].append("Changed")
+
+    a = celebrities.get_celebrity_by_id("a")
+    assert a["name"] == "Amit Kumar"
+    assert a["voice_characteristics"] == ["deep", "baritone"]
+    assert a["notable_films"] == ["One"]
+    assert celebrities.get_celebrity_by_id("b")["languages"] == ["hindi"]
+    assert celebrities.get_celebrity_by_id("c")["bio"] == "Baritone hero"
+    assert celebrities.get_catalog_version() == version
+
+
+def ids(results):
+    return [celebrity["id"] for celebrity in results]
+
+
+def test_search_matches_word_prefixes_in_catalog_order():
+    catalog = make_catalog()
+    assert ids(catalog.search("bari")) == ["a", "c"]
+    assert ids(catalog.search("Deep")) == ["a", "c"]
+    assert ids(catalog.search("  PLAY  ")) == ["b"]
+    # Prefixes only: "aritone" is inside a word, not at its start
+    assert catalog.search("aritone") == []
+
+
+def test_search_requires_every_word():
+    catalog = make_catalog()
+    assert ids(catalog.search("deep hero")) == ["c"]
+    assert ids(catalog.search("baritone deep")) == ["a", "c"]
+    assert catalog.search("deep bright") == []
+    assert catalog.search("") == []
+    assert catalog.search("?!") == []
+
+
+def test_lookups_by_id_and_category():
+    catalog = make_catalog()
+    assert catalog.get("b")["name"] == "Bina Rao"
+    assert catalog.get("missing") is None
+    assert catalog.categories == ("bollywood", "tollywood")
+    assert catalog.counts == {"bollywood": 2, "tollywood": 1}
+    assert ids(catalog.celebrities) == ["a", "b", "c"]
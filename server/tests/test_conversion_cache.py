@@ -0,0 +1,62 @@
+"""Content-addressed conversion cache"""
+
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from conversion_cache import ConversionCache, result_filename
+from voice_engine import ENGINE_NAME, write_wav
+
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+def write_result(directory, key: str = KEY) -> str:
+    filename = result_filename("singer", key)
+    write_wav(str(directory / filename), np.zeros(100, dtype=np.float32), 16000)
+    return filename
+
+
+def test_results_found_on_disk_are_indexed_with_the_engine_name(tmp_path):
+    filename = write_result(tmp_path)
+    cache = ConversionCache(str(tmp_path))
+
+    entry = cache.lookup(KEY)
+    assert entry["filename"] == filename
+    assert entry["engine"] == ENGINE_NAME
+
+
+def test_concurrent_requests_for_one_key_share_a_conversion(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    calls = []
+
+    async def convert(destination):
+        calls.append(destination)
+        await asyncio.sleep(0.05)
+        write_wav(destination, np.zeros(100, dtype=np.float32), 16000)
+        return {"engine": ENGINE_NAME}
+
+    async def run():
+        filename = result_filename("singer", KEY)
+        return await asyncio.gather(*(cache.get_or_convert(KEY, filename, convert) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [result["cached"] for result in results] == [False, True, True]
+    assert cache.coalesced == 2
+    assert cache.stats()["inflight"] == 0
+    assert sorted(os.listdir(tmp_path)) == [results[0]["filename"]]
+
+
+def test_failed_conversion_leaves_nothing_behind(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+
+    async def convert(destination):
+        write_wav(destination, np.zeros(100, dtype=np.float32), 16000)
+        raise ValueError("engine failed")
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_convert(KEY, result_filename("singer", KEY), convert))
+    assert os.listdir(tmp_path) == []
+    assert cache.lookup(KEY) is None
@@ -0,0 +1,70 @@
+"""Incremental sample transcoding"""
+
+import os
+
+import pytest
+
+from convert_to_mp3 import output_name, parse_targets, plan_work, prune_removed
+
+
+def test_targets_default_their_bitrate():
+    assert parse_targets("MP3, ogg:96k,,mp3:64k") == [("mp3", "128k"), ("ogg", "96k"), ("mp3", "64k")]
+    with pytest.raises(ValueError):
+        parse_targets("flac")
+
+
+def test_default_bitrates_keep_the_served_name():
+    assert output_name("singer.wav", "mp3", "128k") == "singer.mp3"
+    assert output_name("singer.wav", "mp3", "64k") == "singer_64k.mp3"
+
+
+def plan(tmp_path, manifest, force=False):
+    wav_files = sorted(tmp_path.glob("*.wav"))
+    return plan_work(tmp_path, wav_files, [("mp3", "128k"), ("ogg", "64k")], manifest, force)
+
+
+def encode(tmp_path, work, manifest):
+    """What a successful transcode_sample run records"""
+    for name, needed in work.items():
+        for fmt, bitrate in needed:
+            filename = output_name(name, fmt, bitrate)
+            (tmp_path / filename).write_bytes(b"encoded")
+            manifest[name]["outputs"][f"{fmt}:{bitrate}"] = filename
+
+
+def test_only_new_or_changed_samples_are_encoded(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"first")
+    (tmp_path / "b.wav").write_bytes(b"second")
+
+    work, manifest = plan(tmp_path, {})
+    assert work == {name: [("mp3", "128k"), ("ogg", "64k")] for name in ("a.wav", "b.wav")}
+    encode(tmp_path, work, manifest)
+    assert plan(tmp_path, manifest)[0] == {}
+    assert plan(tmp_path, manifest, force=True)[0].keys() == {"a.wav", "b.wav"}
+
+    # A touched file with the same content keeps its outputs
+    os.utime(tmp_path / "a.wav", ns=(0, 0))
+    work, manifest = plan(tmp_path, manifest)
+    assert work == {}
+    assert manifest["a.wav"]["mtime_ns"] == 0
+
+    (tmp_path / "b.wav").write_bytes(b"changed")
+    (tmp_path / "a.ogg").write_bytes(b"")
+    work, manifest = plan(tmp_path, manifest)
+    assert work == {"a.wav": [("ogg", "64k")], "b.wav": [("mp3", "128k"), ("ogg", "64k")]}
+
+
+def test_removed_samples_are_forgotten(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"first")
+    (tmp_path / "b.wav").write_bytes(b"second")
+    work, manifest = plan(tmp_path, {})
+    encode(tmp_path, work, manifest)
+    (tmp_path / "b.wav").unlink()
+
+    kept = dict(manifest)
+    prune_removed(tmp_path, kept, sorted(tmp_path.glob("*.wav")), delete_outputs=False)
+    assert list(kept) == ["a.wav"]
+    assert (tmp_path / "b.mp3").exists()
+
+    prune_removed(tmp_path, manifest, sorted(tmp_path.glob("*.wav")), delete_outputs=True)
+    assert sorted(os.listdir(tmp_path)) == ["a.mp3", "a.ogg", "a.wav"]
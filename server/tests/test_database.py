@@ -0,0 +1,100 @@
+"""Cached catalog queries and history pagination"""
+
+import pytest
+from fastapi import HTTPException
+
+import database
+import main
+from database import CelebrityDatabase, decode_history_cursor, encode_history_cursor
+
+
+def celebrity(n: int, **fields):
+    return {
+        "id": f"celebrity_{n}",
+        "name": f"Singer Number{n}",
+        "bio": "Playback singer",
+        "languages": ["Hindi"],
+        "popularity": 100 - n,
+        "notable_films": [f"Film {n}"],
+        "voice_characteristics": ["deep", "warm"],
+        "category": "bollywood",
+        **fields,
+    }
+
+
+def make_database(tmp_path, count: int = 3) -> CelebrityDatabase:
+    db = CelebrityDatabase(str(tmp_path / "celebrities.db"), pool_size=2)
+    for n in range(count):
+        db.insert_celebrity(celebrity(n))
+    return db
+
+
+def test_search_cache_stays_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "RESULT_CACHE_ENTRIES", 8)
+    db = make_database(tmp_path)
+    assert db.get_all_celebrities()
+
+    for n in range(50):
+        db.search_celebrities(f"query{n}")
+        db.get_all_celebrities()
+    assert len(db._cache) <= 8
+    # Recently used results survive a stream of one-off searches
+    assert "all" in db._cache
+    assert [row["id"] for row in db.search_celebrities("number1")] == ["celebrity_1"]
+
+
+def test_search_matches_word_prefixes_by_popularity(tmp_path):
+    db = make_database(tmp_path)
+    db.insert_celebrity(celebrity(9, name="Lata Sweet", voice_characteristics=["melodious"]))
+
+    assert [row["id"] for row in db.search_celebrities("sing")] == [
+        "celebrity_0", "celebrity_1", "celebrity_2", "celebrity_9",
+    ]
+    assert [row["id"] for row in db.search_celebrities("melod sweet")] == ["celebrity_9"]
+    assert db.search_celebrities("?!") == []
+    # Updates reach both the index and the cached results
+    db.insert_celebrity(celebrity(9, name="Lata Renamed", voice_characteristics=["melodious"]))
+    assert db.search_celebrities("sweet") == []
+    assert db.search_celebrities("renamed")[0]["voice_characteristics"] == ["melodious"]
+
+
+def test_cached_results_are_copies(tmp_path):
+    db = make_database(tmp_path)
+    db.get_all_celebrities()[0]["voice_characteristics"].append("changed")
+    db.get_celebrity_by_id("celebrity_1")["name"] = "Changed"
+    db.search_celebrities("number2")[0]["languages"].clear()
+
+    assert db.get_all_celebrities()[0]["voice_characteristics"] == ["deep", "warm"]
+    assert db.get_celebrity_by_id("celebrity_1")["name"] == "Singer Number1"
+    assert db.search_celebrities("number2")[0]["languages"] == ["Hindi"]
+
+
+def test_history_pages_follow_the_cursor(tmp_path):
+    db = make_database(tmp_path)
+    for n in range(5):
+        db.add_conversion_history(f"celebrity_{n % 2}", f"clip{n}.wav", f"out{n}.wav", size_bytes=n)
+
+    seen = []
+    before = None
+    while True:
+        page = db.get_conversion_history(limit=2, before=before)
+        seen += [row["converted_filename"] for row in page]
+        if len(page) < 2:
+            break
+        cursor = encode_history_cursor(page[-1])
+        before = decode_history_cursor(cursor)
+        assert before == (page[-1]["conversion_time"], page[-1]["id"])
+    # Rows share a timestamp within the second, so the id breaks ties
+    assert seen == [f"out{n}.wav" for n in reversed(range(5))]
+    assert [row["original_filename"] for row in db.get_conversion_history(celebrity_id="celebrity_1")] == [
+        "clip3.wav", "clip1.wav",
+    ]
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "bm90LWEtY3Vyc29y", "MjAyNHx4"])
+def test_malformed_cursor_is_a_bad_request(cursor):
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
+    with pytest.raises(HTTPException) as rejected:
+        main.get_conversion_history(limit=10, cursor=cursor, celebrity=None)
+    assert rejected.value.status_code == 400
@@ -0,0 +1,83 @@
+"""Fan-out conversion of one input to several voices"""
+
+import asyncio
+import wave
+
+import numpy as np
+
+from audio_decode import CANONICAL_RATE
+from fanout import SharedAnalysisGroup
+from voice_engine import VoiceParams, convert_path, convert_path_many, write_wav
+
+LOW = VoiceParams(pitch_semitones=-4.0, formant_ratio=0.9)
+HIGH = VoiceParams(pitch_semitones=3.0, formant_ratio=1.1)
+
+
+def test_group_makes_one_engine_call_for_the_targets_that_need_one():
+    calls = []
+
+    async def convert_many(source, targets):
+        calls.append((source, targets))
+        return {"decode": 0.1}, [{"destination": destination} for destination, _ in targets]
+
+    async def run():
+        group = SharedAnalysisGroup("input.wav", expected=3, convert_many=convert_many)
+        group.skip()
+        results = await asyncio.gather(group.convert("low.wav", LOW), group.convert("high.wav", HIGH))
+        await group.join()
+        return group, results
+
+    group, results = asyncio.run(run())
+    assert calls == [("input.wav", [("low.wav", LOW), ("high.wav", HIGH)])]
+    assert results == [{"destination": "low.wav"}, {"destination": "high.wav"}]
+    assert group.shared_stages == {"decode": 0.1}
+
+
+def test_engine_failure_reaches_every_target():
+    async def convert_many(source, targets):
+        raise ValueError("undecodable")
+
+    async def run():
+        group = SharedAnalysisGroup("input.wav", expected=2, convert_many=convert_many)
+        return await asyncio.gather(group.convert("low.wav", LOW), group.convert("high.wav", HIGH),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["undecodable", "undecodable"]
+
+
+def test_group_where_every_target_skips_makes_no_call():
+    async def convert_many(source, targets):
+        raise AssertionError("not expected")
+
+    async def run():
+        group = SharedAnalysisGroup("input.wav", expected=2, convert_many=convert_many)
+        group.skip()
+        group.skip()
+        await group.join()
+
+    asyncio.run(run())
+
+
+def read_samples(path) -> np.ndarray:
+    with wave.open(str(path), "rb") as wav:
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+
+
+def test_shared_analysis_matches_separate_conversions(tmp_path):
+    t = np.arange(CANONICAL_RATE) / CANONICAL_RATE
+    source = tmp_path / "input.wav"
+    write_wav(str(source), (0.2 * sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 12))).astype(np.float32),
+              CANONICAL_RATE)
+
+    targets = [(str(tmp_path / "low.wav"), LOW), (str(tmp_path / "high.wav"), HIGH),
+               (str(tmp_path / "low_again.wav"), LOW)]
+    shared, results = convert_path_many(str(source), targets)
+    assert set(shared) == {"decode", "vad", "analysis"}
+    assert len(results) == 3
+
+    for name, params in [("low", LOW), ("high", HIGH)]:
+        convert_path(str(source), str(tmp_path / f"{name}_alone.wav"), params)
+        alone = read_samples(tmp_path / f"{name}_alone.wav").astype(np.int32)
+        assert np.abs(read_samples(tmp_path / f"{name}.wav") - alone).max() <= 1
+    np.testing.assert_array_equal(read_samples(tmp_path / "low.wav"), read_samples(tmp_path / "low_again.wav"))
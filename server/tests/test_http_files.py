@@ -0,0 +1,95 @@
+"""Range requests and conditional GETs for stored files"""
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from http_files import RangeNotSatisfiable, parse_range, serve_bytes, serve_file
+
+DATA = bytes(range(256)) * 40
+
+
+def make_client(tmp_path) -> TestClient:
+    (tmp_path / "clip.wav").write_bytes(DATA)
+    app = FastAPI()
+
+    @app.get("/file")
+    def file(request: Request):
+        return serve_file(request, str(tmp_path / "clip.wav"), "audio/wav") or Response(status_code=404)
+
+    @app.get("/memory")
+    def memory(request: Request):
+        return serve_bytes(request, memoryview(DATA), "audio/wav", '"memory"', 0.0,
+                           "Thu, 01 Jan 1970 00:00:00 GMT")
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("BYTES = 1-2", (1, 2)),
+    ("bytes=0-1,5-6", None),
+    ("bytes=5-1", None),
+    ("bytes=x-1", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+@pytest.mark.parametrize("path", ["/file", "/memory"])
+def test_range_request_returns_partial_content(tmp_path, path):
+    client = make_client(tmp_path)
+    response = client.get(path, headers={"Range": "bytes=100-299"})
+    assert response.status_code == 206
+    assert response.content == DATA[100:300]
+    assert response.headers["content-range"] == f"bytes 100-299/{len(DATA)}"
+    assert response.headers["content-length"] == "200"
+
+    response = client.get(path, headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_stale_if_range_returns_the_whole_file(tmp_path):
+    client = make_client(tmp_path)
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_conditional_get_is_not_modified(tmp_path):
+    client = make_client(tmp_path)
+    first = client.get("/file")
+    assert first.status_code == 200
+    assert first.content == DATA
+    etag = first.headers["etag"]
+
+    assert client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/file", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/file", headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+    # An ETag that no longer matches wins over a still-current date
+    assert client.get("/file", headers={
+        "If-None-Match": '"other"', "If-Modified-Since": first.headers["last-modified"],
+    }).status_code == 200
+
+    (tmp_path / "clip.wav").write_bytes(DATA[::-1])
+    changed = client.get("/file", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_missing_file_is_not_served(tmp_path):
+    client = make_client(tmp_path)
+    (tmp_path / "clip.wav").unlink()
+    assert client.get("/file").status_code == 404
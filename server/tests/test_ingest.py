@@ -0,0 +1,78 @@
+"""Streaming uploads to disk"""
+
+import asyncio
+import hashlib
+import io
+import os
+
+import numpy as np
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from ingest import save_upload, save_upload_deduplicated
+from voice_engine import write_wav
+
+
+def upload(data: bytes, declared: bool = False) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data) if declared else None, filename="clip.wav")
+
+
+def wav_bytes(tmp_path, seconds: float = 1.5, sample_rate: int = 16000) -> bytes:
+    path = tmp_path / "source.wav"
+    write_wav(str(path), np.zeros(int(seconds * sample_rate), dtype=np.float32), sample_rate)
+    return path.read_bytes()
+
+
+def test_upload_is_hashed_and_timed(tmp_path):
+    data = wav_bytes(tmp_path)
+    destination = str(tmp_path / "saved.wav")
+
+    saved = asyncio.run(save_upload(upload(data), destination, chunk_size=1000))
+    assert saved["size"] == len(data)
+    assert saved["sha256"] == hashlib.sha256(data).hexdigest()
+    assert saved["duration"] == pytest.approx(1.5)
+    assert saved["container"] == "wav"
+    assert open(destination, "rb").read() == data
+
+
+def test_streaming_wav_without_a_data_size_is_timed_from_what_arrived(tmp_path):
+    data = bytearray(wav_bytes(tmp_path))
+    data[40:44] = b"\xff\xff\xff\xff"
+
+    saved = asyncio.run(save_upload(upload(bytes(data)), str(tmp_path / "saved.wav")))
+    assert saved["duration"] == pytest.approx(1.5)
+
+
+def test_upload_over_the_cap_is_rejected_and_removed(tmp_path):
+    destination = tmp_path / "saved.wav"
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save_upload(upload(bytes(5000)), str(destination), max_bytes=4096, chunk_size=1000))
+    assert rejected.value.status_code == 413
+    assert not destination.exists()
+
+
+def test_declared_size_over_the_cap_is_rejected_before_reading(tmp_path):
+    file = upload(bytes(5000), declared=True)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save_upload(file, str(tmp_path / "saved.wav"), max_bytes=4096))
+    assert rejected.value.status_code == 413
+    assert file.file.tell() == 0
+
+
+def test_identical_uploads_share_one_file(tmp_path):
+    data = wav_bytes(tmp_path)
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+
+    first = asyncio.run(save_upload_deduplicated(upload(data), str(uploads)))
+    second = asyncio.run(save_upload_deduplicated(upload(data), str(uploads)))
+    assert first["path"] == second["path"] == str(uploads / f"{hashlib.sha256(data).hexdigest()}.wav")
+    assert (first["duplicate"], second["duplicate"]) == (False, True)
+    assert os.listdir(uploads) == [os.path.basename(first["path"])]
+
+
+def test_non_audio_upload_is_rejected_when_audio_is_required(tmp_path):
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save_upload_deduplicated(upload(b"not audio at all"), str(tmp_path), require_audio=True))
+    assert rejected.value.status_code == 415
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,100 @@
+"""The registry shared by server workers"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from conversion_cache import ConversionCache, result_filename
+from job_registry import MemoryBackend, SQLiteBackend, create_backend
+from voice_engine import ENGINE_NAME, write_wav
+
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def registry(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "registry.db"))
+    yield backend
+    backend.close()
+
+
+def job(revision: int, status: str = "running", updated_at: float = 100.0):
+    return {"id": "job1", "revision": revision, "status": status, "updated_at": updated_at,
+            "total": 1, "completed": 0, "failed": 0, "files": []}
+
+
+def test_older_job_snapshots_never_replace_newer_ones(registry):
+    registry.save_job(job(2))
+    registry.save_job(job(1, status="queued"))
+    assert registry.get_job("job1")["revision"] == 2
+
+    registry.save_job(job(3, status="completed"))
+    assert registry.prune_jobs(cutoff=50.0) == 0
+    assert registry.prune_jobs(cutoff=200.0) == 1
+    assert registry.get_job("job1") is None
+
+
+def test_one_worker_converts_a_key_at_a_time(registry):
+    assert registry.claim_conversion(KEY, owner="a")
+    assert not registry.claim_conversion(KEY, owner="b")
+    # Claiming again extends the owner's own lease
+    assert registry.claim_conversion(KEY, owner="a")
+
+    registry.release_conversion(KEY, owner="b")
+    assert not registry.claim_conversion(KEY, owner="b")
+    registry.release_conversion(KEY, owner="a")
+    assert registry.claim_conversion(KEY, owner="b")
+
+    registry.complete_conversion(KEY, "out.wav", ENGINE_NAME, 100)
+    assert registry.get_result(KEY)["filename"] == "out.wav"
+    # A finished key is claimable again, for when its file has been evicted
+    assert registry.claim_conversion(KEY, owner="a")
+    assert registry.get_result(KEY) is None
+
+
+def test_expired_lease_can_be_taken_over(registry):
+    assert registry.claim_conversion(KEY, owner="a", lease=-1)
+    assert registry.claim_conversion(KEY, owner="b")
+
+
+def test_upload_is_unused_once_every_hold_is_released(registry):
+    registry.hold_upload("/uploads/a.wav", owner="a")
+    registry.hold_upload("/uploads/a.wav", owner="b")
+    assert not registry.release_upload("/uploads/a.wav", owner="a", when_unused=lambda: "deleted")
+    assert registry.release_upload("/uploads/a.wav", owner="b", when_unused=lambda: "deleted") == "deleted"
+
+    registry.hold_upload("/uploads/b.wav", owner="a", lease=-1)
+    assert registry.if_unused("/uploads/b.wav", None)
+
+
+def test_workers_adopt_each_others_results(tmp_path):
+    registry_path = str(tmp_path / "registry.db")
+    first = ConversionCache(str(tmp_path), registry=SQLiteBackend(registry_path))
+    second = ConversionCache(str(tmp_path), registry=SQLiteBackend(registry_path))
+    calls = []
+
+    async def convert(destination):
+        calls.append(destination)
+        write_wav(destination, np.zeros(100, dtype=np.float32), 16000)
+        return {"engine": ENGINE_NAME}
+
+    filename = result_filename("singer", KEY)
+    converted = asyncio.run(first.get_or_convert(KEY, filename, convert))
+    adopted = asyncio.run(second.get_or_convert(KEY, filename, convert))
+
+    assert len(calls) == 1
+    assert (converted["cached"], adopted["cached"]) == (False, True)
+    assert adopted["filename"] == filename
+    assert second.shared_hits == 1
+
+
+def test_backend_is_chosen_by_url(tmp_path):
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    backend = create_backend(f"sqlite:///{tmp_path}/registry.db")
+    assert backend.path == f"{tmp_path}/registry.db"
+    backend.close()
+    with pytest.raises(ValueError):
+        create_backend("redis://localhost")
+    with pytest.raises(ValueError):
+        create_backend("sqlite://")
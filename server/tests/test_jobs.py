@@ -0,0 +1,74 @@
+"""Batch conversion jobs"""
+
+import asyncio
+
+import numpy as np
+
+from conversion_cache import ConversionCache, result_filename
+from jobs import JobQueue, public_view
+from voice_engine import ENGINE_NAME, VoiceParams, write_wav
+
+
+def batch(count: int):
+    return [
+        {
+            "original": f"clip{n}.wav",
+            "upload_path": f"/uploads/clip{n}.wav",
+            "key": f"{n:032x}",
+            "converted": result_filename("singer", f"{n:032x}"),
+        }
+        for n in range(count)
+    ]
+
+
+async def run_job(queue: JobQueue, files):
+    job = queue.submit("singer", "Singer", VoiceParams(), files)
+    while queue.get(job["id"])["status"] in ("queued", "running"):
+        await asyncio.sleep(0.01)
+    return queue.get(job["id"])
+
+
+def test_job_converts_every_file_within_the_concurrency_limit(tmp_path):
+    running = []
+    peak = []
+    done = []
+
+    async def convert(source, destination, params):
+        running.append(source)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        write_wav(destination, np.zeros(100, dtype=np.float32), 16000)
+        running.remove(source)
+        return {"engine": ENGINE_NAME}
+
+    async def on_file_done(path):
+        done.append(path)
+
+    queue = JobQueue(ConversionCache(str(tmp_path)), concurrency=2, convert=convert, on_file_done=on_file_done)
+    job = asyncio.run(run_job(queue, batch(5)))
+
+    assert job["status"] == "completed"
+    assert (job["completed"], job["failed"]) == (5, 0)
+    assert max(peak) == 2
+    assert sorted(done) == sorted(f["upload_path"] for f in batch(5))
+    # The registry copy is what other workers answer polls from
+    assert queue.registry.get_job(job["id"])["status"] == "completed"
+    view = public_view(job)
+    assert view["progress"] == 1.0
+    assert all("_upload_path" not in entry for entry in view["files"])
+
+
+def test_job_with_some_failures_is_partial(tmp_path):
+    async def convert(source, destination, params):
+        if source.endswith("clip1.wav"):
+            raise ValueError("undecodable")
+        write_wav(destination, np.zeros(100, dtype=np.float32), 16000)
+        return {"engine": ENGINE_NAME}
+
+    queue = JobQueue(ConversionCache(str(tmp_path)), convert=convert)
+    job = asyncio.run(run_job(queue, batch(3)))
+
+    assert job["status"] == "partial"
+    assert (job["completed"], job["failed"]) == (2, 1)
+    assert [entry["status"] for entry in job["files"]] == ["completed", "failed", "completed"]
+    assert job["files"][1]["error"] == "undecodable"
@@ -0,0 +1,32 @@
+"""Helpers of the load benchmark"""
+
+import hashlib
+import io
+import wave
+
+from benchmarks.load_test import SAMPLE_RATE, percentile, synthetic_wav, unique_variant
+
+
+def test_synthetic_input_is_a_wav_of_the_requested_length():
+    data = synthetic_wav(2.5, seed=3)
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, SAMPLE_RATE)
+        assert wav.getnframes() == int(2.5 * SAMPLE_RATE)
+    assert synthetic_wav(2.5, seed=3) == data
+
+
+def test_variants_miss_the_conversion_cache():
+    data = synthetic_wav(1.0)
+    variants = {hashlib.sha256(unique_variant(data, n)).hexdigest() for n in range(100)}
+    assert len(variants) == 100
+    assert all(len(unique_variant(data, n)) == len(data) for n in range(3))
+    assert unique_variant(data, 7)[:-2] == data[:-2]
+
+
+def test_percentile_picks_the_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 51
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([0.2], 95) == 0.2
+    assert percentile([], 50) is None
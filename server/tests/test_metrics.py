@@ -0,0 +1,72 @@
+"""Prometheus instrumentation"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Counter, DiskUsage, Gauge, Histogram, MetricsMiddleware, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="decode")
+
+    assert histogram.render().splitlines() == [
+        "# HELP stage_seconds Stage time",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="decode",le="0.1"} 2',
+        'stage_seconds_bucket{stage="decode",le="1"} 3',
+        'stage_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'stage_seconds_sum{stage="decode"} 3.65',
+        'stage_seconds_count{stage="decode"} 4',
+    ]
+
+
+def test_counters_and_gauges_render_by_label():
+    registry = Registry()
+    counter = registry.register(Counter("conversions_total", "Conversions", ("engine",)))
+    gauge = registry.register(Gauge("in_progress", "Running"))
+    computed = registry.register(Gauge("queue", "Waiting", ("name",), function=lambda: {("a\"b",): 2}))
+    counter.inc(engine="dsp")
+    counter.inc(2, engine="dsp")
+    with gauge.track_inprogress():
+        assert gauge.samples() == ["in_progress 1"]
+
+    assert counter.samples() == ['conversions_total{engine="dsp"} 3']
+    assert gauge.samples() == ["in_progress 0"]
+    assert computed.samples() == ['queue{name="a\\"b"} 2']
+    assert registry.render().endswith("\n")
+
+
+def test_disk_usage_is_rescanned_after_its_ttl(tmp_path):
+    (tmp_path / "a.wav").write_bytes(bytes(100))
+    usage = DiskUsage({"results": str(tmp_path), "missing": str(tmp_path / "missing")}, ttl=3600)
+    assert usage() == {("results",): 100, ("missing",): 0}
+
+    (tmp_path / "b.wav").write_bytes(bytes(50))
+    assert usage()[("results",)] == 100
+    usage.ttl = 0
+    assert usage()[("results",)] == 150
+
+
+def test_requests_are_timed_by_route_template(monkeypatch):
+    histogram = Histogram("requests", "Requests", ("method", "route", "status"))
+    monkeypatch.setattr(metrics, "REQUEST_SECONDS", histogram)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/results/{filename}")
+    def result(filename: str):
+        return {"filename": filename}
+
+    client = TestClient(app)
+    client.get("/results/a.wav")
+    client.get("/results/b.wav")
+    client.get("/nowhere")
+
+    counts = [line for line in histogram.samples() if "_count" in line]
+    assert counts == [
+        'requests_count{method="GET",route="/results/{filename}",status="200"} 2',
+        'requests_count{method="GET",route="unmatched",status="404"} 1',
+    ]
@@ -0,0 +1,131 @@
+"""Expiry, upload holds and the disk budget, shared by workers"""
+
+import asyncio
+import os
+import time
+
+from conversion_cache import ConversionCache, result_filename
+from job_registry import SQLiteBackend
+from retention import RetentionManager
+
+
+def make_workers(tmp_path, **options):
+    """Two managers over one uploads/ directory, as two server processes would have"""
+    uploads = tmp_path / "uploads"
+    results = tmp_path / "results"
+    uploads.mkdir()
+    results.mkdir()
+    registry_path = str(tmp_path / "registry.db")
+    return [
+        RetentionManager(str(uploads), str(results), [], registry=SQLiteBackend(registry_path),
+                         owner=f"worker-{n}", **options)
+        for n in range(2)
+    ]
+
+
+def shared_upload(tmp_path) -> str:
+    path = tmp_path / "uploads" / "0123abcd.wav"
+    path.write_bytes(b"RIFF" + bytes(64))
+    return str(path)
+
+
+def test_release_keeps_upload_another_worker_holds(tmp_path):
+    first, second = make_workers(tmp_path)
+    path = shared_upload(tmp_path)
+
+    async def run():
+        await first.hold_upload(path)
+        await second.hold_upload(path)
+        await first.release_upload(path)
+        assert os.path.exists(path)
+        await second.release_upload(path)
+        assert not os.path.exists(path)
+
+    asyncio.run(run())
+    assert first.reclaimed_files.get("upload", 0) == 0
+    assert second.reclaimed_files["upload"] == 1
+
+
+def test_sweep_keeps_upload_another_worker_holds(tmp_path):
+    first, second = make_workers(tmp_path, upload_ttl=-1, budget=0, result_ttl=0)
+    path = shared_upload(tmp_path)
+
+    async def run():
+        await second.hold_upload(path)
+        await first.sweep()
+        assert os.path.exists(path)
+        await second.release_upload(path)
+        assert not os.path.exists(path)
+
+    asyncio.run(run())
+
+
+def test_repeated_holds_in_one_worker_need_as_many_releases(tmp_path):
+    first, second = make_workers(tmp_path)
+    path = shared_upload(tmp_path)
+
+    async def run():
+        await first.hold_upload(path)
+        await first.hold_upload(path)
+        await first.release_upload(path)
+        assert os.path.exists(path)
+        await first.release_upload(path)
+        assert not os.path.exists(path)
+
+    asyncio.run(run())
+
+
+def test_budget_covers_results_every_worker_wrote(tmp_path):
+    uploads = tmp_path / "uploads"
+    results = tmp_path / "results"
+    uploads.mkdir()
+    results.mkdir()
+    caches = [ConversionCache(str(results)) for _ in range(2)]
+
+    # Each worker indexes only the results it wrote itself: 4 x 1000 bytes each
+    for n in range(8):
+        key = f"{n:032x}"
+        filename = result_filename("singer", key)
+        (results / filename).write_bytes(b"RIFF" + bytes(996))
+        os.utime(results / filename, (1000 + n, 1000 + n))
+        caches[n % 2].store(key, filename)
+        caches[n % 2].entries[key]["accessed"] = 1000 + n
+
+    first = RetentionManager(str(uploads), str(results), [caches[0]], budget=5000, result_ttl=0, upload_ttl=3600)
+    asyncio.run(first.sweep())
+
+    assert first.disk_bytes == 8000
+    assert sum(entry.stat().st_size for entry in os.scandir(results)) <= 5000
+    # The oldest results went first, whichever worker wrote them
+    assert sorted(os.listdir(results)) == [result_filename("singer", f"{n:032x}") for n in range(3, 8)]
+
+
+def test_results_and_uploads_expire(tmp_path):
+    uploads = tmp_path / "uploads"
+    results = tmp_path / "results"
+    uploads.mkdir()
+    results.mkdir()
+    cache = ConversionCache(str(results))
+    now = time.time()
+    # Stored least recently used first, as the index keeps them
+    for n, age in enumerate([7200, 10]):
+        key = f"{n:032x}"
+        (results / result_filename("singer", key)).write_bytes(b"RIFF" + bytes(96))
+        cache.store(key, result_filename("singer", key))
+        cache.entries[key]["accessed"] = now - age
+    for name, age in [("old.wav", 7200), ("new.wav", 10), ("held.wav", 7200), ("old.wav.part", 7200)]:
+        (uploads / name).write_bytes(bytes(10))
+        os.utime(uploads / name, (now - age, now - age))
+
+    manager = RetentionManager(str(uploads), str(results), [cache], budget=0, result_ttl=3600, upload_ttl=3600)
+
+    async def run():
+        await manager.hold_upload(str(uploads / "held.wav"))
+        await manager.sweep()
+
+    asyncio.run(run())
+    assert list(cache.entries) == [f"{1:032x}"]
+    assert os.listdir(results) == [result_filename("singer", f"{1:032x}")]
+    assert sorted(os.listdir(uploads)) == ["held.wav", "new.wav"]
+    assert dict(manager.reclaimed_files) == {"ttl": 1, "upload_ttl": 1, "stale_partial": 1}
+    assert manager.disk_bytes == 100 + 20
@@ -0,0 +1,60 @@
+"""Packed preview sample archive"""
+
+import os
+
+from http_files import content_etag
+from sample_archive import SampleArchive, build_archive
+
+
+def make_samples(tmp_path):
+    samples = tmp_path / "samples"
+    samples.mkdir()
+    (samples / "singer_sample.wav").write_bytes(b"RIFF" + bytes(range(200)))
+    (samples / "singer_sample.mp3").write_bytes(b"ID3" + bytes(1000))
+    (samples / "other_sample.wav").write_bytes(b"RIFF" + bytes(10))
+    (samples / ".hidden").write_bytes(b"skipped")
+    return samples
+
+
+def test_archive_serves_every_sample_as_built(tmp_path):
+    samples = make_samples(tmp_path)
+    output = tmp_path / "samples.pack"
+    assert build_archive(samples, output) == 3
+
+    archive = SampleArchive.open(output, samples)
+    assert archive.loaded
+    assert sorted(archive.entries) == ["other_sample.wav", "singer_sample.mp3", "singer_sample.wav"]
+    assert archive.stale == frozenset()
+    for name, entry in archive.entries.items():
+        path = samples / name
+        assert bytes(entry["data"]) == path.read_bytes()
+        assert entry["etag"] == content_etag(str(path), os.stat(path))
+        assert entry["mtime"] == os.stat(path).st_mtime
+    assert archive.get("singer_sample.mp3")["media_type"] == "audio/mpeg"
+    assert sorted(archive.previews) == ["other", "singer"]
+    assert archive.get("missing.wav") is None
+
+
+def test_changed_and_added_files_are_left_to_the_disk(tmp_path):
+    samples = make_samples(tmp_path)
+    build_archive(samples, tmp_path / "samples.pack")
+    (samples / "singer_sample.wav").write_bytes(b"RIFF" + bytes(300))
+    (samples / "new_sample.wav").write_bytes(b"RIFF")
+
+    archive = SampleArchive.open(tmp_path / "samples.pack", samples)
+    assert archive.stale == frozenset({"singer_sample.wav", "new_sample.wav"})
+    assert sorted(archive.entries) == ["other_sample.wav", "singer_sample.mp3"]
+    assert "singer" not in archive.previews
+
+
+def test_missing_or_foreign_archive_is_empty(tmp_path):
+    samples = make_samples(tmp_path)
+    assert not SampleArchive.open(tmp_path / "missing.pack", samples).loaded
+
+    (tmp_path / "empty.pack").write_bytes(b"")
+    assert not SampleArchive.open(tmp_path / "empty.pack", samples).loaded
+
+    (tmp_path / "foreign.pack").write_bytes(b"PK\x03\x04" + bytes(100))
+    archive = SampleArchive.open(tmp_path / "foreign.pack", samples)
+    assert not archive.loaded
+    assert len(archive) == 0
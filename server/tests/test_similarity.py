@@ -0,0 +1,52 @@
+"""Voice similarity search"""
+
+import numpy as np
+
+from audio_decode import CANONICAL_RATE
+from similarity import SimilarityIndex, clip_embedding
+from voice_engine import write_wav
+from voice_profiles import EMBEDDING_DIM
+
+
+def random_catalog(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [f"singer_{i}" for i in range(n)], rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+
+
+def test_query_ranks_the_closest_voice_first():
+    ids, embeddings = random_catalog(50)
+    index = SimilarityIndex(ids, embeddings)
+    query = embeddings[17] + 0.05 * np.random.default_rng(1).standard_normal(EMBEDDING_DIM)
+
+    matches, approximate = index.query(query, limit=3)
+    assert not approximate
+    assert [celebrity_id for celebrity_id, _ in matches][0] == "singer_17"
+    scores = [score for _, score in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert 0.9 < scores[0] <= 1.0
+
+
+def test_approximate_index_finds_the_same_best_match():
+    ids, embeddings = random_catalog(400)
+    index = SimilarityIndex(ids, embeddings, ann_min_items=100)
+    assert index.centroids is not None
+    assert sum(len(members) for members in index.members) == 400
+
+    for i in (3, 150, 399):
+        exact, _ = index.query(embeddings[i], limit=1, approximate=False)
+        approximate, used = index.query(embeddings[i], limit=1)
+        assert used
+        assert approximate[0][0] == exact[0][0] == f"singer_{i}"
+
+
+def test_empty_catalog_has_no_matches():
+    assert SimilarityIndex([], np.zeros((0, EMBEDDING_DIM))).query(np.ones(EMBEDDING_DIM)) == ([], False)
+
+
+def test_clips_shorter_than_a_quarter_second_have_no_embedding(tmp_path):
+    t = np.arange(CANONICAL_RATE) / CANONICAL_RATE
+    write_wav(str(tmp_path / "long.wav"), (0.3 * np.sin(2 * np.pi * 150 * t)).astype(np.float32), CANONICAL_RATE)
+    write_wav(str(tmp_path / "short.wav"), np.zeros(CANONICAL_RATE // 8, dtype=np.float32), CANONICAL_RATE)
+
+    assert clip_embedding(str(tmp_path / "long.wav")).shape == (EMBEDDING_DIM,)
+    assert clip_embedding(str(tmp_path / "short.wav")) is None
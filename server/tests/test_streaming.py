@@ -0,0 +1,61 @@
+"""Live streaming conversion"""
+
+import numpy as np
+import pytest
+
+from streaming import StreamingConverter, float_to_pcm16, pcm16_to_float, stream_fft_size
+from voice_engine import VoiceParams
+
+RATE = 16000
+
+
+def harmonic_tone(seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.2 * sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 15))).astype(np.float32)
+
+
+def stream(converter: StreamingConverter, x: np.ndarray, chunk: int) -> np.ndarray:
+    pieces = [converter.process(x[start:start + chunk]) for start in range(0, len(x), chunk)]
+    return np.concatenate(pieces + [converter.flush()])
+
+
+@pytest.mark.parametrize("params", [VoiceParams(), VoiceParams(pitch_semitones=5.0, formant_ratio=1.1)])
+def test_output_does_not_depend_on_message_size(params):
+    x = harmonic_tone()
+    whole = stream(StreamingConverter(params, RATE), x, len(x))
+    pieces = stream(StreamingConverter(params, RATE), x, 333)
+    assert len(whole) == len(pieces) == len(x)
+    np.testing.assert_allclose(whole, pieces, atol=1e-5)
+
+
+def test_neutral_stream_reproduces_the_input_in_step():
+    x = harmonic_tone()
+    y = stream(StreamingConverter(VoiceParams(), RATE), x, 512)
+    assert np.corrcoef(x[2000:-2000], y[2000:-2000])[0, 1] > 0.999
+
+
+def test_output_lags_the_input_by_at_most_a_frame():
+    converter = StreamingConverter(VoiceParams(), RATE)
+    assert converter.n_fft == stream_fft_size(RATE) == 1024
+    assert converter.latency_ms <= 64.0
+
+    x = harmonic_tone()
+    released = 0
+    for start in range(0, len(x), 256):
+        released += len(converter.process(x[start:start + 256]))
+        assert start + 256 - converter.latency_samples - converter.hop <= released <= start + 256
+    assert released + len(converter.flush()) == len(x)
+
+
+def test_flush_starts_a_new_utterance():
+    converter = StreamingConverter(VoiceParams(pitch_semitones=-3.0), RATE)
+    x = harmonic_tone(0.5)
+    first = stream(converter, x, 400)
+    second = stream(converter, x, 400)
+    np.testing.assert_array_equal(first, second)
+
+
+def test_pcm16_round_trip():
+    x = np.array([-1.0, -0.5, 0.0, 0.25, 0.999], dtype=np.float32)
+    np.testing.assert_allclose(pcm16_to_float(float_to_pcm16(x)), x, atol=1 / 16384)
+    assert len(float_to_pcm16(x)) == 2 * len(x)
@@ -0,0 +1,83 @@
+"""Voice activity detection"""
+
+import numpy as np
+import pytest
+
+import vad
+from vad import SpeechTracker, regions_to_convert, speech_regions
+
+RATE = 16000
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.2 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def pause(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def recording(*parts: np.ndarray) -> np.ndarray:
+    x = np.concatenate(parts)
+    return (x + 0.0003 * np.random.default_rng(0).standard_normal(len(x))).astype(np.float32)
+
+
+def seconds(regions):
+    return [(start / RATE, end / RATE) for start, end in regions]
+
+
+def test_regions_are_padded_and_bridge_short_pauses():
+    x = recording(pause(2), tone(1), pause(0.3), tone(0.5), pause(2), tone(0.02), pause(2))
+    # The 20 ms click is too short to be speech
+    assert seconds(speech_regions(x, RATE)) == [(1.8, 4.0)]
+
+
+def test_what_is_converted():
+    assert regions_to_convert(recording(pause(3)), RATE) == []
+    # Less than MIN_SAVING of silence is not worth skipping
+    x = recording(tone(3), pause(0.1))
+    assert regions_to_convert(x, RATE) == [(0, len(x))]
+    assert regions_to_convert(np.zeros(0, dtype=np.float32), RATE) == [(0, 0)]
+
+
+def test_disabled_detection_converts_everything(monkeypatch):
+    monkeypatch.setattr(vad, "VAD_ENABLED", False)
+    x = recording(pause(3), tone(1), pause(3))
+    assert regions_to_convert(x, RATE) == [(0, len(x))]
+
+
+def tracked(x: np.ndarray, block_seconds: float, chunk: int):
+    tracker = SpeechTracker(RATE, block_seconds)
+    spans = []
+    for start in range(0, len(x), chunk):
+        spans += tracker.feed(x[start:start + chunk])
+    spans += tracker.finish()
+
+    regions, position = [], 0
+    for samples, speech in spans:
+        if speech:
+            if regions and regions[-1][1] == position:
+                regions[-1] = (regions[-1][0], position + len(samples))
+            else:
+                regions.append((position, position + len(samples)))
+        position += len(samples)
+    return np.concatenate([samples for samples, _ in spans]), regions
+
+
+@pytest.mark.parametrize("block_seconds", [1.0, 2.0, 5.0])
+def test_tracker_decides_blocks_as_the_whole_recording_would(block_seconds):
+    # The second pause is longer than a block
+    x = recording(pause(3), tone(2), pause(7), tone(1), pause(4))
+    replayed, regions = tracked(x, block_seconds, 3000)
+    np.testing.assert_array_equal(replayed, x)
+    assert regions == regions_to_convert(x, RATE)
+    assert seconds(regions) == [(2.8, 5.2), (11.8, 13.2)]
+
+
+def test_tracker_with_detection_disabled_passes_everything_as_speech(monkeypatch):
+    monkeypatch.setattr(vad, "VAD_ENABLED", False)
+    x = recording(pause(3), tone(1), pause(3))
+    replayed, regions = tracked(x, 2.0, 5000)
+    np.testing.assert_array_equal(replayed, x)
+    assert regions == [(0, len(x))]
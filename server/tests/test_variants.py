@@ -0,0 +1,41 @@
+"""Output format negotiation and the encoded-variant store"""
+
+import pytest
+
+from variants import VariantStore, negotiate_format, variant_filename
+
+
+@pytest.mark.parametrize("requested, accept, expected", [
+    ("MP3", "audio/ogg", "mp3"),
+    (None, None, "wav"),
+    (None, "*/*", "wav"),
+    (None, "audio/mpeg", "mp3"),
+    (None, "audio/ogg;q=0.5, audio/mp4;q=0.8", "m4a"),
+    (None, "audio/x-wav, audio/mpeg;q=0.9", "wav"),
+    (None, "audio/mpeg;q=0, audio/ogg;q=bad", "wav"),
+    (None, "text/html, application/json", "wav"),
+])
+def test_format_follows_the_query_then_accept(requested, accept, expected):
+    assert negotiate_format(requested, accept) == expected
+
+
+def test_without_an_encoder_accept_falls_back_to_wav():
+    assert negotiate_format(None, "audio/mpeg, audio/ogg;q=0.5", can_encode=False) == "wav"
+    assert negotiate_format(None, "audio/mpeg, audio/wav;q=0.1", can_encode=False) == "wav"
+
+
+def test_unknown_requested_format_is_rejected():
+    with pytest.raises(ValueError):
+        negotiate_format("flac", "audio/mpeg")
+
+
+def test_store_indexes_encoded_variants_only(tmp_path):
+    (tmp_path / "singer_converted_0123.mp3").write_bytes(bytes(10))
+    (tmp_path / "singer_converted_0123.ogg").write_bytes(bytes(20))
+    (tmp_path / "singer_converted_0123.wav").write_bytes(bytes(30))
+    (tmp_path / "notes.txt").write_bytes(bytes(40))
+
+    store = VariantStore(str(tmp_path))
+    assert sorted(store.entries) == ["singer_converted_0123.mp3", "singer_converted_0123.ogg"]
+    assert store.total_bytes == 30
+    assert variant_filename("singer_converted_0123.wav", "m4a") == "singer_converted_0123.m4a"
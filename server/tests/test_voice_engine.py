@@ -0,0 +1,187 @@
+"""The conversion engine, and silence skipping for compressed, unknown-length and long inputs"""
+
+import subprocess
+import wave
+
+import numpy as np
+import pytest
+
+import vad
+import voice_engine
+from audio_decode import CANONICAL_RATE, ffmpeg_available
+from voice_engine import (
+    BlockConverter,
+    LongFormConverter,
+    VoiceParams,
+    convert_path,
+    convert_signal,
+    params_for_celebrity,
+    write_wav,
+)
+
+PARAMS = VoiceParams(pitch_semitones=-3.0, formant_ratio=0.92)
+
+
+def padded_speech(seconds: float = 2.0, silence: float = 2.0) -> np.ndarray:
+    """A gliding harmonic tone with ``silence`` seconds of room noise before and after"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * CANONICAL_RATE)) / CANONICAL_RATE
+    phase = 2 * np.pi * np.cumsum(140 + 30 * np.sin(2 * np.pi * 0.3 * t)) / CANONICAL_RATE
+    speech = 0.2 * sum(np.sin(k * phase) / k for k in range(1, 12))
+    quiet = np.zeros(int(silence * CANONICAL_RATE))
+    x = np.concatenate([quiet, speech, quiet])
+    return (x + 0.002 * rng.standard_normal(len(x))).astype(np.float32)
+
+
+def frames(path) -> int:
+    with wave.open(str(path), "rb") as wav:
+        return wav.getnframes()
+
+
+def samples(path) -> np.ndarray:
+    with wave.open(str(path), "rb") as wav:
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2").astype(np.int32)
+
+
+def harmonic_tone(f0: float, seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(seconds * CANONICAL_RATE)) / CANONICAL_RATE
+    return (0.2 * sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 15))).astype(np.float32)
+
+
+def fundamental(x: np.ndarray) -> float:
+    """Autocorrelation pitch estimate between 60 and 500 Hz"""
+    x = x[2000:10000]
+    correlation = np.correlate(x, x, "full")[len(x) - 1:]
+    shortest = CANONICAL_RATE // 500
+    return CANONICAL_RATE / (shortest + np.argmax(correlation[shortest:CANONICAL_RATE // 60]))
+
+
+@pytest.mark.parametrize("semitones", [-12.0, 5.0, 12.0])
+def test_pitch_shift_moves_the_fundamental(semitones):
+    x = harmonic_tone(150.0)
+    y = convert_signal(x, CANONICAL_RATE, VoiceParams(pitch_semitones=semitones))
+    assert len(y) == len(x)
+    assert fundamental(y) == pytest.approx(150.0 * 2 ** (semitones / 12), rel=0.02)
+
+
+def test_neutral_params_reproduce_the_input():
+    x = harmonic_tone(150.0)
+    y = convert_signal(x, CANONICAL_RATE, VoiceParams())
+    assert np.corrcoef(x[2000:-2000], y[2000:-2000])[0, 1] > 0.999
+
+
+def test_params_follow_voice_characteristics():
+    deep = params_for_celebrity({"voice_characteristics": ["deep"], "debut_year": 2025})
+    sweet = params_for_celebrity({"voice_characteristics": ["Sweet"], "debut_year": 2025})
+    assert deep.pitch_semitones < 0 < sweet.pitch_semitones
+    assert deep.formant_ratio < 1.0 < sweet.formant_ratio
+    # A long career lowers the voice a little more
+    veteran = params_for_celebrity({"voice_characteristics": ["deep"], "debut_year": 1975})
+    assert veteran.pitch_semitones < deep.pitch_semitones
+    # Stacked characteristics stay within the engine's limits
+    extreme = params_for_celebrity({"voice_characteristics": ["deep", "baritone", "rugged"] * 3})
+    assert extreme.pitch_semitones == -6.0
+    assert extreme.formant_ratio == 0.85
+
+
+def test_convert_path_writes_the_canonical_rate(tmp_path):
+    source = tmp_path / "input.wav"
+    write_wav(str(source), harmonic_tone(150.0), 16000)
+
+    stats = convert_path(str(source), str(tmp_path / "out.wav"), PARAMS)
+    with wave.open(str(tmp_path / "out.wav"), "rb") as wav:
+        assert wav.getframerate() == CANONICAL_RATE
+        assert wav.getnframes() == round(stats["duration"] * CANONICAL_RATE)
+    assert stats["duration"] == pytest.approx(22050 / 16000, abs=1e-3)
+
+
+@pytest.mark.parametrize("block_frames, chunk", [(1, 333), (7, 1000), (40, 3 * CANONICAL_RATE)])
+def test_blocks_match_the_whole_signal(block_frames, chunk):
+    x = padded_speech(seconds=3.0, silence=0.0)
+    other = VoiceParams(pitch_semitones=4.0)
+    converter = BlockConverter([PARAMS, other], CANONICAL_RATE, block_frames=block_frames)
+    outputs = {PARAMS: [], other: []}
+    for start in range(0, len(x), chunk):
+        for params, y in converter.feed(x[start:start + chunk]).items():
+            outputs[params].append(y)
+    for params, y in converter.finish().items():
+        outputs[params].append(y)
+
+    for params in (PARAMS, other):
+        y = np.concatenate(outputs[params])
+        assert len(y) == len(x)
+        assert np.abs(y - convert_signal(x, CANONICAL_RATE, params)).max() < 1e-4
+
+
+def test_long_form_without_vad_converts_everything(tmp_path, monkeypatch):
+    monkeypatch.setattr(vad, "VAD_ENABLED", False)
+    x = padded_speech()
+    with LongFormConverter([(str(tmp_path / "blocks.wav"), PARAMS)], CANONICAL_RATE, block_frames=9) as converter:
+        for start in range(0, len(x), 5000):
+            converter.feed(x[start:start + 5000])
+        converter.finish()
+    assert converter.speech == converter.received == len(x)
+
+    write_wav(str(tmp_path / "memory.wav"), convert_signal(x, CANONICAL_RATE, PARAMS), CANONICAL_RATE)
+    assert np.abs(samples(tmp_path / "blocks.wav") - samples(tmp_path / "memory.wav")).max() <= 1
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="decoding FLAC needs ffmpeg")
+def test_compressed_input_skips_silence(tmp_path):
+    source = tmp_path / "input.wav"
+    write_wav(str(source), padded_speech(), CANONICAL_RATE)
+    compressed = tmp_path / "input.flac"
+    subprocess.run(["ffmpeg", "-v", "error", "-i", str(source), str(compressed)], check=True)
+
+    stats = convert_path(str(compressed), str(tmp_path / "out.wav"), PARAMS)
+    assert stats["compute_saved"] > 0.3
+    assert "blocks" not in stats
+
+
+def test_unknown_length_input_skips_silence(tmp_path, monkeypatch):
+    # As for any container whose header does not give the decoded length
+    monkeypatch.setattr(voice_engine, "decoded_length", lambda path: None)
+    source = tmp_path / "input.wav"
+    x = padded_speech()
+    write_wav(str(source), x, CANONICAL_RATE)
+
+    stats = convert_path(str(source), str(tmp_path / "out.wav"), PARAMS)
+    assert stats["compute_saved"] > 0.3
+    assert frames(tmp_path / "out.wav") == len(x)
+
+
+def test_unknown_length_input_past_the_limit_uses_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(voice_engine, "decoded_length", lambda path: None)
+    monkeypatch.setattr(voice_engine, "LONG_FILE_SECONDS", 1.0)
+    source = tmp_path / "input.wav"
+    x = padded_speech()
+    write_wav(str(source), x, CANONICAL_RATE)
+
+    stats = convert_path(str(source), str(tmp_path / "out.wav"), PARAMS)
+    assert stats["blocks"] >= 1
+    assert frames(tmp_path / "out.wav") == len(x)
+
+
+def test_long_input_skips_silence_in_blocks(tmp_path):
+    # 90 s of speech bursts between pauses of several seconds, some longer than a block
+    rng = np.random.default_rng(1)
+    burst = padded_speech(silence=0.0)
+    pieces = [np.zeros(int(seconds * CANONICAL_RATE), dtype=np.float32) for seconds in (4, 6, 12, 5, 8, 3, 14, 6)]
+    x = np.concatenate([part for pause in pieces for part in (pause, burst)])
+    x = np.concatenate([x, np.zeros(90 * CANONICAL_RATE - len(x), dtype=np.float32)])
+    x = (x + 0.002 * rng.standard_normal(len(x))).astype(np.float32)
+    source = tmp_path / "input.wav"
+    write_wav(str(source), x, CANONICAL_RATE)
+
+    shared, (stats,) = voice_engine.convert_path_blocks(str(source), [(str(tmp_path / "blocks.wav"), PARAMS)])
+    assert len(x) > voice_engine.LONG_FILE_SECONDS * CANONICAL_RATE
+    assert stats["compute_saved"] > 0.5
+
+    x, _ = voice_engine.read_audio(str(source))
+    regions = voice_engine.regions_to_convert(x, CANONICAL_RATE)
+    in_memory = voice_engine.render_regions(x, voice_engine.analyze_regions(x, CANONICAL_RATE, regions), PARAMS)
+    write_wav(str(tmp_path / "memory.wav"), in_memory, CANONICAL_RATE)
+    assert stats["compute_saved"] == pytest.approx(
+        voice_engine.speech_stats(regions, len(x), CANONICAL_RATE)["compute_saved"], abs=0.01
+    )
+    assert np.abs(samples(tmp_path / "blocks.wav") - samples(tmp_path / "memory.wav")).max() <= 2
@@ -0,0 +1,50 @@
+"""Precomputed voice profiles"""
+
+import json
+
+import numpy as np
+import pytest
+
+from voice_engine import write_wav
+from voice_profiles import PROFILE_DTYPE, VoiceProfileStore, build_profiles
+
+RATE = 16000
+
+
+def write_sample(path, f0: float, seconds: float = 1.5):
+    t = np.arange(int(seconds * RATE)) / RATE
+    write_wav(str(path), (0.2 * sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 10))).astype(np.float32), RATE)
+
+
+def test_profiles_are_built_and_mapped(tmp_path):
+    write_sample(tmp_path / "low_voice_sample.wav", 110.0)
+    write_sample(tmp_path / "high_voice_sample.wav", 240.0)
+    (tmp_path / "broken_sample.wav").write_bytes(b"not audio")
+    output = tmp_path / "profiles.npy"
+
+    assert build_profiles(tmp_path, output, jobs=1) == 2
+    store = VoiceProfileStore.open(output)
+    assert isinstance(store.table, np.memmap)
+    assert store.ids() == ["high_voice", "low_voice"]
+    assert "low_voice" in store and "broken" not in store
+
+    low, high = store.get("low_voice"), store.get("high_voice")
+    assert float(low["f0_mean"]) == pytest.approx(110.0, rel=0.02)
+    assert float(high["f0_mean"]) == pytest.approx(240.0, rel=0.02)
+    assert float(low["voiced_fraction"]) > 0.9
+    assert float(low["duration"]) == pytest.approx(1.5)
+
+    description = json.loads(json.dumps(store.describe("low_voice")))
+    assert description["f0_percentiles"]["p50"] == pytest.approx(110.0, rel=0.02)
+    assert len(description["envelope_hz"]) == len(description["envelope_db"])
+    assert store.describe("missing") is None
+
+
+def test_missing_or_outdated_file_gives_an_empty_store(tmp_path):
+    assert len(VoiceProfileStore.open(tmp_path / "missing.npy")) == 0
+
+    outdated = tmp_path / "outdated.npy"
+    np.save(outdated, np.zeros(2, dtype=[("id", "U48"), ("f0_mean", "<f4")]))
+    store = VoiceProfileStore.open(outdated)
+    assert len(store) == 0
+    assert store.table.dtype == PROFILE_DTYPE
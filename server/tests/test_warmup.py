@@ -0,0 +1,82 @@
+"""Lazy initialization and background warmup"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from warmup import Lazy, Warmup
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lazy_value_is_built_once_across_threads():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    lazy = Lazy(factory)
+    assert not lazy.ready
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(lazy.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert lazy.ready
+    assert all(value is values[0] for value in values)
+
+
+def run_warmup(warmup: Warmup, names, stop_at_once: bool = False):
+    async def run():
+        warmup.start(names)
+        if stop_at_once:
+            await warmup.stop()
+        while not warmup.done:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+
+def test_warmup_runs_hooks_in_order_and_records_failures():
+    order = []
+    warmup = Warmup()
+    warmup.register("catalog", lambda: order.append("catalog"))
+    warmup.register("broken", lambda: order.append("broken") or 1 / 0)
+    warmup.register("engine", lambda: order.append("engine"))
+
+    run_warmup(warmup, ["engine", "missing", "broken", "catalog"])
+    assert order == ["engine", "broken", "catalog"]
+    stats = warmup.stats()
+    assert stats["components"]["catalog"]["status"] == "ready"
+    assert stats["components"]["broken"] == {"status": "failed", "error": "division by zero"}
+    assert "missing" not in stats["components"]
+    assert stats["seconds"] is not None
+
+
+def test_stopped_warmup_skips_what_has_not_started():
+    order = []
+    warmup = Warmup()
+    warmup.register("catalog", lambda: order.append("catalog"))
+
+    run_warmup(warmup, ["catalog"], stop_at_once=True)
+    assert order == []
+    assert warmup.done
+
+
+def test_importing_the_server_builds_nothing(tmp_path):
+    script = (
+        f"import sys; sys.path.insert(0, {SERVER_DIR!r})\n"
+        "import celebrities, database, main\n"
+        "assert celebrities._catalog is None and database._db is None\n"
+        "assert not main.voice_profiles.ready and not main.similarity_index.ready\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, check=True, capture_output=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,207 @@
+"""
+Voice activity detection
+Finds the stretches of a recording that contain speech so the conversion
+engine only transforms those; leading and trailing silence and long pauses
+are copied through unchanged. Frame energy and zero-crossing rate are computed
+for the whole signal with a few array operations, and regions are derived
+from the frame mask without per-frame Python loops.
+
+A frame is speech when its energy is VOICE_VAD_MARGIN_DB above the
+recording's noise floor (its quietest frames), or when it is noisy-sounding
+(high zero-crossing rate, like "s" and "f") and at least half that margin above
+it. The threshold never rises above the margin below the recording's loudest
+frames, so a recording without quiet stretches is treated as all speech.
+Speech regions are widened by VOICE_VAD_PAD_SECONDS on each side, and pauses
+shorter than VOICE_VAD_MIN_SILENCE seconds are kept inside them.
+
+Recordings too long to hold in memory are classified a block at a time by a
+SpeechTracker.
+"""
+
+import math
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Set to 0 to transform every sample of every input
+VAD_ENABLED = os.environ.get("VOICE_VAD", "1") == "1"
+
+# Analysis frame length for the energy and zero-crossing measurements
+FRAME_SECONDS = 0.02
+
+# Speech frames are at least this much louder than the noise floor
+MARGIN_DB = float(os.environ.get("VOICE_VAD_MARGIN_DB", "12"))
+
+# Anything quieter than this is silence, however quiet the noise floor is
+SILENCE_DB = -60.0
+
+# Percentiles of frame energies taken as the noise floor and the loud level
+FLOOR_PERCENTILE = 10
+LOUD_PERCENTILE = 99
+
+# Zero crossings per sample above which a quiet frame may be an unvoiced consonant
+FRICATIVE_ZCR = 0.25
+
+# Bursts shorter than this (clicks, taps) are not speech
+MIN_SPEECH_SECONDS = 0.06
+
+# Context converted on each side of detected speech, so onsets and decays are
+# included and the splice back into the original lands in silence
+PAD_SECONDS = float(os.environ.get("VOICE_VAD_PAD_SECONDS", "0.2"))
+
+# Pauses shorter than this are converted along with the speech around them
+MIN_SILENCE_SECONDS = float(os.environ.get("VOICE_VAD_MIN_SILENCE", "0.5"))
+
+# Skipping is only worth splitting the signal for when it saves at least this share
+MIN_SAVING = float(os.environ.get("VOICE_VAD_MIN_SAVING", "0.1"))
+
+
+def frame_features(x: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Energy in dBFS and zero crossings per sample of consecutive ``frame``-sample frames"""
+    n_frames = -(-len(x) // frame)
+    frames = np.zeros(n_frames * frame, dtype=np.float32)
+    frames[:len(x)] = x
+    frames = frames.reshape(n_frames, frame)
+
+    energy = np.einsum("ij,ij->i", frames, frames) / frame
+    energy_db = 10 * np.log10(energy + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+    return energy_db, zcr
+
+
+def noise_levels(energy_db: np.ndarray) -> Tuple[float, float]:
+    """The noise floor and loud level, in dB, of a recording's frame energies"""
+    floor, peak = np.percentile(energy_db, [FLOOR_PERCENTILE, LOUD_PERCENTILE])
+    return float(floor), float(peak)
+
+
+def speech_mask(x: np.ndarray, sample_rate: int, levels: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """One boolean per FRAME_SECONDS frame of ``x``: whether it sounds like speech
+
+    ``levels`` is the (noise floor, loud level) to judge the frames against;
+    by default they are the ``noise_levels`` of ``x`` itself.
+    """
+    frame = max(int(FRAME_SECONDS * sample_rate), 1)
+    energy_db, zcr = frame_features(x, frame)
+    floor, peak = levels if levels is not None else noise_levels(energy_db)
+    ceiling = peak - MARGIN_DB
+    loud = energy_db > max(min(floor + MARGIN_DB, ceiling), SILENCE_DB)
+    fricative = (zcr > FRICATIVE_ZCR) & (energy_db > max(min(floor + MARGIN_DB / 2, ceiling), SILENCE_DB))
+    return loud | fricative
+
+
+def speech_regions(x: np.ndarray, sample_rate: int,
+                   levels: Optional[Tuple[float, float]] = None) -> List[Tuple[int, int]]:
+    """Sorted, non-overlapping (start, end) sample ranges of ``x`` that contain speech"""
+    if len(x) == 0:
+        return []
+    frame = max(int(FRAME_SECONDS * sample_rate), 1)
+    mask = speech_mask(x, sample_rate, levels)
+
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.view(np.int8), [0]])))
+    starts, ends = edges[::2], edges[1::2]
+    keep = ends - starts >= max(round(MIN_SPEECH_SECONDS / FRAME_SECONDS), 1)
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) == 0:
+        return []
+
+    pad = round(PAD_SECONDS / FRAME_SECONDS)
+    starts = np.maximum(starts - pad, 0)
+    ends = np.minimum(ends + pad, len(mask))
+
+    # A region continues through any pause too short to count as silence
+    gap_kept = starts[1:] - ends[:-1] >= round(MIN_SILENCE_SECONDS / FRAME_SECONDS)
+    starts = starts[np.concatenate([[True], gap_kept])]
+    ends = ends[np.concatenate([gap_kept, [True]])]
+
+    return [(int(start) * frame, min(int(end) * frame, len(x))) for start, end in zip(starts, ends)]
+
+
+def regions_to_convert(x: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+    """The ranges of ``x`` the engine should transform
+
+    The whole signal when detection is disabled or would skip less than
+    MIN_SAVING of it, and no ranges at all when ``x`` has no speech.
+    """
+    if not VAD_ENABLED or len(x) == 0:
+        return [(0, len(x))]
+    regions = speech_regions(x, sample_rate)
+    speech = sum(end - start for start, end in regions)
+    if speech > (1.0 - MIN_SAVING) * len(x):
+        return [(0, len(x))]
+    return regions
+
+
+class SpeechTracker:
+    """Speech and silence in a signal that arrives in pieces
+
+    The signal is decided a block at a time by ``speech_regions`` over the
+    block and the audio on either side of it that can change the outcome
+    there, so each block is classified as it would be within the whole
+    recording. Each block is judged against the lowest noise floor and the
+    highest loud level heard so far, so a pause longer than a block is still
+    silence. As in ``regions_to_convert``, a block with less than MIN_SAVING
+    of silence is all speech, and everything is when detection is disabled.
+    """
+
+    def __init__(self, sample_rate: int, block_seconds: float):
+        self.sample_rate = sample_rate
+        self.frame = max(int(FRAME_SECONDS * sample_rate), 1)
+        self.block = max(round(block_seconds / FRAME_SECONDS), 1) * self.frame
+        # Padding reaches PAD_SECONDS into a block, and a burst or a pause
+        # across its edge is judged on up to MIN_SPEECH_SECONDS or
+        # MIN_SILENCE_SECONDS (and their padding) of audio beyond it
+        reach = 2 * PAD_SECONDS + MIN_SPEECH_SECONDS + MIN_SILENCE_SECONDS
+        self.context = math.ceil(reach / FRAME_SECONDS) * self.frame
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._decided = 0
+        self._levels: Optional[Tuple[float, float]] = None
+
+    def feed(self, x: np.ndarray) -> List[Tuple[np.ndarray, bool]]:
+        """Add samples; returns the stretches decided since the last call as (samples, is_speech)"""
+        self._buffer = np.concatenate([self._buffer, np.asarray(x, dtype=np.float32)])
+        spans = []
+        while len(self._buffer) - self._decided >= self.block + self.context:
+            spans += self._decide(self.block)
+        return spans
+
+    def finish(self) -> List[Tuple[np.ndarray, bool]]:
+        """Decide what is left once the signal has ended"""
+        spans = []
+        while len(self._buffer) > self._decided:
+            spans += self._decide(min(len(self._buffer) - self._decided, self.block))
+        return spans
+
+    def _decide(self, n: int) -> List[Tuple[np.ndarray, bool]]:
+        # _buffer starts up to ``context`` samples before the block, on a frame boundary
+        start, end = self._decided, self._decided + n
+        if not VAD_ENABLED:
+            regions = [(start, end)]
+        else:
+            window = self._buffer[:end + self.context]
+            floor, peak = noise_levels(frame_features(window, self.frame)[0])
+            if self._levels is not None:
+                floor, peak = min(floor, self._levels[0]), max(peak, self._levels[1])
+            self._levels = (floor, peak)
+            regions = [
+                (max(a, start), min(b, end))
+                for a, b in speech_regions(window, self.sample_rate, self._levels) if a < end and b > start
+            ]
+            if sum(b - a for a, b in regions) > (1.0 - MIN_SAVING) * n:
+                regions = [(start, end)]
+
+        spans, position = [], start
+        for a, b in regions:
+            if a > position:
+                spans.append((self._buffer[position:a], False))
+            spans.append((self._buffer[a:b], True))
+            position = b
+        if position < end:
+            spans.append((self._buffer[position:end], False))
+
+        kept = min(self.context, end)
+        self._buffer = self._buffer[end - kept:]
+        self._decided = kept
+        return spans
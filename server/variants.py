@@ -0,0 +1,132 @@
+"""
+Encoded variants of converted results
+Results are stored as WAV; MP3, M4A and Ogg copies are encoded on first
+request, kept in a size-bounded LRU directory and shared by concurrent requests
+"""
+
+import importlib.util
+import os
+import re
+import shutil
+from typing import Dict, Any, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from conversion_cache import ConversionCache
+
+# pydub (and its ffmpeg probing) is only imported when a variant is first encoded
+PYDUB_AVAILABLE = importlib.util.find_spec("pydub") is not None
+
+# Disk budget for encoded variants (megabytes)
+VARIANT_CACHE_BYTES = int(os.environ.get("VOICE_VARIANT_CACHE_MB", "512")) * 1024 * 1024
+
+# Output format -> (media type, pydub export arguments); WAV is the stored original
+FORMATS: Dict[str, Tuple[str, Optional[Dict[str, str]]]] = {
+    "wav": ("audio/wav", None),
+    "mp3": ("audio/mpeg", {"format": "mp3", "bitrate": "128k"}),
+    "m4a": ("audio/mp4", {"format": "ipod", "codec": "aac", "bitrate": "96k"}),
+    "ogg": ("audio/ogg", {"format": "ogg", "codec": "libvorbis", "bitrate": "64k"}),
+}
+
+# Media types clients may ask for in Accept, mapped to our format names
+MEDIA_TYPES = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/mp4": "m4a",
+    "audio/aac": "m4a",
+    "audio/x-m4a": "m4a",
+    "audio/ogg": "ogg",
+}
+
+VARIANT_PATTERN = re.compile(r"^(?P<stem>.+)\.(?P<format>mp3|m4a|ogg)$")
+
+
+def transcoding_available() -> bool:
+    """Encoding needs pydub and an ffmpeg binary on PATH"""
+    return PYDUB_AVAILABLE and shutil.which("ffmpeg") is not None
+
+
+def _parse_accept(header: str) -> List[Tuple[str, float]]:
+    ranges = []
+    for part in header.split(","):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type:
+            ranges.append((media_type.lower(), quality))
+    return ranges
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str], can_encode: bool = True) -> str:
+    """Pick the output format from ``format=`` or, failing that, the Accept header
+
+    Raises ValueError for an unknown ``format=`` value. Accept headers that
+    match nothing we can produce fall back to the stored WAV.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported format '{requested}', expected one of: {', '.join(FORMATS)}")
+        return requested
+
+    best, best_quality = "wav", 0.0
+    for media_type, quality in _parse_accept(accept or ""):
+        fmt = MEDIA_TYPES.get(media_type)
+        if fmt is None or quality <= best_quality:
+            continue
+        if fmt != "wav" and not can_encode:
+            continue
+        best, best_quality = fmt, quality
+    return best
+
+
+def media_type_for(fmt: str) -> str:
+    return FORMATS[fmt][0]
+
+
+def variant_filename(result_filename: str, fmt: str) -> str:
+    return f"{os.path.splitext(result_filename)[0]}.{fmt}"
+
+
+def encode_variant(source: str, destination: str, fmt: str) -> Dict[str, Any]:
+    """Encode the WAV at ``source`` into ``destination`` (blocking; runs ffmpeg)"""
+    from pydub import AudioSegment
+    AudioSegment.from_wav(source).export(destination, **FORMATS[fmt][1])
+    return {"engine": "ffmpeg"}
+
+
+class VariantStore(ConversionCache):
+    """Encoded copies of results, keyed by variant filename"""
+
+    def __init__(self, directory: str, max_bytes: int = VARIANT_CACHE_BYTES, scan: bool = True):
+        super().__init__(directory, max_bytes, scan=scan)
+
+    def _rebuild(self):
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if VARIANT_PATTERN.match(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    found.append((max(stat.st_atime, stat.st_mtime), entry.name, stat.st_size))
+        for accessed, filename, size in sorted(found):
+            self.entries[filename] = {"filename": filename, "size": size, "accessed": accessed, "engine": "ffmpeg"}
+            self.total_bytes += size
+        self._evict()
+
+    async def get_variant(self, source: str, result_filename: str, fmt: str) -> Dict[str, Any]:
+        """Return the ``fmt`` variant of ``source``, encoding it on first use"""
+        filename = variant_filename(result_filename, fmt)
+        return await self.get_or_convert(
+            filename,
+            filename,
+            lambda destination: run_in_threadpool(encode_variant, source, destination, fmt)
+        )
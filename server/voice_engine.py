@@ -0,0 +1,931 @@
+"""
+CPU voice conversion engine
+Vectorized STFT pitch shifting, formant shifting and timbre EQ driven by the
+voice_characteristics and profile fields in celebrities.py
+
+Performance target: a real-time factor (processing time / audio duration)
+below 0.2 on a single core for 16 kHz mono input. The whole signal is
+transformed with a handful of array operations per stage; there are no
+per-frame Python loops.
+"""
+
+import asyncio
+import os
+import signal
+import threading
+import time
+import wave
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_decode import CANONICAL_RATE, UnsupportedAudioError, decode, decoded_length, iter_decoded
+from vad import SpeechTracker, regions_to_convert
+
+# Bumped whenever the DSP changes in a way that alters the output
+ENGINE_VERSION = "3"
+
+# Recorded with every result; this engine writes all of results/, so a result
+# found on disk without a registry row was written by it
+ENGINE_NAME = "dsp"
+
+N_FFT = 1024
+HOP = 256
+
+# Worker processes used for conversions
+ENGINE_WORKERS = int(os.environ.get("VOICE_ENGINE_WORKERS", str(os.cpu_count() or 1)))
+
+# Threads one worker uses to render several targets from a shared analysis
+RENDER_THREADS = int(os.environ.get("VOICE_RENDER_THREADS", str(min(os.cpu_count() or 1, 4))))
+
+# Crossfade where converted speech is spliced back into the untouched silence
+SPLICE_SECONDS = 0.01
+
+# Inputs longer than this are converted block by block (seconds). Inputs whose
+# length is not known before decoding are decoded into memory up to this
+# length, and only switch to blocks once they exceed it.
+LONG_FILE_SECONDS = float(os.environ.get("VOICE_LONG_FILE_SECONDS", "60"))
+
+# Audio analysed per block in long-file mode (seconds): larger blocks
+# vectorize better, smaller ones hold less in memory
+BLOCK_SECONDS = float(os.environ.get("VOICE_BLOCK_SECONDS", "10"))
+
+# Career length is measured against a fixed year so parameters stay stable
+REFERENCE_YEAR = 2025
+
+# Per-characteristic adjustments:
+# (pitch semitones, formant ratio delta, tilt dB/octave, low shelf dB, presence dB)
+CHARACTERISTIC_ADJUSTMENTS = {
+    "deep": (-3.0, -0.06, -1.0, 3.0, 0.0),
+    "baritone": (-2.0, -0.04, -0.5, 2.0, 0.0),
+    "authoritative": (-1.0, -0.01, 0.0, 1.0, 1.0),
+    "commanding": (-1.0, 0.0, 0.0, 1.0, 1.5),
+    "powerful": (-0.5, 0.0, 0.0, 2.0, 1.0),
+    "heroic": (-0.5, 0.0, 0.0, 1.5, 1.0),
+    "rugged": (-1.0, -0.02, -0.5, 1.0, 2.0),
+    "bold": (0.0, 0.0, 0.0, 1.0, 1.0),
+    "strong": (0.0, 0.0, 0.0, 1.0, 1.0),
+    "intense": (0.0, 0.0, 0.0, 0.0, 2.0),
+    "passionate": (0.5, 0.0, 0.0, 0.0, 1.5),
+    "smooth": (0.0, 0.0, -1.0, 0.0, -1.0),
+    "romantic": (0.0, 0.0, -0.5, 0.5, -0.5),
+    "sophisticated": (0.0, 0.0, -0.5, 0.0, 0.5),
+    "elegant": (1.0, 0.02, -0.5, 0.0, 0.5),
+    "melodious": (2.0, 0.04, -0.5, 0.0, 0.5),
+    "sweet": (3.0, 0.06, 0.0, -1.0, 1.0),
+    "youthful": (2.0, 0.05, 0.5, -1.0, 1.0),
+    "bubbly": (2.0, 0.04, 0.5, -1.0, 1.5),
+    "energetic": (1.0, 0.02, 0.5, 0.0, 1.5),
+    "dynamic": (0.5, 0.0, 0.5, 0.0, 1.0),
+    "clear": (0.0, 0.0, 0.5, -0.5, 2.0),
+    "expressive": (0.5, 0.0, 0.0, 0.0, 1.0),
+    "emotional": (0.0, 0.0, 0.0, 0.0, 0.5),
+    "confident": (0.0, 0.0, 0.0, 0.5, 1.0),
+    "charismatic": (0.0, 0.0, 0.0, 0.5, 0.5),
+    "charming": (0.5, 0.01, -0.5, 0.0, 0.5),
+    "stylish": (0.5, 0.01, 0.5, 0.0, 1.0),
+    "trendy": (0.5, 0.01, 0.5, 0.0, 1.0),
+    "modern": (0.5, 0.01, 0.5, 0.0, 0.5),
+    "distinctive": (0.0, 0.03, 0.0, 0.0, 1.0),
+    "unique": (0.0, 0.03, 0.0, 0.0, 0.5),
+    "iconic": (-0.5, 0.02, 0.0, 1.0, 1.0),
+    "intellectual": (-0.5, 0.0, -0.5, 0.5, 0.0),
+    "nuanced": (0.0, 0.0, -0.5, 0.0, 0.5),
+}
+
+
+@dataclass(frozen=True)
+class VoiceParams:
+    """Target transformation for one celebrity voice"""
+    pitch_semitones: float = 0.0
+    formant_ratio: float = 1.0
+    tilt_db: float = 0.0
+    low_shelf_db: float = 0.0
+    presence_db: float = 0.0
+
+
+@dataclass
+class Analysis:
+    """Per-frame spectral analysis of a signal, shared by every render"""
+    magnitude: np.ndarray      # (frames, bins) linear magnitude
+    inst_bins: np.ndarray      # (frames, bins) instantaneous frequency in bins
+    envelope: np.ndarray       # (frames, bins) cepstrally smoothed magnitude
+    first_phase: np.ndarray    # (bins,) phase of the first frame
+    n_samples: int
+    sample_rate: int
+    fine: Optional[np.ndarray] = None  # (frames, bins) magnitude / envelope, the harmonic structure
+
+
+def params_for_celebrity(celebrity: Dict[str, Any]) -> VoiceParams:
+    """Derive conversion parameters from a celebrity profile"""
+    pitch = formant = tilt = low = presence = 0.0
+    for characteristic in celebrity.get("voice_characteristics", []):
+        adjustment = CHARACTERISTIC_ADJUSTMENTS.get(characteristic.lower())
+        if adjustment:
+            pitch += adjustment[0]
+            formant += adjustment[1]
+            tilt += adjustment[2]
+            low += adjustment[3]
+            presence += adjustment[4]
+
+    # Longer careers lean towards a slightly lower, more settled voice
+    debut_year = celebrity.get("debut_year") or REFERENCE_YEAR
+    maturity = min(max((REFERENCE_YEAR - debut_year) / 50.0, 0.0), 1.0)
+    pitch -= maturity
+    low += maturity
+
+    return VoiceParams(
+        pitch_semitones=round(float(np.clip(pitch, -6.0, 6.0)), 3),
+        formant_ratio=round(float(np.clip(1.0 + formant, 0.85, 1.2)), 3),
+        tilt_db=round(float(np.clip(tilt, -3.0, 3.0)), 3),
+        low_shelf_db=round(float(np.clip(low, -6.0, 6.0)), 3),
+        presence_db=round(float(np.clip(presence, -6.0, 6.0)), 3),
+    )
+
+
+def _window(n_fft: int) -> np.ndarray:
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+def _frames(x: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    """Centre-padded, windowed frame matrix of ``x`` (a strided view, then one multiply)"""
+    pad = n_fft // 2
+    padded = np.pad(x, (pad, pad + hop), mode="constant")
+    n_frames = 1 + (len(padded) - n_fft) // hop
+    view = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop][:n_frames]
+    return view * _window(n_fft)
+
+
+def _interp_bins(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Linearly sample each row of ``values`` at fractional bin ``positions``"""
+    last = values.shape[1] - 1
+    positions = np.clip(positions, 0, last)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, last)
+    frac = (positions - lower).astype(values.dtype)
+    return values[:, lower] * (1 - frac) + values[:, upper] * frac
+
+
+def spectral_envelope(magnitude: np.ndarray, sample_rate: int, n_fft: int = N_FFT) -> np.ndarray:
+    """Cepstrally smoothed envelope of each frame"""
+    lifter = min(max(int(sample_rate * 0.0015), 8), n_fft // 2 - 1)
+    cepstrum = np.fft.irfft(np.log(magnitude + 1e-6), n=n_fft, axis=1)
+    cepstrum[:, lifter:n_fft - lifter + 1] = 0
+    return np.exp(np.fft.rfft(cepstrum, axis=1).real).astype(np.float32)
+
+
+def analyze_frames(frames: np.ndarray, sample_rate: int, prev_phase: Optional[np.ndarray] = None,
+                   n_fft: int = N_FFT, hop: int = HOP) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Magnitude, phase, instantaneous frequency (in bins) and envelope of windowed frames
+
+    ``prev_phase`` is the phase of the frame preceding ``frames[0]`` when
+    frames arrive in pieces; without it the first frame is assumed to sit
+    exactly on its bin frequencies.
+    """
+    spectrum = np.fft.rfft(frames, axis=1)
+    magnitude = np.abs(spectrum).astype(np.float32)
+    phase = np.angle(spectrum)
+
+    bins = np.arange(magnitude.shape[1])
+    expected = 2 * np.pi * hop * bins / n_fft
+    previous = phase[:1] - expected if prev_phase is None else prev_phase[np.newaxis]
+    delta = np.diff(phase, axis=0, prepend=previous) - expected
+    delta = np.mod(delta + np.pi, 2 * np.pi) - np.pi
+    inst_bins = ((expected + delta) * n_fft / (2 * np.pi * hop)).astype(np.float32)
+
+    return magnitude, phase, inst_bins, spectral_envelope(magnitude, sample_rate, n_fft)
+
+
+def analyze(x: np.ndarray, sample_rate: int, n_fft: int = N_FFT, hop: int = HOP) -> Analysis:
+    """Run the STFT, phase-vocoder frequency estimate and envelope extraction"""
+    magnitude, phase, inst_bins, envelope = analyze_frames(_frames(x, n_fft, hop), sample_rate, None, n_fft, hop)
+    return Analysis(
+        magnitude=magnitude,
+        inst_bins=inst_bins,
+        envelope=envelope,
+        first_phase=phase[0],
+        n_samples=len(x),
+        sample_rate=sample_rate,
+        fine=magnitude / envelope,
+    )
+
+
+@lru_cache(maxsize=256)
+def eq_curve(params: VoiceParams, sample_rate: int, n_fft: int = N_FFT) -> np.ndarray:
+    """Linear gain per bin for the timbre EQ, normalised to unity over the speech band"""
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    safe = np.maximum(freqs, 1.0)
+    gain_db = params.tilt_db * np.log2(np.maximum(safe, 1000.0) / 1000.0)
+    gain_db += params.low_shelf_db / (1.0 + (safe / 300.0) ** 2)
+    gain_db += params.presence_db * np.exp(-0.5 * (np.log2(safe / 3000.0) / 0.5) ** 2)
+
+    gain = 10 ** (gain_db / 20.0)
+    speech = (freqs >= 100) & (freqs <= 4000)
+    if speech.any():
+        gain /= np.sqrt(np.mean(gain[speech] ** 2))
+    gain = gain.astype(np.float32)
+    gain.flags.writeable = False
+    return gain
+
+
+def synthesize_frames(magnitude: np.ndarray, inst_bins: np.ndarray, envelope: np.ndarray,
+                      params: VoiceParams, sample_rate: int,
+                      first_phase: Optional[np.ndarray] = None, start_phase: Optional[np.ndarray] = None,
+                      n_fft: int = N_FFT, hop: int = HOP,
+                      fine: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Pitch-shift, formant-warp and EQ analysed frames back to time-domain frames
+
+    Synthesis phase continues from ``start_phase`` (the phase of the previous
+    output frame) when given, otherwise it starts from ``first_phase``, the
+    analysis phase of the first frame. Returns the unwindowed frames and the
+    phase of the last one so a caller can continue in the next block.
+    ``fine`` (magnitude / envelope) may be passed when it is already known.
+    """
+    n_bins = magnitude.shape[1]
+    target = np.arange(n_bins, dtype=np.float64)
+    factor = 2.0 ** (params.pitch_semitones / 12.0)
+
+    # Move the harmonic fine structure, keep the envelope where it was
+    source = target / factor
+    if fine is None:
+        fine = magnitude / envelope
+    shifted = _interp_bins(fine, source)
+    shifted[:, source > n_bins - 1] = 0
+    nearest = np.clip(np.rint(source), 0, n_bins - 1).astype(np.intp)
+    out_bins = inst_bins[:, nearest] * factor
+
+    # Formant shift is an independent warp of the envelope
+    warped = _interp_bins(envelope, target / params.formant_ratio)
+    out_magnitude = shifted * warped * eq_curve(params, sample_rate, n_fft)
+
+    # Phase advances at the shifted instantaneous frequency of each bin
+    advance = (2 * np.pi * hop / n_fft) * out_bins.astype(np.float64)
+    if start_phase is None:
+        advance[0] = first_phase[nearest] if first_phase is not None else 0.0
+    else:
+        advance[0] += start_phase
+    phase = np.cumsum(advance, axis=0)
+    last_phase = np.mod(phase[-1], 2 * np.pi)
+
+    frames = np.fft.irfft(out_magnitude * np.exp(1j * phase), n=n_fft, axis=1).astype(np.float32)
+    return frames, last_phase
+
+
+def render(analysis: Analysis, params: VoiceParams, n_fft: int = N_FFT, hop: int = HOP) -> np.ndarray:
+    """Synthesize the converted signal from a shared analysis"""
+    frames, _ = synthesize_frames(
+        analysis.magnitude, analysis.inst_bins, analysis.envelope, params, analysis.sample_rate,
+        first_phase=analysis.first_phase, n_fft=n_fft, hop=hop, fine=analysis.fine,
+    )
+    return _overlap_add(frames, analysis.n_samples, n_fft, hop)
+
+
+def _overlap_add(frames: np.ndarray, n_samples: int, n_fft: int, hop: int) -> np.ndarray:
+    window = _window(n_fft)
+    frames = frames * window
+    n_frames = len(frames)
+    overlap = n_fft // hop
+    total = (n_frames + overlap - 1) * hop
+
+    out = np.zeros(total, dtype=np.float32)
+    norm = np.zeros(total, dtype=np.float32)
+    blocks = out.reshape(-1, hop)
+    norm_blocks = norm.reshape(-1, hop)
+    squared = (window ** 2).reshape(overlap, hop)
+    for i in range(overlap):
+        blocks[i:i + n_frames] += frames[:, i * hop:(i + 1) * hop]
+        norm_blocks[i:i + n_frames] += squared[i]
+
+    pad = n_fft // 2
+    out = out[pad:pad + n_samples] / np.maximum(norm[pad:pad + n_samples], 1e-3)
+    return np.clip(out, -1.0, 1.0)
+
+
+def _overlap_add_block(frames: np.ndarray, tail: np.ndarray, hop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Overlap-add windowed ``frames`` after the previous block's ``tail``
+
+    Returns the samples no later frame can touch and the new tail.
+    """
+    n_frames, n_fft = frames.shape
+    overlap = n_fft // hop
+    out = np.zeros((n_frames + overlap - 1) * hop, dtype=np.float32)
+    out[:len(tail)] = tail
+    blocks = out.reshape(-1, hop)
+    for i in range(overlap):
+        blocks[i:i + n_frames] += frames[:, i * hop:(i + 1) * hop]
+    ready = n_frames * hop
+    return out[:ready], out[ready:]
+
+
+def convert_signal(x: np.ndarray, sample_rate: int, params: VoiceParams) -> np.ndarray:
+    """Convert a mono float signal in [-1, 1]"""
+    if len(x) == 0:
+        return x.astype(np.float32)
+    return render(analyze(x, sample_rate), params)
+
+
+def analyze_regions(x: np.ndarray, sample_rate: int,
+                    regions: List[Tuple[int, int]]) -> List[Tuple[int, int, Analysis]]:
+    """Analyse each (start, end) range of ``x`` on its own"""
+    return [(start, end, analyze(x[start:end], sample_rate)) for start, end in regions if end > start]
+
+
+def render_regions(x: np.ndarray, segments: List[Tuple[int, int, Analysis]], params: VoiceParams) -> np.ndarray:
+    """Render analysed ranges of ``x`` and splice them into a copy of it
+
+    Samples outside the ranges are left as they are. Each range is crossfaded
+    in and out over SPLICE_SECONDS where it meets untouched audio; a single
+    range covering all of ``x`` is exactly ``render`` of the whole signal.
+    """
+    if len(segments) == 1 and segments[0][:2] == (0, len(x)):
+        return render(segments[0][2], params)
+    y = np.array(x, dtype=np.float32)
+    for start, end, analysis in segments:
+        converted = render(analysis, params)
+        fade = min(int(SPLICE_SECONDS * analysis.sample_rate), (end - start) // 2)
+        weight = np.ones(end - start, dtype=np.float32)
+        ramp = (np.arange(fade, dtype=np.float32) + 0.5) / max(fade, 1)
+        if start > 0:
+            weight[:fade] = ramp
+        if end < len(x):
+            weight[len(weight) - fade:] = ramp[::-1]
+        y[start:end] += weight * (converted - y[start:end])
+    return y
+
+
+def speech_stats(regions: List[Tuple[int, int]], n_samples: int, sample_rate: int) -> Dict[str, Any]:
+    """How much of the input was transformed, and the share of the work skipped"""
+    speech = sum(end - start for start, end in regions)
+    return {
+        "speech_seconds": speech / sample_rate if sample_rate else 0.0,
+        "compute_saved": 1.0 - speech / n_samples if n_samples else 0.0,
+    }
+
+
+def read_audio(path: str, sample_rate: int = CANONICAL_RATE) -> Tuple[np.ndarray, int]:
+    """Load any supported container as mono float32 at ``sample_rate``"""
+    return decode(path, sample_rate)
+
+
+def _pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def write_wav(path: str, x: np.ndarray, sample_rate: int):
+    """Write a mono float signal as 16-bit PCM"""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(_pcm16(x))
+
+
+def _resume(decoded: List[np.ndarray], decoder: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+    """The chunks already taken from ``decoder``, then the rest of it"""
+    try:
+        yield from decoded
+        yield from decoder
+    finally:
+        decoder.close()
+
+
+def read_input(path: str) -> Tuple[Optional[np.ndarray], Optional[Iterator[np.ndarray]]]:
+    """``(signal, None)`` for inputs up to LONG_FILE_SECONDS, ``(None, chunks)`` for longer ones
+
+    An input whose header gives its length is only decoded when it is short
+    enough. Any other input is decoded into memory until it either ends or
+    passes the limit, so its memory stays bounded either way; ``chunks``
+    then yields it from the start without decoding anything twice. Raises
+    UnsupportedAudioError for inputs that cannot be decoded.
+    """
+    limit = LONG_FILE_SECONDS * CANONICAL_RATE
+    length = decoded_length(path)
+    if length is not None:
+        if length > limit:
+            return None, iter_decoded(path)
+        return read_audio(path)[0], None
+
+    decoder = iter_decoded(path)
+    decoded, total = [], 0
+    try:
+        for chunk in decoder:
+            decoded.append(chunk)
+            total += len(chunk)
+            if total > limit:
+                return None, _resume(decoded, decoder)
+    except BaseException:
+        decoder.close()
+        raise
+    return (np.concatenate(decoded) if decoded else np.zeros(0, dtype=np.float32)), None
+
+
+def convert_path(source: str, destination: str, params: VoiceParams) -> Dict[str, Any]:
+    """Convert ``source`` into a WAV file at ``destination`` (runs in a worker process)
+
+    Raises UnsupportedAudioError for inputs that cannot be decoded, before
+    anything is written to ``destination``. Only the speech found by vad.py
+    is transformed, and ``compute_saved`` is the share of the input that was
+    skipped. Long inputs go through ``convert_path_blocks``.
+    """
+    started = time.perf_counter()
+    x, chunks = read_input(source)
+    if chunks is not None:
+        # What read_input decoded before giving up on memory counts as decoding
+        buffered = time.perf_counter() - started
+        shared, (stats,) = convert_path_blocks(source, [(destination, params)], chunks=chunks)
+        stats["stages"] = {
+            "decode": buffered + shared["decode"],
+            "vad": shared["vad"],
+            "convert": shared["analysis"] + stats["stages"]["render"],
+            "result_write": stats["stages"]["result_write"],
+        }
+        return stats
+
+    sample_rate = CANONICAL_RATE
+    decoded = time.perf_counter()
+    regions = regions_to_convert(x, sample_rate)
+    detected = time.perf_counter()
+    y = render_regions(x, analyze_regions(x, sample_rate, regions), params)
+    converted = time.perf_counter()
+    write_wav(destination, y, sample_rate)
+    finished = time.perf_counter()
+
+    elapsed = finished - started
+    duration = len(x) / sample_rate if sample_rate else 0.0
+    return {
+        "engine": ENGINE_NAME,
+        "duration": duration,
+        "elapsed": elapsed,
+        "rtf": elapsed / duration if duration else None,
+        **speech_stats(regions, len(x), sample_rate),
+        "stages": {
+            "decode": decoded - started,
+            "vad": detected - decoded,
+            "convert": converted - detected,
+            "result_write": finished - converted,
+        },
+    }
+
+
+def convert_path_many(source: str, targets: List[Tuple[str, VoiceParams]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Convert ``source`` once for each (destination, params) in ``targets`` (runs in a worker process)
+
+    Decoding and analysis happen once; the targets are then rendered from
+    the shared analysis on up to RENDER_THREADS threads, and targets with
+    identical parameters share one render. As in ``convert_path``, only the
+    speech is analysed and rendered. Returns the shared stage timings and one
+    stats dict per target, in order.
+    """
+    started = time.perf_counter()
+    x, chunks = read_input(source)
+    if chunks is not None:
+        buffered = time.perf_counter() - started
+        shared, results = convert_path_blocks(source, targets, chunks=chunks)
+        shared["decode"] += buffered
+        return shared, results
+
+    sample_rate = CANONICAL_RATE
+    decoded = time.perf_counter()
+    regions = regions_to_convert(x, sample_rate)
+    detected = time.perf_counter()
+    segments = analyze_regions(x, sample_rate, regions)
+    analyzed = time.perf_counter()
+    duration = len(x) / sample_rate if sample_rate else 0.0
+    speech = speech_stats(regions, len(x), sample_rate)
+
+    renders: Dict[VoiceParams, Future] = {}
+
+    def render_target(params: VoiceParams) -> Tuple[np.ndarray, float]:
+        render_started = time.perf_counter()
+        y = render_regions(x, segments, params)
+        return y, time.perf_counter() - render_started
+
+    with ThreadPoolExecutor(max_workers=max(min(RENDER_THREADS, len(targets)), 1)) as pool:
+        for _, params in targets:
+            if params not in renders:
+                renders[params] = pool.submit(render_target, params)
+
+        results = []
+        for destination, params in targets:
+            y, render_seconds = renders[params].result()
+            write_started = time.perf_counter()
+            write_wav(destination, y, sample_rate)
+            write_seconds = time.perf_counter() - write_started
+            elapsed = render_seconds + write_seconds
+            results.append({
+                "engine": ENGINE_NAME,
+                "duration": duration,
+                "elapsed": elapsed,
+                "rtf": elapsed / duration if duration else None,
+                **speech,
+                "stages": {"render": render_seconds, "result_write": write_seconds},
+            })
+
+    return {"decode": decoded - started, "vad": detected - decoded, "analysis": analyzed - detected}, results
+
+
+class BlockConverter:
+    """Converts one continuous signal of any length, one block of frames at a time
+
+    A block is ``block_frames`` analysis frames, and consecutive blocks share
+    ``n_fft - hop`` input samples. The analysis and synthesis phase and the
+    overlap-add tails carry over from block to block, so the output matches
+    ``render`` of the whole signal at once, while only about one block of
+    audio and its spectra are in memory. ``feed`` and ``finish`` return each
+    stretch of output as soon as it is final, one array per distinct params.
+
+    Distinct params are rendered on ``pool`` when one is given.
+    """
+
+    def __init__(self, params: List[VoiceParams], sample_rate: int, block_frames: Optional[int] = None,
+                 n_fft: int = N_FFT, hop: int = HOP, pool: Optional[ThreadPoolExecutor] = None):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.block_frames = max(block_frames or int(BLOCK_SECONDS * sample_rate / hop), 1)
+        self.window = _window(n_fft)
+        self._squared = np.broadcast_to(self.window ** 2, (self.block_frames, n_fft))
+        self._pool = pool
+
+        # Centre padding, as in _frames; the first n_fft // 2 output samples are dropped again
+        self._pending = np.zeros(n_fft // 2, dtype=np.float32)
+        self._skip = n_fft // 2
+        self._analysis_phase: Optional[np.ndarray] = None
+        self._norm_tail = np.zeros(n_fft - hop, dtype=np.float32)
+        self.received = 0
+        self.emitted = 0
+        self.blocks = 0
+        self.analysis_seconds = 0.0
+
+        self.renders: Dict[VoiceParams, Dict[str, Any]] = {
+            voice: {
+                "params": voice,
+                "phase": None,
+                "tail": np.zeros(n_fft - hop, dtype=np.float32),
+                "ready": None,
+                "output": [],
+                "seconds": 0.0,
+            }
+            for voice in params
+        }
+
+    def feed(self, x: np.ndarray) -> Dict[VoiceParams, np.ndarray]:
+        """Add input samples and convert every block that is complete"""
+        self.received += len(x)
+        self._pending = np.concatenate([self._pending, np.asarray(x, dtype=np.float32)])
+        block_samples = (self.block_frames - 1) * self.hop + self.n_fft
+        while len(self._pending) >= block_samples:
+            self._run_block(self.block_frames)
+        return self._take()
+
+    def finish(self) -> Dict[VoiceParams, np.ndarray]:
+        """Convert what is left once the input has ended, including the final tails"""
+        # The same trailing padding _frames adds: half a frame and one hop of silence
+        self._pending = np.concatenate([self._pending, np.zeros(self.n_fft // 2 + self.hop, dtype=np.float32)])
+        remaining = 1 + (len(self._pending) - self.n_fft) // self.hop
+        while remaining > 0:
+            n_frames = min(remaining, self.block_frames)
+            self._run_block(n_frames)
+            remaining -= n_frames
+        for render in self.renders.values():
+            render["ready"] = render["tail"]
+        self._emit(self._norm_tail)
+        return self._take()
+
+    def _run_block(self, n_frames: int):
+        started = time.perf_counter()
+        view = np.lib.stride_tricks.sliding_window_view(self._pending, self.n_fft)[::self.hop][:n_frames]
+        frames = view * self.window
+        self._pending = self._pending[n_frames * self.hop:].copy()
+
+        magnitude, phase, inst_bins, envelope = analyze_frames(
+            frames, self.sample_rate, self._analysis_phase, self.n_fft, self.hop
+        )
+        self._analysis_phase = phase[-1]
+        fine = magnitude / envelope
+        norm, self._norm_tail = _overlap_add_block(self._squared[:n_frames], self._norm_tail, self.hop)
+        self.analysis_seconds += time.perf_counter() - started
+
+        def render_block(render: Dict[str, Any]):
+            render_started = time.perf_counter()
+            synthesized, render["phase"] = synthesize_frames(
+                magnitude, inst_bins, envelope, render["params"], self.sample_rate,
+                first_phase=phase[0], start_phase=render["phase"], n_fft=self.n_fft, hop=self.hop, fine=fine,
+            )
+            render["ready"], render["tail"] = _overlap_add_block(synthesized * self.window, render["tail"], self.hop)
+            render["seconds"] += time.perf_counter() - render_started
+
+        if self._pool is None or len(self.renders) == 1:
+            for render in self.renders.values():
+                render_block(render)
+        else:
+            for future in [self._pool.submit(render_block, render) for render in self.renders.values()]:
+                future.result()
+        self.blocks += 1
+        self._emit(norm)
+
+    def _emit(self, norm: np.ndarray):
+        """Normalize the finished samples, minus the leading pad and anything past the input"""
+        start = min(self._skip, len(norm))
+        self._skip -= start
+        end = start + max(min(len(norm) - start, self.received - self.emitted), 0)
+        if end <= start:
+            return
+        scale = 1.0 / np.maximum(norm[start:end], 1e-3)
+        for render in self.renders.values():
+            render["output"].append(np.clip(render["ready"][start:end] * scale, -1.0, 1.0))
+        self.emitted += end - start
+
+    def _take(self) -> Dict[VoiceParams, np.ndarray]:
+        taken = {}
+        for params, render in self.renders.items():
+            taken[params] = np.concatenate(render["output"]) if render["output"] else np.zeros(0, dtype=np.float32)
+            render["output"] = []
+        return taken
+
+
+class LongFormConverter:
+    """Converts a signal of any length into WAV files in bounded memory, skipping its silence
+
+    A vad.SpeechTracker decides BLOCK_SECONDS at a time which stretches are
+    speech. Silence is written through unchanged. Each speech region is
+    converted by a BlockConverter of its own, which renders it as
+    ``render_regions`` would from memory, and is crossfaded into the audio
+    around it over SPLICE_SECONDS in the same way. Output is written as soon
+    as it is final, so only about a block of audio is held, however long
+    the input is.
+
+    Targets with identical params share one render; distinct ones are
+    rendered on up to RENDER_THREADS threads.
+    """
+
+    def __init__(self, targets: List[Tuple[str, VoiceParams]], sample_rate: int,
+                 block_frames: Optional[int] = None, n_fft: int = N_FFT, hop: int = HOP):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.block_frames = max(block_frames or int(BLOCK_SECONDS * sample_rate / hop), 1)
+        self.tracker = SpeechTracker(sample_rate, BLOCK_SECONDS)
+        self.fade = int(SPLICE_SECONDS * sample_rate)
+        self.params = list(dict.fromkeys(params for _, params in targets))
+        self.received = 0
+        self.speech = 0
+        self.blocks = 0
+        self.vad_seconds = 0.0
+        self.analysis_seconds = 0.0
+        self.render_seconds = {params: 0.0 for params in self.params}
+
+        # The speech region being converted: where it starts in the input, how
+        # much of it has arrived, and the part of it not yet written
+        self._region: Optional[BlockConverter] = None
+        self._region_start = 0
+        self._region_length = 0
+        self._written = 0
+        self._original = np.zeros(0, dtype=np.float32)
+        self._converted: Dict[VoiceParams, np.ndarray] = {}
+
+        self.outputs: List[Dict[str, Any]] = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+        try:
+            for destination, params in targets:
+                writer = wave.open(destination, "wb")
+                writer.setnchannels(1)
+                writer.setsampwidth(2)
+                writer.setframerate(sample_rate)
+                self.outputs.append({"writer": writer, "params": params, "seconds": 0.0})
+        except BaseException:
+            self.close()
+            raise
+        threads = min(RENDER_THREADS, len(self.params))
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+
+    def __enter__(self) -> "LongFormConverter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def feed(self, x: np.ndarray):
+        """Add input samples, converting and writing everything that is decided"""
+        started = time.perf_counter()
+        spans = self.tracker.feed(x)
+        self.vad_seconds += time.perf_counter() - started
+        for samples, speech in spans:
+            self._take(samples, speech)
+
+    def finish(self):
+        """Convert and write what is left once the input has ended"""
+        started = time.perf_counter()
+        spans = self.tracker.finish()
+        self.vad_seconds += time.perf_counter() - started
+        for samples, speech in spans:
+            self._take(samples, speech)
+        if self._region is not None:
+            self._close_region(at_end=True)
+
+    def _take(self, samples: np.ndarray, speech: bool):
+        if not speech:
+            if self._region is not None:
+                self._close_region(at_end=False)
+            pcm = _pcm16(samples)
+            self._write({params: pcm for params in self.params})
+            self.received += len(samples)
+            return
+        if self._region is None:
+            self._region = BlockConverter(self.params, self.sample_rate, self.block_frames,
+                                          self.n_fft, self.hop, self._pool)
+            self._region_start = self.received
+            self._region_length = self._written = 0
+            self._original = np.zeros(0, dtype=np.float32)
+            self._converted = {params: np.zeros(0, dtype=np.float32) for params in self.params}
+        self.received += len(samples)
+        self.speech += len(samples)
+        self._region_length += len(samples)
+        self._original = np.concatenate([self._original, samples])
+        self._add(self._region.feed(samples))
+        self._splice(closing=False, at_end=False)
+
+    def _close_region(self, at_end: bool):
+        self._add(self._region.finish())
+        self._splice(closing=True, at_end=at_end)
+        self.blocks += self._region.blocks
+        self.analysis_seconds += self._region.analysis_seconds
+        for params, render in self._region.renders.items():
+            self.render_seconds[params] += render["seconds"]
+        self._region = None
+
+    def _add(self, converted: Dict[VoiceParams, np.ndarray]):
+        for params, y in converted.items():
+            self._converted[params] = np.concatenate([self._converted[params], y])
+
+    def _splice(self, closing: bool, at_end: bool):
+        """Crossfade and write the converted region as far as its weights are known
+
+        As in ``render_regions``, the first and last ``fade`` samples of a
+        region ramp between the original and the converted audio, except at
+        the very start and end of the input; ``fade`` is only known for sure
+        once the region has reached twice SPLICE_SECONDS, and the end ramp
+        only once it has closed.
+        """
+        length = self._region_length
+        available = len(self._converted[self.params[0]])
+        if closing:
+            fade = min(self.fade, length // 2)
+            count = available
+        elif length >= 2 * self.fade:
+            fade = self.fade
+            count = min(available, length - fade - self._written)
+        else:
+            return
+        if count <= 0:
+            return
+
+        positions = np.arange(self._written, self._written + count)
+        weight = np.ones(count, dtype=np.float32)
+        if self._region_start > 0:
+            head = positions < fade
+            weight[head] = (positions[head] + 0.5) / fade
+        if closing and not at_end:
+            tail = positions >= length - fade
+            weight[tail] = (length - positions[tail] - 0.5) / fade
+
+        original = self._original[:count]
+        self._write({
+            params: _pcm16(original + weight * (converted[:count] - original))
+            for params, converted in self._converted.items()
+        })
+        self._written += count
+        self._original = self._original[count:]
+        self._converted = {params: converted[count:] for params, converted in self._converted.items()}
+
+    def _write(self, pcm: Dict[VoiceParams, bytes]):
+        for output in self.outputs:
+            write_started = time.perf_counter()
+            output["writer"].writeframesraw(pcm[output["params"]])
+            output["seconds"] += time.perf_counter() - write_started
+
+    def close(self):
+        """Close the output files (their headers are finalized here) and the render threads"""
+        for output in self.outputs:
+            output["writer"].close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def convert_path_blocks(source: str, targets: List[Tuple[str, VoiceParams]],
+                        block_frames: Optional[int] = None, n_fft: int = N_FFT,
+                        hop: int = HOP, chunks: Optional[Iterator[np.ndarray]] = None
+                        ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Bounded-memory ``convert_path_many`` for long inputs (runs in a worker process)
+
+    Decoding, silence detection, analysis, rendering and writing are
+    interleaved block by block through a LongFormConverter, so peak memory
+    follows ``block_frames`` rather than the length of ``source``. Returns
+    the same shared stage timings and per-target stats as
+    ``convert_path_many``. Raises UnsupportedAudioError if ``source`` cannot
+    be decoded; the destinations may then hold a partial conversion, which
+    the caller discards. ``chunks`` is a decode of ``source`` that is already
+    under way (from ``read_input``); it is closed here like a decoder opened
+    here.
+    """
+    decode_seconds = 0.0
+    decoder = chunks if chunks is not None else iter_decoded(source)
+    try:
+        with LongFormConverter(targets, CANONICAL_RATE, block_frames, n_fft, hop) as converter:
+            while True:
+                chunk_started = time.perf_counter()
+                chunk = next(decoder, None)
+                decode_seconds += time.perf_counter() - chunk_started
+                if chunk is None:
+                    break
+                converter.feed(chunk)
+            converter.finish()
+    finally:
+        decoder.close()
+
+    duration = converter.received / CANONICAL_RATE
+    results = []
+    for output in converter.outputs:
+        render_seconds = converter.render_seconds[output["params"]]
+        elapsed = render_seconds + output["seconds"]
+        results.append({
+            "engine": ENGINE_NAME,
+            "duration": duration,
+            "elapsed": elapsed,
+            "rtf": elapsed / duration if duration else None,
+            "blocks": converter.blocks,
+            "speech_seconds": converter.speech / CANONICAL_RATE,
+            "compute_saved": 1.0 - converter.speech / converter.received if converter.received else 0.0,
+            "stages": {"render": render_seconds, "result_write": output["seconds"]},
+        })
+    shared = {"decode": decode_seconds, "vad": converter.vad_seconds, "analysis": converter.analysis_seconds}
+    return shared, results
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    # Forked workers inherit the server's Python signal handlers, which never
+    # run while a worker waits for work; restore SIGTERM so the worker can be
+    # stopped and leave Ctrl-C to the parent
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool shared by all conversions, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max(ENGINE_WORKERS, 1), initializer=_init_worker)
+        return _executor
+
+
+def _warm_worker() -> int:
+    """Convert a tenth of a second of silence so the worker's caches are populated"""
+    convert_signal(np.zeros(CANONICAL_RATE // 10, dtype=np.float32), CANONICAL_RATE, VoiceParams())
+    return os.getpid()
+
+
+def warm_executor():
+    """Start the pool's processes and run the engine once in each (blocking)"""
+    executor = get_executor()
+    for future in [executor.submit(_warm_worker) for _ in range(max(ENGINE_WORKERS, 1))]:
+        future.result()
+
+
+def shutdown_executor():
+    """Cancel queued conversions and wait for the pool's processes to exit
+
+    Waiting matters: uvicorn re-raises SIGTERM once shutdown is done, which
+    ends the process before atexit hooks could stop forked workers, and an
+    orphaned worker keeps the inherited listening socket open.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def convert_file(source: str, destination: str, params: VoiceParams) -> Dict[str, Any]:
+    """Run ``convert_path`` in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), convert_path, source, destination, params)
+
+
+async def convert_file_many(source: str, targets: List[Tuple[str, VoiceParams]]
+                            ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Run ``convert_path_many`` in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), convert_path_many, source, targets)
+
+
+def describe_params(params: VoiceParams) -> Dict[str, Any]:
+    return {"version": ENGINE_VERSION, **asdict(params)}
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Celebrity voice profiles
+Target-speaker statistics (F0 distribution, average spectral envelope,
+formant centroids and a speaker embedding) computed once from static/samples
+and stored as a versioned structured NumPy array. The server memory-maps the file read-only,
+so worker processes share its pages and a lookup returns a view, not a copy.
+
+Usage: python voice_profiles.py [--samples-dir DIR] [--output FILE] [--jobs N]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from voice_engine import UnsupportedAudioError, _window, read_audio, spectral_envelope
+
+# Bumped whenever the layout or the analysis changes; part of the file name
+PROFILE_VERSION = 2
+
+SAMPLES_DIR = Path(__file__).parent / "static" / "samples"
+PROFILE_PATH = Path(__file__).parent / "static" / f"voice_profiles.v{PROFILE_VERSION}.npy"
+
+# Pitch search range and the log-spaced histogram over it (semitone bins)
+F0_MIN = 50.0
+F0_MAX = 800.0
+F0_BINS = 48
+F0_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Average log envelope sampled on a fixed frequency grid so rates don't matter
+ENVELOPE_MAX_HZ = 8000.0
+ENVELOPE_BINS = 64
+
+# Frequency bands searched for the first three formants
+FORMANT_BANDS = ((250.0, 1000.0), (800.0, 2800.0), (1800.0, 3600.0))
+
+# Speaker embedding: mean and spread of MFCCs 1..N_MFCC over voiced frames,
+# then log-F0 mean, log-F0 spread and the voiced fraction
+N_MELS = 40
+N_MFCC = 20
+MEL_MIN_HZ = 60.0
+EMBEDDING_DIM = 2 * (N_MFCC - 1) + 3
+
+PROFILE_DTYPE = np.dtype([
+    ("id", "U48"),
+    ("sample_rate", "<i4"),
+    ("duration", "<f4"),
+    ("voiced_fraction", "<f4"),
+    ("rms_db", "<f4"),
+    ("f0_mean", "<f4"),
+    ("f0_std", "<f4"),
+    ("f0_percentiles", "<f4", (len(F0_PERCENTILES),)),
+    ("f0_histogram", "<f4", (F0_BINS,)),
+    ("envelope_db", "<f4", (ENVELOPE_BINS,)),
+    ("formants", "<f4", (len(FORMANT_BANDS),)),
+    ("spectral_centroid", "<f4"),
+    ("embedding", "<f4", (EMBEDDING_DIM,)),
+])
+
+
+def envelope_frequencies() -> np.ndarray:
+    """Centre frequency of each ``envelope_db`` bin"""
+    return np.linspace(0.0, ENVELOPE_MAX_HZ, ENVELOPE_BINS, dtype=np.float32)
+
+
+def f0_histogram_edges() -> np.ndarray:
+    return F0_MIN * 2.0 ** (np.arange(F0_BINS + 1) / 12.0)
+
+
+def _analysis_frames(x: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    if len(x) < n_fft:
+        x = np.pad(x, (0, n_fft - len(x)))
+    view = np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop]
+    return view * _window(n_fft)
+
+
+def estimate_f0(frames: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Per-frame F0 in Hz from the normalised autocorrelation, 0 for unvoiced frames"""
+    n_fft = frames.shape[1]
+    power = np.abs(np.fft.rfft(frames, n=2 * n_fft, axis=1)) ** 2
+    autocorr = np.fft.irfft(power, axis=1)[:, :n_fft]
+    energy = autocorr[:, :1]
+    normalized = autocorr / np.maximum(energy, 1e-12)
+
+    min_lag = max(int(sample_rate / F0_MAX), 2)
+    max_lag = min(int(sample_rate / F0_MIN), n_fft - 2)
+    window = normalized[:, min_lag:max_lag]
+    best = np.argmax(window, axis=1)
+    strength = window[np.arange(len(window)), best]
+    lag = best + min_lag
+
+    # Parabolic interpolation around the peak for sub-sample lag
+    rows = np.arange(len(normalized))
+    left = normalized[rows, lag - 1]
+    centre = normalized[rows, lag]
+    right = normalized[rows, lag + 1]
+    denominator = left - 2 * centre + right
+    offset = np.divide(0.5 * (left - right), denominator,
+                       out=np.zeros_like(denominator), where=np.abs(denominator) > 1e-12)
+    f0 = sample_rate / (lag + np.clip(offset, -0.5, 0.5))
+
+    loud = energy[:, 0] > 1e-3 * np.max(energy)
+    return np.where((strength > 0.5) & loud, f0, 0.0).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sample_rate: int, n_fft: int) -> np.ndarray:
+    """(N_MELS, bins) triangular filters evenly spaced on the mel scale"""
+    to_mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    to_hz = lambda mel: 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+    top = min(ENVELOPE_MAX_HZ, sample_rate / 2)
+    edges = to_hz(np.linspace(to_mel(MEL_MIN_HZ), to_mel(top), N_MELS + 2))
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    lower, centre, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs - lower) / (centre - lower)
+    falling = (upper - freqs) / (upper - centre)
+    filters = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    filters.flags.writeable = False
+    return filters
+
+
+@lru_cache(maxsize=1)
+def dct_matrix() -> np.ndarray:
+    """Orthonormal DCT-II rows for the first N_MFCC cepstral coefficients"""
+    n = np.arange(N_MELS)
+    basis = np.cos(np.pi * np.arange(N_MFCC)[:, None] * (2 * n + 1) / (2 * N_MELS)) * np.sqrt(2.0 / N_MELS)
+    basis[0] /= np.sqrt(2.0)
+    basis = basis.astype(np.float32)
+    basis.flags.writeable = False
+    return basis
+
+
+def mfcc(magnitude: np.ndarray, sample_rate: int, n_fft: int) -> np.ndarray:
+    """(frames, N_MFCC) mel-frequency cepstral coefficients of magnitude spectra"""
+    mel_power = (magnitude ** 2) @ mel_filterbank(sample_rate, n_fft).T
+    return np.log(np.maximum(mel_power, 1e-10)) @ dct_matrix().T
+
+
+def embedding_from_frames(magnitude: np.ndarray, f0: np.ndarray, sample_rate: int, n_fft: int) -> np.ndarray:
+    """Fixed-length speaker embedding from analysed frames
+
+    The loudness coefficient c0 is left out so the embedding describes timbre
+    and pitch rather than recording level.
+    """
+    voiced = f0 > 0
+    cepstra = mfcc(magnitude[voiced] if voiced.sum() >= 2 else magnitude, sample_rate, n_fft)[:, 1:]
+    log_f0 = np.log2(f0[voiced]) if voiced.any() else np.zeros(1)
+    return np.concatenate([
+        cepstra.mean(axis=0),
+        cepstra.std(axis=0),
+        [log_f0.mean(), log_f0.std(), voiced.mean() if len(voiced) else 0.0],
+    ]).astype(np.float32)
+
+
+def speaker_embedding(x: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Speaker embedding of a mono signal; the same features analyze_sample stores"""
+    n_fft = 1024 if sample_rate >= 16000 else 512
+    frames = _analysis_frames(x, n_fft, n_fft // 4)
+    magnitude = np.abs(np.fft.rfft(frames, axis=1)).astype(np.float32)
+    return embedding_from_frames(magnitude, estimate_f0(frames, sample_rate), sample_rate, n_fft)
+
+
+def analyze_sample(path: str, celebrity_id: str) -> np.ndarray:
+    """One profile record for the sample at ``path``"""
+    x, sample_rate = read_audio(path)
+    n_fft = 1024 if sample_rate >= 16000 else 512
+    hop = n_fft // 4
+    frames = _analysis_frames(x, n_fft, hop)
+
+    f0 = estimate_f0(frames, sample_rate)
+    voiced = f0 > 0
+    voiced_f0 = f0[voiced]
+
+    magnitude = np.abs(np.fft.rfft(frames, axis=1)).astype(np.float32)
+    envelope = spectral_envelope(magnitude, sample_rate, n_fft)
+    selected = envelope[voiced] if voiced.any() else envelope
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+
+    # Average envelope in dB on the shared grid (bins above Nyquist stay at the floor)
+    log_envelope = 20 * np.log10(np.maximum(selected, 1e-6)).mean(axis=0)
+    grid = envelope_frequencies()
+    envelope_db = np.interp(grid, freqs, log_envelope, right=log_envelope[-1])
+    envelope_db[grid > sample_rate / 2] = log_envelope.min()
+
+    # Formant centroids: energy-weighted mean frequency of the envelope in each band
+    power = selected.astype(np.float64) ** 2
+    formants = []
+    for low, high in FORMANT_BANDS:
+        band = (freqs >= low) & (freqs <= min(high, sample_rate / 2))
+        weights = power[:, band].sum(axis=0)
+        formants.append(float(np.sum(freqs[band] * weights) / max(np.sum(weights), 1e-12)) if band.any() else 0.0)
+
+    spectrum_power = magnitude.astype(np.float64) ** 2
+    centroid = float(np.sum(spectrum_power * freqs) / max(np.sum(spectrum_power), 1e-12))
+    histogram, _ = np.histogram(voiced_f0, bins=f0_histogram_edges())
+
+    record = np.zeros((), dtype=PROFILE_DTYPE)
+    record["id"] = celebrity_id
+    record["sample_rate"] = sample_rate
+    record["duration"] = len(x) / sample_rate
+    record["voiced_fraction"] = voiced.mean() if len(voiced) else 0.0
+    record["rms_db"] = 20 * np.log10(max(float(np.sqrt(np.mean(x ** 2))) if len(x) else 0.0, 1e-6))
+    if len(voiced_f0):
+        record["f0_mean"] = voiced_f0.mean()
+        record["f0_std"] = voiced_f0.std()
+        record["f0_percentiles"] = np.percentile(voiced_f0, F0_PERCENTILES)
+        record["f0_histogram"] = histogram / histogram.sum()
+    record["envelope_db"] = envelope_db
+    record["formants"] = formants
+    record["spectral_centroid"] = centroid
+    record["embedding"] = embedding_from_frames(magnitude, f0, sample_rate, n_fft)
+    return record
+
+
+def sample_id(path: Path) -> str:
+    """``amitabh_bachchan_sample.wav`` -> ``amitabh_bachchan``"""
+    return path.stem[:-len("_sample")] if path.stem.endswith("_sample") else path.stem
+
+
+def build_profiles(samples_dir=SAMPLES_DIR, output=PROFILE_PATH, jobs: Optional[int] = None) -> int:
+    """Analyze every ``*_sample.wav`` in parallel and write the profile file atomically"""
+    paths = sorted(Path(samples_dir).glob("*_sample.wav"))
+    if not paths:
+        print("No WAV samples found")
+        return 0
+
+    started = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = [(path, pool.submit(analyze_sample, str(path), sample_id(path))) for path in paths]
+        for path, future in futures:
+            try:
+                records.append(future.result())
+                print(f"Analyzed: {path.name}")
+            except UnsupportedAudioError as e:
+                print(f"Error analyzing {path.name}: {e}")
+
+    # Sorted by id so lookups can also binary-search the mapped array
+    table = np.sort(np.array(records, dtype=PROFILE_DTYPE), order="id")
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f".{output.name}.part")
+    with open(partial, "wb") as f:
+        np.save(f, table, allow_pickle=False)
+    os.replace(partial, output)
+
+    print(f"\nWrote {len(table)} profiles to {output} in {time.perf_counter() - started:.1f}s")
+    return len(table)
+
+
+class VoiceProfileStore:
+    """Read-only, memory-mapped profile table indexed by celebrity id"""
+
+    def __init__(self, table: np.ndarray):
+        self.table = table
+        self.index: Dict[str, int] = {str(celebrity_id): i for i, celebrity_id in enumerate(table["id"])}
+
+    @classmethod
+    def open(cls, path=PROFILE_PATH) -> "VoiceProfileStore":
+        """Map ``path``; a missing or outdated file gives an empty store"""
+        try:
+            table = np.load(path, mmap_mode="r", allow_pickle=False)
+        except (FileNotFoundError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading voice profiles from {path}: {e}")
+            return cls(np.zeros(0, dtype=PROFILE_DTYPE))
+        if table.dtype != PROFILE_DTYPE:
+            print(f"Ignoring voice profiles in {path}: built for a different profile version")
+            return cls(np.zeros(0, dtype=PROFILE_DTYPE))
+        return cls(table)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, celebrity_id: str) -> bool:
+        return celebrity_id in self.index
+
+    def ids(self) -> List[str]:
+        return list(self.index)
+
+    def get(self, celebrity_id: str) -> Optional[np.void]:
+        """The profile record for ``celebrity_id``; its fields are views into the mapped file"""
+        i = self.index.get(celebrity_id)
+        return None if i is None else self.table[i]
+
+    def describe(self, celebrity_id: str) -> Optional[Dict[str, Any]]:
+        """JSON-friendly copy of one profile"""
+        profile = self.get(celebrity_id)
+        if profile is None:
+            return None
+        result = {}
+        for name in PROFILE_DTYPE.names:
+            value = profile[name]
+            result[name] = value.tolist() if isinstance(value, np.ndarray) else value.item()
+        result["f0_percentiles"] = dict(zip((f"p{p}" for p in F0_PERCENTILES), result["f0_percentiles"]))
+        result["envelope_hz"] = envelope_frequencies().tolist()
+        result["version"] = PROFILE_VERSION
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build celebrity voice profiles from the voice samples")
+    parser.add_argument("--samples-dir", default=str(SAMPLES_DIR))
+    parser.add_argument("--output", default=str(PROFILE_PATH))
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    build_profiles(args.samples_dir, args.output, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
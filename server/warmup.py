@@ -0,0 +1,108 @@
+"""
+Lazy initialization and warmup
+Shared objects that are slow to build (the database, the catalog index, voice
+profiles, the conversion process pool) are created on first use, so a new
+worker answers its first request as soon as the modules are imported. The
+components named in VOICE_WARMUP are then initialized in the background right
+after startup, so real requests usually find them ready.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, Any, Generic, List, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+# Components initialized in the background after startup, in this order
+WARMUP_COMPONENTS = [
+    name.strip() for name in os.environ.get("VOICE_WARMUP", "catalog,database,profiles,engine").split(",")
+    if name.strip()
+]
+
+
+class Lazy(Generic[T]):
+    """A value built by ``factory`` on the first ``get()``, exactly once across threads"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> T:
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._value = self.factory()
+                    self._ready = True
+        return self._value
+
+
+class Warmup:
+    """Named initialization hooks, run once in the background after startup
+
+    Each hook must be safe to race with request handlers doing the same
+    initialization on demand; the lazy getters it calls take care of that.
+    """
+
+    def __init__(self):
+        self.hooks: Dict[str, Callable[[], Any]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def register(self, name: str, hook: Callable[[], Any]):
+        self.hooks[name] = hook
+
+    def start(self, names: List[str] = WARMUP_COMPONENTS):
+        """Schedule ``names`` on the running loop without waiting for them"""
+        unknown = [name for name in names if name not in self.hooks]
+        if unknown:
+            print(f"Error in warmup: unknown components {', '.join(unknown)}")
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._run([name for name in names if name in self.hooks]))
+
+    async def _run(self, names: List[str]):
+        for name in names:
+            if self._stopping:
+                break
+            started = time.perf_counter()
+            try:
+                await run_in_threadpool(self.hooks[name])
+                self.results[name] = {"status": "ready", "seconds": round(time.perf_counter() - started, 4)}
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+                self.results[name] = {"status": "failed", "error": str(e)}
+        self.finished_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    async def stop(self):
+        """Skip the components not started yet and wait for the one in progress
+
+        A hook already running in a thread cannot be cancelled; waiting for it
+        keeps it from recreating something (like the process pool) after
+        shutdown has released it.
+        """
+        self._stopping = True
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "done": self.done,
+            "seconds": round(self.finished_at - self.started_at, 4) if self.done else None,
+            "components": dict(self.results),
+        }